@@ -1,7 +1,8 @@
 import streamlit as st
-import pandas as pd
-import joblib
-import datetime
+
+from src.warm_start import ModelLoader
+
+# pandas, joblib and the model stack are imported on demand (see LOAD MODEL ASSETS)
 
 # -----------------------------------------------------------------------------
 # PAGE CONFIG
@@ -258,43 +259,131 @@ st.markdown(
 from pathlib import Path
 
 @st.cache_resource
-def load_assets():
-    base_dir = Path(__file__).resolve().parent
-
-    model_candidates = [
-        base_dir / "models" / "vehicle_price_pipeline.pkl",   # original structure
-        base_dir / "vehicle_price_pipeline.pkl",              # same folder as app
-    ]
-    cols_candidates = [
-        base_dir / "models" / "input_columns.pkl",
-        base_dir / "input_columns.pkl",
-    ]
-
-    model_file = next((p for p in model_candidates if p.exists()), None)
-    cols_file  = next((p for p in cols_candidates if p.exists()), None)
-
-    if model_file is None or cols_file is None:
-        st.error(
-            "⚠️ System Error: Model files missing.\n\n"
-            f"Looked for:\n"
-            + "\n".join(f"- {p}" for p in model_candidates + cols_candidates)
-        )
-        return None, None
+def start_model_loader():
+    from src.registry import HotSwapModel, ModelRegistry
+
+    # Imports, unpickles and warms up the pipeline on a background thread while the page renders.
+    # With a model registry, the same thread also picks up newly activated versions.
+    registry = ModelRegistry(Path(__file__).resolve().parent / "models" / "registry")
+    if registry.exists():
+        return HotSwapModel(registry).start()
+    return ModelLoader(Path(__file__).resolve().parent).start()
+
+
+@st.cache_resource
+def load_prediction_cache():
+    from src.prediction_cache import PredictionCache
+
+    # Shared across sessions; cleared automatically when the model fingerprint changes
+    return PredictionCache(maxsize=5000, ttl=6 * 3600)
+
+
+@st.cache_resource
+def get_instrumentation():
+    from src.instrumentation import Instrumentation
+
+    # Off unless VEHICLE_PRICE_INSTRUMENT=1; VEHICLE_PRICE_METRICS_LOG names a JSON-lines log
+    return Instrumentation()
+
+
+@st.cache_resource
+def get_shadow_log():
+    from src.shadow import ShadowLog
+
+    # Off unless VEHICLE_PRICE_SHADOW_LOG names a directory for the scored-row log
+    return ShadowLog()
+
+
+@st.cache_resource
+def get_drift_monitor():
+    from src.assets import find_assets
+    from src.drift import PROFILE_FILENAME, DriftMonitor, load_profile, profile_path
+
+    loader = start_model_loader()
+
+    # Same keys as the server: the registry version, or None for the static model
+    def profile_for(version):
+        if version is not None:
+            return load_profile(loader.registry.path(version) / PROFILE_FILENAME)
+        profile = load_profile(profile_path(find_assets(Path(__file__).resolve().parent)[0]))
+        return profile if profile is not None and profile["model_fingerprint"] == loader.result()[2] else None
+
+    # Idle without a drift_profile.json for the loaded model
+    return DriftMonitor(profile_for)
+
+
+@st.cache_resource
+def load_timed_pipeline(_pipeline, fingerprint):
+    from src.instrumentation import instrument_pipeline
+
+    # The pipeline itself when instrumentation is off
+    return instrument_pipeline(_pipeline, get_instrumentation())
+
+
+@st.cache_resource
+def load_explainer(_pipeline, _model_columns, fingerprint):
+    from src.explain import Explainer
 
+    # One explainer (and contribution cache) per model artifact
+    return Explainer(_pipeline, _model_columns)
+
+
+@st.cache_resource
+def load_comparables_index(_pipeline, _model_columns, fingerprint):
+    from src.comparables import load_comparables
+
+    # Memory-mapped; None when models/comparables is missing or was built for another model
+    return load_comparables(_pipeline, _model_columns, fingerprint,
+                            Path(__file__).resolve().parent / "models" / "comparables")
+
+
+# Above this, "Why this price?" falls back to approximate contributions
+EXPLAIN_BUDGET_MS = 50
+
+FEATURE_LABELS = {
+    "make": "Brand",
+    "model": "Model",
+    "vehicle_age": "Vehicle age",
+    "mileage": "Odometer reading",
+    "mileage_per_year": "Usage intensity",
+    "engine_hp": "Engine horsepower",
+    "transmission": "Transmission",
+    "fuel_type": "Fuel type",
+    "drivetrain": "Drivetrain",
+    "condition": "Condition",
+    "accident_history": "Accident history",
+    "seller_type": "Seller type",
+    "trim": "Trim",
+    "body_type": "Body style",
+    "exterior_color": "Exterior color",
+    "interior_color": "Interior color",
+    "owner_count": "Previous owners",
+    "brand_popularity": "Brand popularity",
+}
+
+
+def describe_value(value):
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float):
+        return f"{value:,.0f}" if abs(value) >= 100 else f"{value:g}"
+    if isinstance(value, int):
+        return f"{value:,}"
+    return str(value)
+
+
+def load_assets():
+    loader = start_model_loader()
     try:
-        pipeline = joblib.load(model_file)
-        columns  = joblib.load(cols_file)
-        return pipeline, columns
+        with st.spinner("Loading valuation model..."):
+            return loader.result()
     except Exception as e:
-        st.error(f"Error loading model assets: {e}")
-        return None, None
+        st.error(f"⚠️ System Error: could not load model assets.\n\n{e}")
+        st.stop()
 
 
-pipeline, model_columns = load_assets()
-
-if pipeline is None:
-    st.error("⚠️ System Error: Model files missing. Please check repository structure.")
-    st.stop()
+model_loader = start_model_loader()
+instrumentation = get_instrumentation()
 
 # -----------------------------------------------------------------------------
 # HERO HEADER
@@ -444,6 +533,7 @@ with left_col:
         brand_popularity = 0.5  # placeholder feature for model
 
         st.markdown("")
+        profile_request = instrumentation.enabled and st.checkbox("🔬 Profile this valuation")
         submit_btn = st.form_submit_button("🚀 Run Valuation")
 
 # -----------------------------------------------------------------------------
@@ -495,137 +585,246 @@ with right_col:
 
     # AFTER PREDICTION
     if submit_btn:
-        # 1. Prepare DataFrame
-        input_data = pd.DataFrame(
-            {
-                "make": [make],
-                "model": [model_name],
-                "year": [year],
-                "mileage": [mileage],
-                "engine_hp": [engine_hp],
-                "transmission": [transmission],
-                "fuel_type": [fuel_type],
-                "drivetrain": [drivetrain],
-                "condition": [condition],
-                "accident_history": [accident_history],
-                "seller_type": [seller_type],
-                "trim": [trim],
-                "body_type": [body_type],
-                "exterior_color": [exterior_color],
-                "interior_color": [interior_color],
-                "owner_count": [owner_count],
-                "brand_popularity": [brand_popularity],
-            }
-        )
-
-        # 2. Feature engineering aligned with training
-        current_year = datetime.datetime.now().year
-        input_data["vehicle_age"] = current_year - input_data["year"]
-        # protect against div by zero
-        input_data["mileage_per_year"] = input_data["mileage"] / input_data[
-            "vehicle_age"
-        ].replace(0, 1)
-        input_data["accident_history"] = input_data["accident_history"].fillna("None")
-
-        # Align columns with training if available
-        if model_columns is not None:
-            # Reindex to expected training columns; missing cols filled with 0
-            input_data = input_data.reindex(columns=model_columns, fill_value=0)
-
+        import pandas as pd
+
+        from src.explain import BASE_VALUE, top_drivers
+        from src.features import build_model_input, engineer_features, pipeline_reference_year
+        from src.instrumentation import ProfileCapture
+        from src.quantile import quantile_levels, split_band
+        from src.schema import schema_for
+        from src.sweep import sweep
+
+        pipeline, model_columns, model_fingerprint = load_assets()
+        prediction_cache = load_prediction_cache()
+        timed_pipeline = load_timed_pipeline(pipeline, model_fingerprint)
+
+        instrumentation.begin("valuation", make=make, model=model_name)
+        capture = ProfileCapture().start() if profile_request else None
+        error = None
         try:
-            # 3. Predict
-            prediction = float(pipeline.predict(input_data)[0])
-
-            # basic qualitative banding
-            age = int(input_data.get("vehicle_age", pd.Series([0])).iloc[0])
-            mp_year = float(input_data.get("mileage_per_year", pd.Series([0])).iloc[0])
-
-            if age <= 3 and mp_year < 14000 and accident_history == "None":
-                pricing_band = "Premium resale segment"
-                band_note = "Strong residual value driven by low age & clean history."
-            elif age <= 7 and accident_history in ["None", "Minor"]:
-                pricing_band = "Mainstream fair value"
-                band_note = "Healthy balance between depreciation and usability."
-            else:
-                pricing_band = "Value / budget tier"
-                band_note = "Price is shaped more by age, mileage and risk factors."
-
-            # MAIN CARD
-            with result_container.container():
-                st.markdown(
-                    f"""
-                    <div class="metric-card-main">
-                        <div class="metric-label">ESTIMATED FAIR MARKET VALUE</div>
-                        <div class="metric-value">${prediction:,.0f}</div>
-                        <div class="metric-sub">
-                            {make} {model_name} · {year} · {int(mileage):,} mi · {fuel_type}
-                        </div>
-                        <div class="chip-row">
-                            <div class="chip">{pricing_band}</div>
-                            <div class="chip">Condition: {condition}</div>
-                            <div class="chip">Accident: {accident_history}</div>
-                            <div class="chip">{transmission} · {drivetrain}</div>
-                        </div>
-                    </div>
-                    """,
-                    unsafe_allow_html=True,
-                )
 
-                st.success("Valuation complete • Model successfully evaluated the configuration.")
-
-                # SECONDARY METRICS
-                st.markdown("#### 💡 Valuation Drivers")
+            # 1. Prepare DataFrame
+            with instrumentation.stage("app.input_frame", 1):
+                input_data = pd.DataFrame(
+                    {
+                        "make": [make],
+                        "model": [model_name],
+                        "year": [year],
+                        "mileage": [mileage],
+                        "engine_hp": [engine_hp],
+                        "transmission": [transmission],
+                        "fuel_type": [fuel_type],
+                        "drivetrain": [drivetrain],
+                        "condition": [condition],
+                        "accident_history": [accident_history],
+                        "seller_type": [seller_type],
+                        "trim": [trim],
+                        "body_type": [body_type],
+                        "exterior_color": [exterior_color],
+                        "interior_color": [interior_color],
+                        "owner_count": [owner_count],
+                        "brand_popularity": [brand_popularity],
+                    }
+                )
 
-                m1, m2, m3 = st.columns(3)
-                m1.metric("Depreciation age", f"{age} years")
-                m2.metric("Usage intensity", f"{int(mp_year):,} mi / year")
+            # Validate and coerce against the model's schema instead of letting reindex fill gaps with 0
+            with instrumentation.stage("app.validate", 1):
+                checked = schema_for(pipeline, model_columns).validate(input_data)
+            if not checked.valid.all():
+                error = "invalid input"
+                st.error(
+                    "⚠️ This configuration cannot be valued:\n\n"
+                    + "\n".join(f"- {message}" for message in checked.errors["message"].unique())
+                )
+                st.stop()
+            for issue in checked.warnings.itertuples():
+                st.warning(f"{issue.message}: {issue.value}" if issue.value is not None else issue.message)
+            input_data = checked.frame
+
+            # 2. Feature engineering aligned with training (reference year pinned in the artifact)
+            with instrumentation.stage("app.features", 1):
+                engineered = engineer_features(input_data, pipeline_reference_year(pipeline))
+
+                # Align columns with training if available
+                model_input = build_model_input(input_data, pipeline, model_columns)
+
+            try:
+                # 3. Predict
+                # Quantile models return the price band from the same predict call
+                levels = quantile_levels(pipeline)
+                with instrumentation.stage("app.predict", 1):
+                    point, low, high = split_band(
+                        prediction_cache.predict(timed_pipeline, model_input, model_fingerprint), levels
+                    )
+                prediction = float(point[0])
+                # Queued for the background writer; a no-op unless shadow logging is on
+                get_shadow_log().log(input_data, point, pipeline, model_columns, model_fingerprint)
+                get_drift_monitor().observe(input_data, point, key=getattr(model_loader, "version", None))
+                price_range = (
+                    f"{levels[-1] - levels[0]:.0%} range: ${low[0]:,.0f} – ${high[0]:,.0f}" if levels else None
+                )
 
-                if condition == "Excellent" and accident_history == "None":
-                    health_score = "A+"
-                elif accident_history != "None":
-                    health_score = "C"
+                # 4. Per-feature attributions (TreeSHAP, cached per configuration)
+                explainer = load_explainer(pipeline, model_columns, model_fingerprint)
+                with instrumentation.stage("app.explain", 1):
+                    contributions, explain_method = explainer.explain(input_data, budget_ms=EXPLAIN_BUDGET_MS)
+                contributions = contributions.iloc[0]
+                engineered_row = engineered.iloc[0]
+
+                # 5. Nearest sold listings of the same make/model (None without an index for this model)
+                comparables = None
+                comparables_index = load_comparables_index(pipeline, model_columns, model_fingerprint)
+                if comparables_index is not None:
+                    with instrumentation.stage("app.comparables", 1):
+                        comparables = comparables_index.comparables(input_data, k=8)
+
+                trace = instrumentation.end(price=prediction)
+                if capture is not None:
+                    capture.stop()
+
+                # basic qualitative banding
+                age = int(engineered["vehicle_age"].iloc[0])
+                mp_year = float(engineered["mileage_per_year"].iloc[0])
+
+                if age <= 3 and mp_year < 14000 and accident_history == "None":
+                    pricing_band = "Premium resale segment"
+                    band_note = "Strong residual value driven by low age & clean history."
+                elif age <= 7 and accident_history in ["None", "Minor"]:
+                    pricing_band = "Mainstream fair value"
+                    band_note = "Healthy balance between depreciation and usability."
                 else:
-                    health_score = "B"
-
-                m3.metric("Vehicle health grade", health_score)
-
-                # Narrative explanation
-                st.markdown(
-                    f"""
-                    **Why this price?**
+                    pricing_band = "Value / budget tier"
+                    band_note = "Price is shaped more by age, mileage and risk factors."
 
-                    - Age and usage pattern suggest a **{pricing_band.lower()}** profile.  
-                    - Condition is reported as **{condition}**, with accident history marked as **{accident_history}**.  
-                    - Powertrain: **{engine_hp} HP {fuel_type}**, **{transmission}** transmission and **{drivetrain}** drivetrain.  
-                    - Ownership trail shows **{owner_count}** recorded owner(s), which also affects buyer confidence.
-                    """
-                )
+                # MAIN CARD
+                with result_container.container():
+                    st.markdown(
+                        f"""
+                        <div class="metric-card-main">
+                            <div class="metric-label">ESTIMATED FAIR MARKET VALUE</div>
+                            <div class="metric-value">${prediction:,.0f}</div>
+                            {f'<div class="metric-sub">{price_range}</div>' if price_range else ""}
+                            <div class="metric-sub">
+                                {make} {model_name} · {year} · {int(mileage):,} mi · {fuel_type}
+                            </div>
+                            <div class="chip-row">
+                                <div class="chip">{pricing_band}</div>
+                                <div class="chip">Condition: {condition}</div>
+                                <div class="chip">Accident: {accident_history}</div>
+                                <div class="chip">{transmission} · {drivetrain}</div>
+                            </div>
+                        </div>
+                        """,
+                        unsafe_allow_html=True,
+                    )
 
-                if accident_history != "None":
-                    st.warning(
-                        f"📉 **Impact alert:** Valuation includes a penalty for `{accident_history}` accident history. "
-                        "Severe structural damage or poor repair quality can push real-world prices further down.",
-                        icon="⚠️",
+                    st.success("Valuation complete • Model successfully evaluated the configuration.")
+                    st.caption(
+                        "Model ready {ready_s:.1f}s after startup (imports {import_s:.1f}s · "
+                        "load {load_s:.1f}s · warm-up {warmup_s:.2f}s)".format(**model_loader.timings)
                     )
 
-                # Micro insight row
-                st.markdown("---")
-                col_ins1, col_ins2 = st.columns([1.2, 1.0])
-                with col_ins1:
+                    # SECONDARY METRICS
+                    st.markdown("#### 💡 Valuation Drivers")
+
+                    m1, m2, m3 = st.columns(3)
+                    m1.metric("Depreciation age", f"{age} years")
+                    m2.metric("Usage intensity", f"{int(mp_year):,} mi / year")
+
+                    if condition == "Excellent" and accident_history == "None":
+                        health_score = "A+"
+                    elif accident_history != "None":
+                        health_score = "C"
+                    else:
+                        health_score = "B"
+
+                    m3.metric("Vehicle health grade", health_score)
+
+                    # Model-derived explanation: largest per-feature contributions to this price
+                    driver_lines = []
+                    for column, amount in top_drivers(contributions, k=5):
+                        label = FEATURE_LABELS.get(column, column)
+                        shown = f" ({describe_value(engineered_row[column])})" if column in engineered_row.index else ""
+                        direction = "adds" if amount >= 0 else "takes off"
+                        driver_lines.append(f"- **{label}**{shown} {direction} **${abs(amount):,.0f}**")
                     st.markdown(
-                        f"""
-                        **Market tip:**  
-                        For a {year} {make} {model_name}, keeping mileage below
-                        roughly **{int((age + 1) * 12000):,} miles** and maintaining service
-                        records can support a higher closing price.
-                        """
+                        "**Why this price?**\n\n"
+                        f"Starting from a typical listing at **${contributions[BASE_VALUE]:,.0f}**, "
+                        "the biggest drivers for this configuration are:\n\n" + "\n".join(driver_lines)
                     )
-                with col_ins2:
-                    st.info(
-                        "This valuation is an AI-assisted estimate. Local market conditions, city, dealer margins "
-                        "and seasonal demand can shift actual selling price.",
-                        icon="💡",
+                    if explain_method == "approximate":
+                        st.caption("Drivers approximated to stay within the response-time budget.")
+
+                    if accident_history != "None":
+                        st.warning(
+                            f"📉 **Impact alert:** Valuation includes a penalty for `{accident_history}` accident history. "
+                            "Severe structural damage or poor repair quality can push real-world prices further down.",
+                            icon="⚠️",
+                        )
+
+                    # What-if curves: each is a single vectorized predict over the whole axis
+                    st.markdown("#### 📈 What if?")
+                    listing = input_data.iloc[0].to_dict()
+                    tab_mileage, tab_year, tab_condition = st.tabs(
+                        ["Price vs mileage", "Price vs year", "Condition × accident history"]
                     )
-
-        except Exception as e:
-            st.error(f"Prediction Error: {str(e)}")
+                    with tab_mileage:
+                        st.line_chart(sweep(pipeline, model_columns, listing, {"mileage": None}))
+                    with tab_year:
+                        st.line_chart(sweep(pipeline, model_columns, listing, {"year": None}))
+                    with tab_condition:
+                        grid = sweep(pipeline, model_columns, listing, {"condition": None, "accident_history": None})
+                        st.dataframe(grid.style.format("${:,.0f}"), use_container_width=True)
+
+                    if comparables is not None:
+                        st.markdown("#### 🚗 Comparable sold listings")
+                        if len(comparables):
+                            st.dataframe(
+                                comparables.drop(columns=["query", "distance"]).set_index("rank")
+                                .style.format({"price": "${:,.0f}", "mileage": "{:,}"}),
+                                use_container_width=True,
+                            )
+                            st.caption(f"Median comparable price: ${comparables['price'].median():,.0f}")
+                        else:
+                            st.caption(f"No sold {make} listings in the training inventory.")
+
+                    if trace is not None:
+                        with st.expander(f"⏱ Stage timings ({trace['total_ms']:.1f} ms)"):
+                            st.dataframe(pd.DataFrame(trace["stages"]), use_container_width=True)
+                            if capture is not None:
+                                st.caption(f"Peak traced memory: {capture.peak_kb:,.0f} KB")
+                                st.code(capture.top(20))
+                            drift = get_drift_monitor().scores()
+                            if drift.get("features"):
+                                st.caption(
+                                    f"Input drift over {drift['rows']:,} valuations: worst "
+                                    f"{drift['max_psi_feature']} (PSI {drift['max_psi']:.2f})"
+                                )
+
+                    # Micro insight row
+                    st.markdown("---")
+                    col_ins1, col_ins2 = st.columns([1.2, 1.0])
+                    with col_ins1:
+                        st.markdown(
+                            f"""
+                            **Market tip:**  
+                            For a {year} {make} {model_name}, keeping mileage below
+                            roughly **{int((age + 1) * 12000):,} miles** and maintaining service
+                            records can support a higher closing price.
+                            """
+                        )
+                    with col_ins2:
+                        st.info(
+                            "This valuation is an AI-assisted estimate. Local market conditions, city, dealer margins "
+                            "and seasonal demand can shift actual selling price.",
+                            icon="💡",
+                        )
+
+            except Exception as e:
+                error = str(e)
+                st.error(f"Prediction Error: {str(e)}")
+        finally:
+            # st.stop() and errors skip the normal end above; both calls are no-ops once it ran
+            if capture is not None:
+                capture.stop()
+            instrumentation.end(error=error)
@@ -0,0 +1 @@
+"""Training and serving utilities for the used vehicle price model."""
@@ -0,0 +1,48 @@
+"""Locate and load the serialized model artifacts outside of Streamlit."""
+
+from pathlib import Path
+
+import joblib
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+MODEL_FILENAME = "vehicle_price_pipeline.pkl"
+COLUMNS_FILENAME = "input_columns.pkl"
+# Running target-encoding statistics of one artifact (see src.incremental)
+STATS_FILENAME = "target_encoding_stats.json"
+
+
+def asset_candidates(base_dir=None):
+    """Return the (model, columns) paths probed, in priority order."""
+    base_dir = Path(base_dir) if base_dir is not None else BASE_DIR
+    model_candidates = [
+        base_dir / "models" / MODEL_FILENAME,   # original structure
+        base_dir / MODEL_FILENAME,              # same folder as app
+    ]
+    cols_candidates = [
+        base_dir / "models" / COLUMNS_FILENAME,
+        base_dir / COLUMNS_FILENAME,
+    ]
+    return model_candidates, cols_candidates
+
+
+def find_assets(base_dir=None):
+    """Resolve the pipeline and column-list files, raising if either is missing."""
+    model_candidates, cols_candidates = asset_candidates(base_dir)
+    model_file = next((p for p in model_candidates if p.exists()), None)
+    cols_file = next((p for p in cols_candidates if p.exists()), None)
+
+    if model_file is None or cols_file is None:
+        raise FileNotFoundError(
+            "Model files missing. Looked for:\n"
+            + "\n".join(f"- {p}" for p in model_candidates + cols_candidates)
+        )
+    return model_file, cols_file
+
+
+def load_assets(base_dir=None):
+    """Load ``(pipeline, model_columns)`` the same way ``app.py`` does."""
+    model_file, cols_file = find_assets(base_dir)
+    pipeline = joblib.load(model_file)
+    columns = joblib.load(cols_file)
+    return pipeline, columns
@@ -0,0 +1,215 @@
+"""
+Batch valuation engine.
+
+Streams a CSV or Parquet inventory through the same feature engineering as
+``app.py`` and scores it with one ``pipeline.predict`` call per chunk, writing
+the priced rows incrementally so memory stays bounded by the chunk size.
+
+Usage:
+    python -m src.batch_predict listings.csv priced.csv --chunksize 100000
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.assets import load_assets
+from src.features import build_model_input
+from src.quantile import quantile_levels, split_band
+
+DEFAULT_CHUNKSIZE = 100_000
+PREDICTION_COLUMN = "predicted_price"
+
+
+# -----------------------------------------------------------------------------
+# CHUNKED I/O
+# -----------------------------------------------------------------------------
+def _is_parquet(path):
+    return Path(path).suffix.lower() in {".parquet", ".pq"}
+
+
+def iter_chunks(path, chunksize=DEFAULT_CHUNKSIZE):
+    """Yield DataFrames of at most ``chunksize`` rows from a CSV or Parquet file."""
+    if _is_parquet(path):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet input requires pyarrow. Run: pip install pyarrow")
+
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize)
+
+
+def _is_text(series):
+    """Object, string or string-category columns: whatever later chunks hold, it is text."""
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        dtype = dtype.categories.dtype
+    return pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype)
+
+
+class ChunkWriter:
+    """
+    Append priced chunks to a CSV or Parquet file as they are produced.
+
+    The Parquet schema is fixed by the first chunk, except for the columns in
+    ``column_types`` (Arrow type names) and text columns, which are always
+    written as ``string``. Other columns that are all null in the first chunk
+    are written as ``string`` too (``double`` if listed in ``numeric_columns``),
+    so a type inferred from nothing cannot reject later chunks.
+    """
+
+    def __init__(self, path, column_types=None, numeric_columns=()):
+        self.path = Path(path)
+        self.column_types = dict(column_types or {})
+        self.numeric_columns = set(numeric_columns)
+        self._parquet_writer = None
+        self._wrote_header = False
+
+    def write(self, frame):
+        if _is_parquet(self.path):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._parquet_writer is None:
+                schema = table.schema.remove_metadata()
+                for index, column in enumerate(schema.names):
+                    if column in self.column_types:
+                        arrow_type = pa.type_for_alias(self.column_types[column])
+                    elif frame[column].isna().all():
+                        arrow_type = pa.float64() if column in self.numeric_columns else pa.string()
+                    elif _is_text(frame[column]):
+                        arrow_type = pa.string()
+                    else:
+                        continue
+                    schema = schema.set(index, pa.field(column, arrow_type))
+                self._parquet_writer = pq.ParquetWriter(self.path, schema)
+            self._parquet_writer.write_table(table.cast(self._parquet_writer.schema))
+        else:
+            frame.to_csv(
+                self.path,
+                mode="a" if self._wrote_header else "w",
+                header=not self._wrote_header,
+                index=False,
+            )
+            self._wrote_header = True
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# -----------------------------------------------------------------------------
+# SCORING
+# -----------------------------------------------------------------------------
+def output_types(pipeline, model_columns):
+    """Arrow types of the model's categorical inputs: strings, whatever a chunk infers."""
+    from src.schema import schema_for
+
+    return {column: "string" for column in schema_for(pipeline, model_columns).categorical}
+
+
+def score_frame(pipeline, frame, model_columns):
+    """Price every row of ``frame`` with a single ``predict`` call."""
+    features = build_model_input(frame, pipeline, model_columns)
+    return np.asarray(pipeline.predict(features), dtype=np.float64)
+
+
+def score_file(
+    input_path,
+    output_path,
+    pipeline,
+    model_columns,
+    chunksize=DEFAULT_CHUNKSIZE,
+    prediction_column=PREDICTION_COLUMN,
+    log=print,
+):
+    """
+    Score ``input_path`` chunk by chunk and write the input rows plus a
+    prediction column to ``output_path`` (and ``_low``/``_high`` band columns
+    for quantile models). Returns throughput statistics.
+    """
+    levels = quantile_levels(pipeline)
+    rows = 0
+    chunks = 0
+    predict_seconds = 0.0
+    start = time.perf_counter()
+
+    from src.schema import schema_for
+
+    numeric_columns = schema_for(pipeline, model_columns).numeric
+    with ChunkWriter(output_path, output_types(pipeline, model_columns), numeric_columns) as writer:
+        for chunk in iter_chunks(input_path, chunksize):
+            t0 = time.perf_counter()
+            prices = score_frame(pipeline, chunk, model_columns)
+            predict_seconds += time.perf_counter() - t0
+
+            point, low, high = split_band(prices, levels)
+            chunk[prediction_column] = point
+            if levels:
+                chunk[f"{prediction_column}_low"] = low
+                chunk[f"{prediction_column}_high"] = high
+            writer.write(chunk)
+
+            rows += len(chunk)
+            chunks += 1
+            if log is not None:
+                elapsed = time.perf_counter() - start
+                log(f"chunk {chunks}: {rows:,} rows | {rows / elapsed:,.0f} rows/sec")
+
+    elapsed = time.perf_counter() - start
+    return {
+        "rows": rows,
+        "chunks": chunks,
+        "seconds": elapsed,
+        "rows_per_sec": rows / elapsed if elapsed else 0.0,
+        "predict_seconds": predict_seconds,
+        "predict_rows_per_sec": rows / predict_seconds if predict_seconds else 0.0,
+    }
+
+
+# -----------------------------------------------------------------------------
+# CLI
+# -----------------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a vehicle inventory file in chunks.")
+    parser.add_argument("input", help="CSV or Parquet file of listings")
+    parser.add_argument("output", help="CSV or Parquet file to write priced listings to")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument("--models-dir", default=None,
+                        help="Directory containing models/ (defaults to the repo root)")
+    args = parser.parse_args(argv)
+
+    pipeline, model_columns = load_assets(args.models_dir)
+    stats = score_file(
+        args.input,
+        args.output,
+        pipeline,
+        model_columns,
+        chunksize=args.chunksize,
+    )
+
+    print("-" * 30)
+    print(f"Rows scored:   {stats['rows']:,} in {stats['chunks']} chunks")
+    print(f"Wall time:     {stats['seconds']:.2f}s")
+    print(f"Throughput:    {stats['rows_per_sec']:,.0f} rows/sec")
+    print(f"Predict only:  {stats['predict_rows_per_sec']:,.0f} rows/sec")
+    print("-" * 30)
+
+
+if __name__ == "__main__":
+    main()
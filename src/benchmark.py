@@ -0,0 +1,280 @@
+"""
+Inference latency and throughput benchmark suite.
+
+Synthesizes realistic listings from the ``input_columns.pkl`` schema (category
+vocabularies come from the fitted encoders, numeric ranges from the app's
+form widgets) and measures:
+
+* cold start: importing the serving stack and ``load_assets()`` in a fresh
+  interpreter,
+* ``pipeline.predict`` at batch sizes 1, 32, 1k and 100k: p50/p95/p99
+  latency, rows/sec and the peak RSS growth of one predict, measured in a
+  fresh interpreter so XGBoost's native allocations are counted.
+
+Results are written as JSON. Pass ``--baseline`` to compare against a stored
+run; the process exits non-zero when any metric regresses beyond
+``--threshold``.
+
+Usage:
+    python -m src.benchmark --output bench_results.json
+    python -m src.benchmark --baseline bench_baseline.json --threshold 0.15
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.assets import BASE_DIR, load_assets
+from src.features import build_model_input
+from src.schema import pipeline_vocabulary
+
+DEFAULT_BATCH_SIZES = (1, 32, 1_000, 100_000)
+
+# Options offered by the Streamlit form, used when the artifact has no vocabulary
+DEFAULT_VOCABULARY = {
+    "make": ["Toyota", "Honda", "BMW", "Maruti", "Hyundai", "Volkswagen", "Lexus", "Ford", "Chevrolet", "Nissan"],
+    "model": ["Camry", "Civic", "3 Series", "Swift", "Elantra", "Jetta", "RX", "F-150", "Malibu", "Altima"],
+    "transmission": ["Automatic", "Manual", "CVT"],
+    "fuel_type": ["Gasoline", "Diesel", "Electric", "Hybrid"],
+    "drivetrain": ["FWD", "RWD", "AWD", "4WD"],
+    "body_type": ["Sedan", "SUV", "Hatchback", "Coupe", "Truck", "Van"],
+    "condition": ["Excellent", "Good", "Fair"],
+    "accident_history": ["None", "Minor", "Major"],
+    "seller_type": ["Dealer", "Private"],
+    "trim": ["SE", "LE", "XLE", "Sport", "Base"],
+    "exterior_color": ["Black", "White", "Silver", "Blue", "Red"],
+    "interior_color": ["Black", "Beige", "Gray"],
+}
+
+# (low, high) uniform ranges matching the form widgets
+NUMERIC_RANGES = {
+    "year": (2005, 2025),
+    "mileage": (0, 300_000),
+    "engine_hp": (70, 500),
+    "owner_count": (1, 6),
+    "brand_popularity": (0.0, 1.0),
+}
+
+
+# -----------------------------------------------------------------------------
+# SYNTHETIC LISTINGS
+# -----------------------------------------------------------------------------
+def synthesize_listings(model_columns, n, pipeline=None, seed=0):
+    """Raw listing rows (with ``year``) covering every column the model reads."""
+    rng = np.random.default_rng(seed)
+    vocabulary = {**DEFAULT_VOCABULARY, **(pipeline_vocabulary(pipeline) if pipeline is not None else {})}
+
+    wanted = set(model_columns or []) | {"year", "mileage"}
+    wanted -= {"vehicle_age", "mileage_per_year"}
+    columns = {}
+    for column in sorted(wanted):
+        if column in vocabulary:
+            choices = np.asarray(vocabulary[column], dtype=object)
+            columns[column] = choices[rng.integers(len(choices), size=n)]
+        elif column in NUMERIC_RANGES:
+            low, high = NUMERIC_RANGES[column]
+            if isinstance(low, int):
+                columns[column] = rng.integers(low, high + 1, size=n)
+            else:
+                columns[column] = rng.uniform(low, high, size=n).round(3)
+        else:
+            columns[column] = np.zeros(n)
+    return pd.DataFrame(columns)
+
+
+# -----------------------------------------------------------------------------
+# MEASUREMENTS
+# -----------------------------------------------------------------------------
+_COLD_START_SCRIPT = """
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {root!r})
+from src.assets import load_assets
+t1 = time.perf_counter()
+load_assets({models_dir!r})
+t2 = time.perf_counter()
+print(json.dumps({{"import_s": t1 - t0, "load_s": t2 - t1}}))
+"""
+
+
+def measure_cold_start(models_dir=None, repeats=3):
+    """Import + ``load_assets()`` wall time in fresh interpreters (best of ``repeats``)."""
+    script = _COLD_START_SCRIPT.format(root=str(BASE_DIR), models_dir=models_dir)
+    runs = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", script], check=True, capture_output=True, text=True)
+        runs.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    best = min(runs, key=lambda r: r["import_s"] + r["load_s"])
+    return {**best, "total_s": best["import_s"] + best["load_s"]}
+
+
+_PEAK_RSS_SCRIPT = """
+import json, resource, sys
+sys.path.insert(0, {root!r})
+from src.assets import load_assets
+from src.benchmark import synthesize_listings
+from src.features import build_model_input
+pipeline, model_columns = load_assets({models_dir!r})
+batch = synthesize_listings(model_columns, {batch_size}, pipeline, {seed})
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+pipeline.predict(build_model_input(batch, pipeline, model_columns))
+print(json.dumps({{"peak_rss_mb": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline) / 1024}}))
+"""
+
+
+def measure_peak_rss(batch_size, models_dir=None, seed=0):
+    """
+    Peak RSS growth (MB) of one predict over ``batch_size`` synthesized rows
+    in a fresh interpreter. Unlike tracemalloc, this includes the native
+    buffers XGBoost allocates outside the Python heap.
+    """
+    script = _PEAK_RSS_SCRIPT.format(root=str(BASE_DIR), models_dir=models_dir, batch_size=batch_size, seed=seed)
+    output = subprocess.run([sys.executable, "-c", script], check=True, capture_output=True, text=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])["peak_rss_mb"]
+
+
+def round_robin_ms(fns, repeats):
+    """
+    Milliseconds per call, one row per function, over ``repeats`` passes. The
+    functions run round-robin, so drift (thermal, noisy neighbours) hits all
+    of them alike.
+    """
+    timings = np.empty((len(fns), repeats))
+    for r in range(repeats):
+        for i, fn in enumerate(fns):
+            t0 = time.perf_counter()
+            fn()
+            timings[i, r] = time.perf_counter() - t0
+    return timings * 1000
+
+
+def p50_ms(fns, repeats):
+    """Median milliseconds of each function in ``fns``; see :func:`round_robin_ms`."""
+    return [float(ms) for ms in np.median(round_robin_ms(fns, repeats), axis=1)]
+
+
+def _repeats_for(batch_size):
+    return int(np.clip(20_000 // batch_size, 5, 200))
+
+
+def measure_batch(predict, listings, batch_size):
+    batch = listings.head(batch_size)
+    predict(batch)  # warm-up
+
+    timings = []
+    for _ in range(_repeats_for(batch_size)):
+        t0 = time.perf_counter()
+        predict(batch)
+        timings.append(time.perf_counter() - t0)
+
+    timings_ms = np.asarray(timings) * 1000
+    p50 = float(np.percentile(timings_ms, 50))
+    return {
+        "batch_size": batch_size,
+        "repeats": len(timings),
+        "p50_ms": p50,
+        "p95_ms": float(np.percentile(timings_ms, 95)),
+        "p99_ms": float(np.percentile(timings_ms, 99)),
+        "rows_per_sec": batch_size / (p50 / 1000),
+    }
+
+
+def run_suite(models_dir=None, batch_sizes=DEFAULT_BATCH_SIZES, cold_start=True, seed=0):
+    # Measured before this process grows: Linux starts a child's ru_maxrss at the parent's peak
+    peak_rss = {size: measure_peak_rss(size, models_dir, seed) for size in batch_sizes}
+    pipeline, model_columns = load_assets(models_dir)
+    listings = synthesize_listings(model_columns, max(batch_sizes), pipeline, seed)
+
+    def predict(frame):
+        return pipeline.predict(build_model_input(frame, pipeline, model_columns))
+
+    results = {
+        "environment": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "batches": [{**measure_batch(predict, listings, size), "peak_rss_mb": peak_rss[size]} for size in batch_sizes],
+    }
+    if cold_start:
+        results["cold_start"] = measure_cold_start(models_dir)
+    return results
+
+
+# -----------------------------------------------------------------------------
+# REGRESSION CHECK
+# -----------------------------------------------------------------------------
+def compare(results, baseline, threshold=0.15):
+    """List of human-readable regressions of ``results`` against ``baseline``."""
+    regressions = []
+    previous = {b["batch_size"]: b for b in baseline.get("batches", [])}
+    for current in results["batches"]:
+        before = previous.get(current["batch_size"])
+        if before is None:
+            continue
+        for key in ("p50_ms", "p99_ms"):
+            if current[key] > before[key] * (1 + threshold):
+                regressions.append(
+                    f"batch {current['batch_size']}: {key} {before[key]:.3f} -> {current[key]:.3f}"
+                )
+        if current["rows_per_sec"] < before["rows_per_sec"] * (1 - threshold):
+            regressions.append(
+                f"batch {current['batch_size']}: rows/sec {before['rows_per_sec']:,.0f} -> "
+                f"{current['rows_per_sec']:,.0f}"
+            )
+    if "cold_start" in results and "cold_start" in baseline:
+        before, current = baseline["cold_start"]["total_s"], results["cold_start"]["total_s"]
+        if current > before * (1 + threshold):
+            regressions.append(f"cold start: {before:.2f}s -> {current:.2f}s")
+    return regressions
+
+
+def print_results(results):
+    print("-" * 72)
+    print(f"{'batch':>8} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'rows/sec':>14} {'RSS +MB':>9}")
+    for b in results["batches"]:
+        print(f"{b['batch_size']:>8,} {b['p50_ms']:>10.3f} {b['p95_ms']:>10.3f} {b['p99_ms']:>10.3f} "
+              f"{b['rows_per_sec']:>14,.0f} {b['peak_rss_mb']:>9.1f}")
+    if "cold_start" in results:
+        c = results["cold_start"]
+        print(f"cold start: import {c['import_s']:.2f}s + load_assets {c['load_s']:.2f}s = {c['total_s']:.2f}s")
+    print("-" * 72)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark valuation pipeline latency and throughput.")
+    parser.add_argument("--models-dir", default=None,
+                        help="Directory containing models/ (defaults to the repo root)")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=list(DEFAULT_BATCH_SIZES))
+    parser.add_argument("--no-cold-start", action="store_true")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", default=None, help="Previous results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="Relative slowdown tolerated before flagging a regression")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.models_dir, args.batch_sizes, cold_start=not args.no_cold_start)
+    print_results(results)
+    Path(args.output).write_text(json.dumps(results, indent=2))
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("⚠️ Performance regressions detected:")
+            for line in regressions:
+                print(f"   - {line}")
+            sys.exit(1)
+        print(f"✅ No regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
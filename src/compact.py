@@ -0,0 +1,257 @@
+"""
+Compact model artifacts: float32 constants, a pruned booster, a compressed pickle.
+
+``compact_pipeline`` returns a copy of a fitted pipeline with
+
+* the target encodings and numeric imputer medians stored as float32. They
+  reach the booster unchanged and XGBoost reads every feature as float32, so
+  predictions are bit-identical. The ``StandardScaler`` constants stay
+  float64: ``(x - mean) / scale`` rounds differently in float32 and moves
+  rows that sit on a split threshold;
+* optionally only the first ``keep_trees`` boosting rounds. The boosted
+  trees already store float32 thresholds and leaves, so compression of the
+  pickle (``--compress``) is the remaining size lever.
+
+``choose_tree_count`` scores every candidate prefix of the booster on one
+transformed holdout matrix and keeps the fewest rounds whose MAE stays within
+``--tolerance`` of the full model. ``unused_outputs`` lists preprocessor
+outputs no kept tree splits on. ``OneHotEncoder(drop="first")`` never emits
+the dropped columns, so only zero-importance outputs can show up there; they
+are reported rather than removed, because trimming a fitted encoder turns
+those categories into unknowns and changes the matrix layout the explainer
+and compiled exporter rely on.
+
+The report compares size, load time, predict latency and accuracy of every
+step against the original artifact.
+
+Usage:
+    python -m src.compact --data holdout.csv --tolerance 0.005 --compress 3 --out models/compact
+    python -m src.compact --data holdout.csv --keep-trees 800 --out models/compact
+"""
+
+import argparse
+import copy
+import tempfile
+from pathlib import Path
+
+import joblib
+import numpy as np
+
+from src.assets import COLUMNS_FILENAME, MODEL_FILENAME, STATS_FILENAME, find_assets
+
+LATENCY_REPEATS = 30
+LOAD_REPEATS = 5
+
+
+# -----------------------------------------------------------------------------
+# COMPACTION
+# -----------------------------------------------------------------------------
+def _fitted_steps(pipeline):
+    """Every fitted step inside the preprocessor's ColumnTransformer branches."""
+    steps = getattr(pipeline, "named_steps", {})
+    if "preprocessor" not in steps:
+        return []
+    found = []
+    for name, branch, _ in steps["preprocessor"].transformers_:
+        if name == "remainder" or isinstance(branch, str):
+            continue
+        found.extend(step for _, step in getattr(branch, "steps", [(None, branch)]))
+    return found
+
+
+def float32_constants(pipeline):
+    """Store target encodings and imputer medians as float32 in place; returns the values converted."""
+    converted = 0
+
+    def cast(owner, attribute):
+        nonlocal converted
+        value = getattr(owner, attribute, None)
+        if isinstance(value, np.ndarray) and value.dtype == np.float64:
+            setattr(owner, attribute, value.astype(np.float32))
+            converted += value.size
+
+    for step in _fitted_steps(pipeline):
+        kind = type(step).__name__
+        if kind == "SimpleImputer":
+            cast(step, "statistics_")
+        elif kind == "TargetEncoder" and hasattr(step, "encodings_"):
+            step.encodings_ = [np.asarray(e, dtype=np.float32) for e in step.encodings_]
+            step.target_mean_ = np.float32(step.target_mean_)
+            converted += sum(e.size for e in step.encodings_) + 1
+    return converted
+
+
+def prune_trees(pipeline, keep_trees):
+    """Keep only the first ``keep_trees`` boosting rounds of the pipeline's regressor, in place."""
+    regressor = pipeline.steps[-1][1]
+    booster = regressor.get_booster()
+    keep_trees = min(int(keep_trees), booster.num_boosted_rounds())
+    regressor._Booster = booster[:keep_trees]
+    regressor.set_params(n_estimators=keep_trees)
+    return keep_trees
+
+
+def compact_pipeline(pipeline, keep_trees=None, float32=True):
+    """A compacted deep copy of ``pipeline``; the original is left untouched."""
+    compacted = copy.deepcopy(pipeline)
+    if float32:
+        float32_constants(compacted)
+    if keep_trees is not None:
+        prune_trees(compacted, keep_trees)
+    return compacted
+
+
+def unused_outputs(pipeline):
+    """Names of preprocessor outputs that no tree of the booster splits on."""
+    booster = pipeline.steps[-1][1].get_booster()
+    names = booster.feature_names or [str(n) for n in pipeline[-2].get_feature_names_out()]
+    used = booster.get_score(importance_type="weight")
+    keys = booster.feature_names or [f"f{i}" for i in range(len(names))]
+    return [name for name, key in zip(names, keys) if key not in used]
+
+
+# -----------------------------------------------------------------------------
+# TREE COUNT SEARCH
+# -----------------------------------------------------------------------------
+def _point_prediction(pipeline, predictions):
+    if predictions.ndim == 2:
+        # quantile variant: score the median output
+        from src.quantile import quantile_levels, split_band
+
+        return split_band(predictions, quantile_levels(pipeline))[0]
+    return predictions
+
+
+def mae_by_rounds(pipeline, features, y, steps=20):
+    """``{rounds: holdout MAE}`` for ``steps`` evenly spaced booster prefixes, from one transform."""
+    booster = pipeline.steps[-1][1].get_booster()
+    total = booster.num_boosted_rounds()
+    matrix = pipeline[:-1].transform(features)
+    candidates = sorted({max(1, round(total * (i + 1) / steps)) for i in range(steps)})
+
+    y = np.asarray(y, dtype=np.float64)
+    curve = {}
+    for rounds in candidates:
+        predictions = booster.inplace_predict(matrix, iteration_range=(0, rounds))
+        curve[rounds] = float(np.mean(np.abs(_point_prediction(pipeline, predictions) - y)))
+    return curve
+
+
+def choose_tree_count(curve, tolerance):
+    """The fewest rounds whose MAE is within ``tolerance`` (relative) of the full booster."""
+    limit = curve[max(curve)] * (1 + tolerance)
+    return min(rounds for rounds, mae in curve.items() if mae <= limit)
+
+
+# -----------------------------------------------------------------------------
+# REPORT
+# -----------------------------------------------------------------------------
+def save_compact(pipeline, model_columns, out_dir, compress=0):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    joblib.dump(pipeline, out_dir / MODEL_FILENAME, compress=compress)
+    joblib.dump(list(model_columns), out_dir / COLUMNS_FILENAME)
+    (out_dir / STATS_FILENAME).unlink(missing_ok=True)
+    return out_dir / MODEL_FILENAME
+
+
+def measure(model_files, features, y, reference):
+    """Size, load time, latency and accuracy of saved pipelines, against ``reference`` predictions."""
+    from src.benchmark import p50_ms
+
+    load_ms = p50_ms([lambda f=f: joblib.load(f) for f in model_files], LOAD_REPEATS)
+    pipelines = [joblib.load(f) for f in model_files]
+    one_row, batch = features.iloc[:1], features.iloc[:1000]
+    single_ms = p50_ms([lambda p=p: p.predict(one_row) for p in pipelines], LATENCY_REPEATS)
+    batch_ms = p50_ms([lambda p=p: p.predict(batch) for p in pipelines], LATENCY_REPEATS // 3)
+
+    results = []
+    for i, (model_file, pipeline) in enumerate(zip(model_files, pipelines)):
+        predictions = _point_prediction(pipeline, pipeline.predict(features))
+        results.append({
+            "bytes": Path(model_file).stat().st_size,
+            "load_ms": load_ms[i],
+            "single_p50_ms": single_ms[i],
+            "batch_1k_p50_ms": batch_ms[i],
+            "mae": float(np.mean(np.abs(predictions - y))),
+            "max_abs_delta": float(np.max(np.abs(predictions - reference))),
+            "rounds": pipeline.steps[-1][1].get_booster().num_boosted_rounds(),
+        })
+    return results
+
+
+def print_report(rows):
+    base = rows[0][1]
+    print("-" * 104)
+    print(f"{'artifact':<28}{'trees':>6}{'size KB':>9}{'load ms':>9}{'1-row ms':>9}{'1k ms':>8}"
+          f"{'MAE':>11}{'ΔMAE':>8}{'max |Δ| $':>11}{'size':>7}")
+    for label, r in rows:
+        print(f"{label:<28}{r['rounds']:>6}{r['bytes'] / 1024:>9,.0f}{r['load_ms']:>9.1f}"
+              f"{r['single_p50_ms']:>9.2f}{r['batch_1k_p50_ms']:>8.1f}{r['mae']:>11,.2f}"
+              f"{r['mae'] / base['mae'] - 1:>8.2%}{r['max_abs_delta']:>11,.2f}{r['bytes'] / base['bytes']:>7.0%}")
+    print("-" * 104)
+
+
+def main(argv=None):
+    from src.features import build_model_input
+    from src.production_train import TARGET_COL, read_listings
+
+    parser = argparse.ArgumentParser(description="Compact a model artifact and report the tradeoffs.")
+    parser.add_argument("--data", required=True, help="Holdout listings CSV with a price column")
+    parser.add_argument("--nrows", type=int, default=20_000)
+    parser.add_argument("--models-dir", default=None,
+                        help="Directory containing models/ (defaults to the repo root)")
+    prune = parser.add_mutually_exclusive_group()
+    prune.add_argument("--keep-trees", type=int, default=None, help="Keep exactly this many boosting rounds")
+    prune.add_argument("--tolerance", type=float, default=None,
+                       help="Prune to the fewest rounds within this relative MAE increase (e.g. 0.005)")
+    parser.add_argument("--no-float32", action="store_true", help="Keep the float64 encodings and medians")
+    parser.add_argument("--compress", type=int, default=0, help="joblib zlib level for the saved pipeline (0-9)")
+    parser.add_argument("--out", default=None, help="Write the compacted artifact into this directory")
+    args = parser.parse_args(argv)
+
+    model_file, cols_file = find_assets(args.models_dir)
+    pipeline = joblib.load(model_file)
+    model_columns = joblib.load(cols_file)
+    listings = read_listings(args.data, nrows=args.nrows)
+    y = listings[TARGET_COL].to_numpy(dtype=np.float64)
+    features = build_model_input(listings.drop(columns=[TARGET_COL]), pipeline, model_columns)
+
+    reference = _point_prediction(pipeline, pipeline.predict(features))
+
+    keep_trees = args.keep_trees
+    if args.tolerance is not None:
+        curve = mae_by_rounds(pipeline, features, y)
+        keep_trees = choose_tree_count(curve, args.tolerance)
+        print(f"Rounds within {args.tolerance:.2%} of the full-model MAE: {keep_trees:,} "
+              f"of {max(curve):,} (MAE ${curve[keep_trees]:,.2f} vs ${curve[max(curve)]:,.2f})")
+
+    final = dict(float32=not args.no_float32, keep_trees=keep_trees)
+    variants = []
+    if not args.no_float32:
+        variants.append(("float32 constants", dict(float32=True), 0))
+    if keep_trees is not None:
+        variants.append((f"+ first {keep_trees:,} trees", final, 0))
+    if args.compress:
+        variants.append((f"+ zlib level {args.compress}", final, args.compress))
+
+    with tempfile.TemporaryDirectory() as scratch:
+        files = [model_file] + [
+            save_compact(compact_pipeline(pipeline, **options), model_columns, Path(scratch) / str(i), compress)
+            for i, (_, options, compress) in enumerate(variants)
+        ]
+        labels = ["original"] + [label for label, _, _ in variants]
+        rows = list(zip(labels, measure(files, features, y, reference)))
+    print_report(rows)
+
+    compacted = compact_pipeline(pipeline, **final)
+    unused = unused_outputs(compacted)
+    print(f"Unused preprocessor outputs: {', '.join(unused) if unused else 'none'}")
+
+    if args.out:
+        path = save_compact(compacted, model_columns, args.out, args.compress)
+        print(f"✅ Compact artifact saved to {path} ({path.stat().st_size / 1024:,.0f} KB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+"""
+Comparable sold listings: a nearest-neighbor index over the training inventory.
+
+Listings are compared in the pipeline's own transformed feature space (the
+preprocessor output the booster sees). Each column is standardized and
+weighted by the square root of its share of the booster's total split gain,
+so the distance follows what actually moves the price. ``--dims`` optionally
+projects that space onto its leading principal components.
+
+``build_comparables`` sorts the inventory by ``make``/``model`` and writes:
+
+* ``vectors.npy``    - float32 ``(n_rows, dims)`` projected listings,
+* ``norms.npy``      - float32 squared norms of those vectors,
+* ``prices.npy``     - float32 sold prices,
+* ``details.npy``    - structured array of display columns (categoricals as codes),
+* ``partitions.npy`` - ``(make, model, start, end)`` per make/model, as vocabulary codes,
+* ``comparables.json`` - format version, model fingerprint, projection and vocabularies.
+
+``ComparablesIndex.search`` resolves each query's make/model partition with a
+dictionary lookup and scans only that slice of the memory-mapped vectors, all
+queries of a partition in one matrix product. Queries are transformed with
+the NumPy lowering from ``src.compiled``, not the sklearn preprocessor, so a
+single lookup stays in the low milliseconds. An unseen model falls back to
+its make; an unseen make returns no comparables. An index built for a
+different model artifact is never used.
+
+Usage:
+    python -m src.comparables build --data vehicle_price_prediction.csv --dims 12
+    python -m src.comparables evaluate --data vehicle_price_prediction.csv --queries 500 --k 10
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.compiled import CompiledScorer, lower_pipeline
+from src.features import build_model_input
+from src.production_train import TARGET_COL
+
+FORMAT_VERSION = 1
+META_FILENAME = "comparables.json"
+ARRAY_FILENAMES = ["vectors", "norms", "prices", "details", "partitions"]
+DEFAULT_COMPARABLES_DIR = Path(__file__).resolve().parent.parent / "models" / "comparables"
+
+PARTITION_COLS = ["make", "model"]
+DETAIL_COLS = ["make", "model", "year", "trim", "mileage", "engine_hp", "condition",
+               "accident_history", "owner_count"]
+PARTITION_DTYPE = np.dtype([("make", "<i4"), ("model", "<i4"), ("start", "<i8"), ("end", "<i8")])
+
+
+# -----------------------------------------------------------------------------
+# FEATURE SPACE
+# -----------------------------------------------------------------------------
+def transformed_matrix(pipeline, model_columns, frame, chunk_rows=200_000):
+    """The preprocessor output for raw listing rows, as float64."""
+    if "preprocessor" not in getattr(pipeline, "named_steps", {}):
+        raise NotImplementedError("Comparables need the encoded (ColumnTransformer) pipeline variant")
+    blocks = []
+    for start in range(0, len(frame), chunk_rows):
+        block = build_model_input(frame.iloc[start:start + chunk_rows], pipeline, model_columns)
+        blocks.append(np.asarray(pipeline[:-1].transform(block), dtype=np.float64))
+    return np.vstack(blocks) if blocks else np.empty((0, 0))
+
+
+def gain_weights(pipeline, n_features):
+    """sqrt of each output's share of the booster's total split gain (0 for unused outputs)."""
+    booster = pipeline.steps[-1][1].get_booster()
+    keys = booster.feature_names or [f"f{i}" for i in range(n_features)]
+    gain = booster.get_score(importance_type="total_gain")
+    share = np.array([gain.get(key, 0.0) for key in keys], dtype=np.float64)
+    return np.sqrt(share / share.sum())
+
+
+def fit_projection(matrix, weights, dims=None, sample_rows=100_000, seed=42):
+    """``(center, scale, components)``: standardize, weight, and optionally keep ``dims`` principal axes."""
+    center = matrix.mean(axis=0)
+    std = matrix.std(axis=0)
+    scale = np.divide(weights, std, out=np.zeros_like(std), where=std > 0)
+    if dims is None or dims >= matrix.shape[1]:
+        return center, scale, None
+
+    rng = np.random.default_rng(seed)
+    sample = matrix[rng.choice(len(matrix), min(sample_rows, len(matrix)), replace=False)]
+    _, _, vt = np.linalg.svd((sample - center) * scale, full_matrices=False)
+    return center, scale, vt[:dims]
+
+
+def _partition_table(details):
+    """One ``(make, model, start, end)`` record per run of equal make/model codes."""
+    make, model = details["make"], details["model"]
+    starts = np.flatnonzero(np.r_[True, (make[1:] != make[:-1]) | (model[1:] != model[:-1])])
+    table = np.empty(len(starts), dtype=PARTITION_DTYPE)
+    table["make"], table["model"] = make[starts], model[starts]
+    table["start"], table["end"] = starts, np.r_[starts[1:], len(details)]
+    return table
+
+
+# -----------------------------------------------------------------------------
+# BUILD
+# -----------------------------------------------------------------------------
+def build_comparables(pipeline, model_columns, fingerprint, listings, out_dir=DEFAULT_COMPARABLES_DIR, dims=None):
+    """Project ``listings`` (with prices) into the model's feature space and write the index files."""
+    t0 = time.perf_counter()
+    listings = listings.dropna(subset=PARTITION_COLS + [TARGET_COL])
+    listings = listings.sort_values(PARTITION_COLS, kind="stable").reset_index(drop=True)
+
+    matrix = transformed_matrix(pipeline, model_columns, listings.drop(columns=[TARGET_COL]))
+    center, scale, components = fit_projection(matrix, gain_weights(pipeline, matrix.shape[1]), dims)
+    vectors = (matrix - center) * scale
+    if components is not None:
+        vectors = vectors @ components.T
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    del matrix
+
+    details = np.empty(len(listings), dtype=[(c, "<i4") for c in DETAIL_COLS if c in listings.columns])
+    listings[PARTITION_COLS] = listings[PARTITION_COLS].astype(str)
+    vocabulary = {}
+    for column in details.dtype.names:
+        values = listings[column]
+        if values.dtype.kind in "biuf":
+            details[column] = values.fillna(-1).to_numpy(dtype=np.int64)
+        else:
+            # Missing values get code -1; listings() shows them as None
+            codes, uniques = pd.factorize(values.astype(object))
+            details[column] = codes
+            vocabulary[column] = [str(u) for u in uniques]
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    arrays = {
+        "vectors": vectors,
+        "norms": np.einsum("ij,ij->i", vectors, vectors),
+        "prices": listings[TARGET_COL].to_numpy(dtype=np.float32),
+        "details": details,
+        "partitions": _partition_table(details),
+    }
+    for name, array in arrays.items():
+        np.save(out_dir / f"{name}.npy", array)
+
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "model_fingerprint": fingerprint,
+        "n_rows": len(listings),
+        "dims": int(vectors.shape[1]),
+        "center": center.tolist(),
+        "scale": scale.tolist(),
+        "components": None if components is None else components.tolist(),
+        "vocabulary": vocabulary,
+        "build_seconds": time.perf_counter() - t0,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(out_dir / META_FILENAME, "w") as f:
+        json.dump(meta, f)
+    return out_dir
+
+
+# -----------------------------------------------------------------------------
+# SEARCH
+# -----------------------------------------------------------------------------
+class ComparablesIndex:
+    def __init__(self, meta, arrays, pipeline, model_columns):
+        self.meta = meta
+        self.pipeline = pipeline
+        self.model_columns = model_columns
+        self.center = np.asarray(meta["center"])
+        self.scale = np.asarray(meta["scale"])
+        self.components = None if meta["components"] is None else np.asarray(meta["components"])
+        try:
+            self.compiled = CompiledScorer(lower_pipeline(pipeline), booster=None)
+        except NotImplementedError:
+            self.compiled = None
+        for name in ARRAY_FILENAMES:
+            setattr(self, name, arrays[name])
+
+        # A make's models are contiguous, so a make spans its first to last partition
+        make_names = meta["vocabulary"]["make"]
+        model_names = meta["vocabulary"]["model"]
+        self._by_model, self._by_make = {}, {}
+        for make, model, start, end in self.partitions.tolist():
+            self._by_model[(make_names[make], model_names[model])] = (start, end)
+            first, _ = self._by_make.get(make_names[make], (start, end))
+            self._by_make[make_names[make]] = (first, end)
+
+    @classmethod
+    def load(cls, pipeline, model_columns, directory=DEFAULT_COMPARABLES_DIR, fingerprint=None, mmap=True):
+        """Load an index; raises ``ValueError`` if it was built for another model artifact."""
+        directory = Path(directory)
+        with open(directory / META_FILENAME) as f:
+            meta = json.load(f)
+        if meta.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported comparables format {meta.get('format_version')}")
+        if fingerprint is not None and meta["model_fingerprint"] != fingerprint:
+            raise ValueError("Comparables index was built for a different model artifact; rebuild it")
+        mode = "r" if mmap else None
+        arrays = {name: np.load(directory / f"{name}.npy", mmap_mode=mode) for name in ARRAY_FILENAMES}
+        return cls(meta, arrays, pipeline, model_columns)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in ARRAY_FILENAMES)
+
+    def project(self, frame):
+        """float32 query vectors for raw listing rows."""
+        if self.compiled is not None:
+            matrix = self.compiled.transform({c: frame[c].to_numpy() for c in frame.columns})
+        else:
+            matrix = transformed_matrix(self.pipeline, self.model_columns, frame)
+        vectors = (matrix - self.center) * self.scale
+        if self.components is not None:
+            vectors = vectors @ self.components.T
+        return vectors.astype(np.float32)
+
+    def _ranges(self, frame):
+        """``(start, end)`` rows to scan per query: its make/model, else its make, else empty."""
+        makes = frame["make"].to_numpy(dtype=object) if "make" in frame.columns else [None] * len(frame)
+        models = frame["model"].to_numpy(dtype=object) if "model" in frame.columns else [None] * len(frame)
+        ranges = [self._by_model.get((str(make), str(model))) or self._by_make.get(str(make), (0, 0))
+                  for make, model in zip(makes, models)]
+        return np.array(ranges, dtype=np.int64).reshape(-1, 2).T
+
+    def search(self, frame, k=10):
+        """``(rows, distances)``, each ``(len(frame), k)``; rows are -1 and distances inf where fewer exist."""
+        rows = np.full((len(frame), k), -1, dtype=np.int64)
+        distances = np.full((len(frame), k), np.inf, dtype=np.float32)
+        if not len(frame):
+            return rows, distances
+        queries = self.project(frame)
+        start, end = self._ranges(frame)
+
+        # All queries sharing a partition are scored with one matrix product
+        for s, e in set(zip(start.tolist(), end.tolist())):
+            if e <= s:
+                continue
+            members = np.flatnonzero((start == s) & (end == e))
+            block = self.vectors[s:e]
+            d2 = self.norms[s:e][None, :] - 2 * (queries[members] @ block.T)
+            kk = min(k, e - s)
+            nearest = np.argpartition(d2, kk - 1, axis=1)[:, :kk]
+            order = np.take_along_axis(d2, nearest, axis=1).argsort(axis=1)
+            nearest = np.take_along_axis(nearest, order, axis=1)
+            q2 = np.einsum("ij,ij->i", queries[members], queries[members])[:, None]
+            rows[members, :kk] = s + nearest
+            distances[members, :kk] = np.sqrt(np.maximum(np.take_along_axis(d2, nearest, axis=1) + q2, 0))
+        return rows, distances
+
+    def listings(self, rows):
+        """
+        Display frame (details plus price) for index rows; -1 entries are
+        skipped. A category that was missing at build time (code -1) shows as
+        ``None``.
+        """
+        rows = np.asarray(rows).ravel()
+        rows = rows[rows >= 0]
+        details = self.details[rows]
+        frame = {}
+        for column in details.dtype.names:
+            codes = details[column]
+            if column in self.meta["vocabulary"]:
+                # None is appended after the vocabulary, so code -1 indexes it
+                labels = np.asarray(self.meta["vocabulary"][column] + [None], dtype=object)
+                frame[column] = labels[codes]
+            else:
+                frame[column] = codes
+        frame = pd.DataFrame(frame)
+        frame[TARGET_COL] = self.prices[rows].astype(np.float64)
+        return frame
+
+    def comparables(self, frame, k=10):
+        """Long frame of the ``k`` nearest sold listings per query row (``query``, ``rank``, ``distance``, ...)."""
+        rows, distances = self.search(frame, k)
+        found = rows >= 0
+        result = self.listings(rows[found])
+        query, rank = np.nonzero(found)
+        result.insert(0, "query", query)
+        result.insert(1, "rank", rank + 1)
+        result.insert(2, "distance", distances[found].astype(np.float64))
+        return result
+
+
+def load_comparables(pipeline, model_columns, fingerprint, directory=DEFAULT_COMPARABLES_DIR):
+    """The index for this model artifact, or ``None`` when it is missing or stale."""
+    try:
+        return ComparablesIndex.load(pipeline, model_columns, directory, fingerprint)
+    except (FileNotFoundError, ValueError, NotImplementedError) as e:
+        print(f"⚠️ Comparables disabled: {e}")
+        return None
+
+
+# -----------------------------------------------------------------------------
+# EVALUATION
+# -----------------------------------------------------------------------------
+def brute_force(matrix, partitions, query_matrix, query_partitions, k):
+    """Exact float64 k-NN by a linear scan of every row, restricted to the query's make/model."""
+    rows = np.full((len(query_matrix), k), -1, dtype=np.int64)
+    distances = np.full((len(query_matrix), k), np.inf)
+    for i, (vector, key) in enumerate(zip(query_matrix, query_partitions)):
+        d = np.where(partitions == key, np.sqrt(((matrix - vector) ** 2).sum(axis=1)), np.inf)
+        nearest = np.argsort(d)[:k]
+        nearest = nearest[np.isfinite(d[nearest])]
+        rows[i, :len(nearest)], distances[i, :len(nearest)] = nearest, d[nearest]
+    return rows, distances
+
+
+def evaluate(index, listings, n_queries=500, k=10, seed=0):
+    """Recall@k and latency of the index against exact brute force, for held-in listings as queries."""
+    listings = listings.dropna(subset=PARTITION_COLS + [TARGET_COL])
+    listings = listings.sort_values(PARTITION_COLS, kind="stable").reset_index(drop=True)
+    if len(listings) != index.meta["n_rows"]:
+        raise ValueError("--data must be the inventory the index was built from")
+    features = listings.drop(columns=[TARGET_COL])
+    queries = features.sample(min(n_queries, len(features)), random_state=seed)
+    # Served queries arrive as plain objects, not the CSV reader's categoricals
+    queries = queries.astype({c: object for c in queries.columns if queries[c].dtype.kind not in "biuf"})
+
+    # Exact distances in the full weighted space, float64
+    matrix = (transformed_matrix(index.pipeline, index.model_columns, features) - index.center) * index.scale
+    query_matrix = matrix[queries.index.to_numpy()]
+    table = index.partitions
+    partitions = np.repeat(np.arange(len(table)), table["end"] - table["start"])
+
+    t0 = time.perf_counter()
+    exact_rows, exact_distances = brute_force(matrix, partitions, query_matrix, partitions[queries.index], k)
+    brute_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+
+    single = []
+    for i in range(len(queries)):
+        t0 = time.perf_counter()
+        index.search(queries.iloc[i:i + 1], k)
+        single.append(time.perf_counter() - t0)
+    t0 = time.perf_counter()
+    rows, _ = index.search(queries, k)
+    batch_ms = (time.perf_counter() - t0) * 1000
+
+    # A returned row counts if its exact distance is within the true k-th distance (ties are not misses)
+    found = rows >= 0
+    returned = np.where(found, np.sqrt(((matrix[np.where(found, rows, 0)] - query_matrix[:, None, :]) ** 2)
+                                       .sum(axis=2)), np.inf)
+    kth = exact_distances.max(axis=1, where=np.isfinite(exact_distances), initial=0)[:, None]
+    recall = (returned <= kth * (1 + 1e-6) + 1e-9).sum(axis=1) / np.maximum((exact_rows >= 0).sum(axis=1), 1)
+    return {
+        "queries": len(queries),
+        "k": k,
+        "recall": float(recall.mean()),
+        "min_recall": float(recall.min()),
+        "single_p50_ms": sorted(single)[len(single) // 2] * 1000,
+        "batch_ms_per_query": batch_ms / len(queries),
+        "brute_force_ms_per_query": brute_ms,
+    }
+
+
+def main(argv=None):
+    from src.assets import find_assets, load_assets
+    from src.prediction_cache import artifact_fingerprint
+    from src.production_train import read_listings
+
+    parser = argparse.ArgumentParser(description="Build or evaluate the comparable-listings index.")
+    parser.add_argument("command", choices=["build", "evaluate"])
+    parser.add_argument("--data", required=True, help="Sold listings CSV with a price column (the training inventory)")
+    parser.add_argument("--models-dir", default=None,
+                        help="Directory containing models/ (defaults to the repo root)")
+    parser.add_argument("--out", default=str(DEFAULT_COMPARABLES_DIR))
+    parser.add_argument("--dims", type=int, default=None,
+                        help="Keep this many principal axes of the weighted feature space (default: all)")
+    parser.add_argument("--nrows", type=int, default=None)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    pipeline, model_columns = load_assets(args.models_dir)
+    fingerprint = artifact_fingerprint(find_assets(args.models_dir)[0])
+    listings = read_listings(args.data, nrows=args.nrows)
+
+    if args.command == "build":
+        out_dir = build_comparables(pipeline, model_columns, fingerprint, listings, args.out, args.dims)
+        t0 = time.perf_counter()
+        index = ComparablesIndex.load(pipeline, model_columns, out_dir, fingerprint)
+        load_ms = (time.perf_counter() - t0) * 1000
+        print("-" * 30)
+        print(f"Listings:        {index.meta['n_rows']:,} in {len(index.partitions):,} make/model partitions")
+        print(f"Dimensions:      {index.meta['dims']}")
+        print(f"Build time:      {index.meta['build_seconds']:.1f}s")
+        print(f"Index size:      {index.nbytes / 2**20:.2f} MB (memory-mapped load {load_ms:.1f} ms)")
+        print("-" * 30)
+        print(f"✅ Comparables index saved to {out_dir}")
+        return
+
+    index = ComparablesIndex.load(pipeline, model_columns, args.out, fingerprint)
+    results = evaluate(index, listings, args.queries, args.k)
+    print("-" * 30)
+    print(f"Queries:          {results['queries']:,} (k={results['k']})")
+    print(f"Recall@k:         {results['recall']:.1%} (worst query {results['min_recall']:.0%})")
+    print(f"Index, 1 query:   {results['single_p50_ms']:.2f} ms p50")
+    print(f"Index, batched:   {results['batch_ms_per_query']:.3f} ms/query")
+    print(f"Brute force:      {results['brute_force_ms_per_query']:.1f} ms/query")
+    print("-" * 30)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+"""
+Compiled, pickle-free inference path.
+
+``export_compiled`` lowers the fitted preprocessor into plain lookup tables
+and affine constants (``preprocessor.json``) and saves the booster in
+XGBoost's native UBJ format (``booster.ubj``). ``CompiledScorer`` rebuilds the
+feature matrix with NumPy only and scores it with ``Booster.inplace_predict``,
+skipping pandas, ``ColumnTransformer`` and ``DMatrix`` overhead.
+
+Every categorical column becomes a table with one output row per known
+category plus a final row for unknown values; every numeric column becomes
+``(x - offset) / scale`` after median imputation.
+
+Usage:
+    python -m src.compiled export --out models/compiled
+    python -m src.compiled bench --data listings.csv
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+
+from src.features import LEGACY_REFERENCE_YEAR, pipeline_reference_year
+
+FORMAT_VERSION = 1
+SPEC_FILENAME = "preprocessor.json"
+BOOSTER_FILENAME = "booster.ubj"
+DEFAULT_COMPILED_DIR = Path(__file__).resolve().parent.parent / "models" / "compiled"
+
+
+# -----------------------------------------------------------------------------
+# LOWERING (sklearn -> tables)
+# -----------------------------------------------------------------------------
+def _split_branch(branch):
+    """Return ``(imputer, encoder_or_scaler)`` from a ColumnTransformer branch."""
+    steps = [step for _, step in getattr(branch, "steps", [(None, branch)])]
+    imputer = next((s for s in steps if type(s).__name__ == "SimpleImputer"), None)
+    rest = [s for s in steps if s is not imputer]
+    if len(rest) > 1:
+        raise NotImplementedError(f"Cannot lower branch with steps {steps}")
+    return imputer, (rest[0] if rest else None)
+
+
+def _imputer_fill(imputer, i):
+    if imputer is None:
+        return None
+    value = imputer.statistics_[i]
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _lower_categorical(column, fill, encoder, i):
+    kind = type(encoder).__name__
+    categories = [str(c) for c in encoder.categories_[i]]
+
+    if kind == "OrdinalEncoder":
+        unknown = encoder.unknown_value if encoder.handle_unknown == "use_encoded_value" else np.nan
+        table = [[float(k)] for k in range(len(categories))] + [[float(unknown)]]
+
+    elif kind == "OneHotEncoder":
+        if getattr(encoder, "infrequent_categories_", None) is not None and any(
+            c is not None for c in encoder.infrequent_categories_
+        ):
+            raise NotImplementedError("Infrequent category grouping is not supported")
+        drop = None if encoder.drop_idx_ is None else encoder.drop_idx_[i]
+        width = len(categories) - (drop is not None)
+        table = []
+        for k in range(len(categories)):
+            row = [0.0] * width
+            if drop is None or k != drop:
+                row[k - (drop is not None and k > drop)] = 1.0
+            table.append(row)
+        # handle_unknown='ignore' encodes unseen categories as all zeros
+        table.append([0.0] * width)
+
+    elif kind == "TargetEncoder" and hasattr(encoder, "encodings_"):
+        table = [[float(v)] for v in encoder.encodings_[i]] + [[float(encoder.target_mean_)]]
+
+    else:
+        raise NotImplementedError(f"Cannot lower encoder {kind}")
+
+    return {
+        "column": column,
+        "kind": "categorical",
+        "fill": None if fill is None else str(fill),
+        "categories": categories,
+        "table": table,
+    }
+
+
+def _lower_numeric(column, fill, scaler, i):
+    offset, scale = 0.0, 1.0
+    if scaler is not None:
+        if type(scaler).__name__ != "StandardScaler":
+            raise NotImplementedError(f"Cannot lower scaler {type(scaler).__name__}")
+        if scaler.mean_ is not None:
+            offset = float(scaler.mean_[i])
+        if scaler.scale_ is not None:
+            scale = float(scaler.scale_[i])
+    return {
+        "column": column,
+        "kind": "numeric",
+        "fill": None if fill is None else float(fill),
+        "offset": offset,
+        "scale": scale,
+    }
+
+
+def lower_pipeline(pipeline):
+    """Describe the fitted pipeline's preprocessing as a JSON-serializable dict."""
+    if "preprocessor" not in pipeline.named_steps:
+        raise NotImplementedError("Only the encoded (ColumnTransformer) pipeline variant can be compiled")
+    preprocessor = pipeline.named_steps["preprocessor"]
+    columns = []
+    for name, branch, branch_columns in preprocessor.transformers_:
+        if branch == "drop" or name == "remainder":
+            continue
+        if branch == "passthrough":
+            raise NotImplementedError("passthrough branches are not supported")
+
+        imputer, encoder = _split_branch(branch)
+        categorical = encoder is not None and hasattr(encoder, "categories_")
+        for i, column in enumerate(branch_columns):
+            fill = _imputer_fill(imputer, i)
+            if categorical:
+                columns.append(_lower_categorical(column, fill, encoder, i))
+            else:
+                columns.append(_lower_numeric(column, fill, encoder, i))
+
+    regressor = pipeline.steps[-1][1]
+    try:
+        iteration_range = [0, int(regressor.best_iteration) + 1]
+    except AttributeError:
+        iteration_range = None
+
+    return {
+        "format_version": FORMAT_VERSION,
+        "reference_year": int(pipeline_reference_year(pipeline)),
+        "iteration_range": iteration_range,
+        "columns": columns,
+    }
+
+
+def export_compiled(pipeline, out_dir=DEFAULT_COMPILED_DIR):
+    """Write ``preprocessor.json`` and ``booster.ubj`` for ``pipeline`` into ``out_dir``."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    spec = lower_pipeline(pipeline)
+    with open(out_dir / SPEC_FILENAME, "w") as f:
+        json.dump(spec, f)
+    pipeline.steps[-1][1].get_booster().save_model(out_dir / BOOSTER_FILENAME)
+    return out_dir
+
+
+# -----------------------------------------------------------------------------
+# SCORING (NumPy only)
+# -----------------------------------------------------------------------------
+def _missing_mask(values):
+    if values.dtype.kind in "fc":
+        return np.isnan(values)
+    if values.dtype == object:
+        return (values == None) | (values != values)  # noqa: E711 - elementwise None/NaN check
+    return np.zeros(len(values), dtype=bool)
+
+
+class _CategoricalLookup:
+    def __init__(self, spec):
+        categories = np.asarray(spec["categories"], dtype=str)
+        order = np.argsort(categories)
+        self.column = spec["column"]
+        self.fill = spec["fill"]
+        self.sorted_categories = categories[order]
+        self.sorted_to_row = order
+        self.table = np.asarray(spec["table"], dtype=np.float64)
+        self.unknown_row = len(categories)
+        self.width = self.table.shape[1]
+
+    def __call__(self, values, out):
+        values = np.asarray(values, dtype=object)
+        missing = _missing_mask(values)
+        if self.fill is not None and missing.any():
+            values = values.copy()
+            values[missing] = self.fill
+        keys = values.astype(str)
+
+        rows = np.full(len(keys), self.unknown_row)
+        if len(self.sorted_categories):
+            pos = np.searchsorted(self.sorted_categories, keys)
+            pos = np.minimum(pos, len(self.sorted_categories) - 1)
+            found = self.sorted_categories[pos] == keys
+            if self.fill is None:
+                found &= ~missing
+            rows[found] = self.sorted_to_row[pos[found]]
+        out[:] = self.table[rows]
+
+
+class _NumericAffine:
+    width = 1
+
+    def __init__(self, spec):
+        self.column = spec["column"]
+        self.fill = spec["fill"]
+        self.offset = spec["offset"]
+        self.scale = spec["scale"]
+
+    def __call__(self, values, out):
+        x = np.asarray(values, dtype=np.float64)
+        if self.fill is not None:
+            x = np.where(np.isnan(x), self.fill, x)
+        out[:, 0] = (x - self.offset) / self.scale
+
+
+class CompiledScorer:
+    """Score raw listing rows from a directory written by :func:`export_compiled`."""
+
+    def __init__(self, spec, booster):
+        if spec.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported compiled format: {spec.get('format_version')}")
+        self.spec = spec
+        self.booster = booster
+        self.reference_year = spec.get("reference_year", LEGACY_REFERENCE_YEAR)
+        self.iteration_range = tuple(spec["iteration_range"] or (0, 0))
+        self.steps = [
+            _CategoricalLookup(c) if c["kind"] == "categorical" else _NumericAffine(c)
+            for c in spec["columns"]
+        ]
+        self.n_features = sum(step.width for step in self.steps)
+
+    @classmethod
+    def load(cls, directory=DEFAULT_COMPILED_DIR, load_booster=True):
+        """Load a compiled directory; ``load_booster=False`` keeps only the preprocessing."""
+        directory = Path(directory)
+        with open(directory / SPEC_FILENAME) as f:
+            spec = json.load(f)
+        booster = None
+        if load_booster:
+            import xgboost as xgb
+
+            booster = xgb.Booster()
+            booster.load_model(directory / BOOSTER_FILENAME)
+        return cls(spec, booster)
+
+    def _engineer(self, rows, n):
+        """NumPy mirror of ``src.features.engineer_features``."""
+        columns = {name: rows[name] for name in rows.keys()}
+        if "year" in columns:
+            age = self.reference_year - np.asarray(columns["year"], dtype=np.float64)
+        elif "vehicle_age" in columns:
+            age = np.asarray(columns["vehicle_age"], dtype=np.float64)
+        else:
+            age = None
+        if age is not None:
+            columns["vehicle_age"] = age
+            if "mileage" in columns:
+                mileage = np.asarray(columns["mileage"], dtype=np.float64)
+                columns["mileage_per_year"] = mileage / np.where(age == 0, 1, age)
+        if "accident_history" in columns:
+            values = np.asarray(columns["accident_history"], dtype=object)
+            missing = _missing_mask(values)
+            if missing.any():
+                values = values.copy()
+                values[missing] = "None"
+            columns["accident_history"] = values
+        return columns
+
+    def transform(self, rows):
+        """Build the float32 feature matrix the booster was trained on."""
+        n = len(rows[next(iter(rows.keys()))])
+        columns = self._engineer(rows, n)
+        matrix = np.empty((n, self.n_features), dtype=np.float32)
+        start = 0
+        for step in self.steps:
+            # Absent columns behave like the ``reindex(fill_value=0)`` in serving
+            values = columns.get(step.column, np.zeros(n, dtype=object))
+            block = np.empty((n, step.width), dtype=np.float64)
+            step(values, block)
+            matrix[:, start:start + step.width] = block
+            start += step.width
+        return matrix
+
+    def predict(self, rows):
+        """
+        Price a batch given a mapping of column name to 1-D sequence
+        (a DataFrame or a dict of lists/arrays).
+        """
+        matrix = self.transform(rows)
+        return self.booster.inplace_predict(matrix, iteration_range=self.iteration_range)
+
+    def predict_one(self, record):
+        """Price a single listing given as a ``{column: value}`` dict."""
+        return float(self.predict({k: [v] for k, v in record.items()})[0])
+
+
+# -----------------------------------------------------------------------------
+# BENCHMARK
+# -----------------------------------------------------------------------------
+def benchmark(pipeline, model_columns, scorer, listings, repeats=200):
+    """Compare ``pipeline.predict`` against the compiled scorer on ``listings``."""
+    from src.benchmark import round_robin_ms
+    from src.features import build_model_input
+
+    expected = pipeline.predict(build_model_input(listings, pipeline, model_columns))
+    actual = scorer.predict(listings)
+    max_abs_diff = float(np.max(np.abs(expected - actual)))
+
+    results = {"max_abs_diff": max_abs_diff}
+    for label, size in (("single", 1), ("batch_1k", 1000)):
+        batch = listings.head(size)
+        records = {c: batch[c].to_numpy() for c in batch.columns}
+        timings = round_robin_ms([
+            lambda: pipeline.predict(build_model_input(batch, pipeline, model_columns)),
+            lambda: scorer.predict(records),
+        ], repeats)
+        p50, p99 = np.percentile(timings, [50, 99], axis=1)
+        results[label] = {"pipeline": (p50[0], p99[0]), "compiled": (p50[1], p99[1])}
+    return results
+
+
+def main(argv=None):
+    from src.assets import load_assets
+
+    parser = argparse.ArgumentParser(description="Export or benchmark the compiled scorer.")
+    parser.add_argument("command", choices=["export", "bench"])
+    parser.add_argument("--models-dir", default=None,
+                        help="Directory containing models/ (defaults to the repo root)")
+    parser.add_argument("--out", default=str(DEFAULT_COMPILED_DIR))
+    parser.add_argument("--data", help="CSV of listings to benchmark with (bench only)")
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    pipeline, model_columns = load_assets(args.models_dir)
+
+    if args.command == "export":
+        out_dir = export_compiled(pipeline, args.out)
+        print(f"✅ Compiled artifacts saved to {out_dir}")
+        return
+
+    import pandas as pd
+
+    if not args.data:
+        parser.error("bench requires --data")
+    listings = pd.read_csv(args.data, nrows=1000)
+    scorer = CompiledScorer.load(args.out)
+    results = benchmark(pipeline, model_columns, scorer, listings, args.repeats)
+
+    print("-" * 30)
+    print(f"Max |pipeline - compiled|: {results['max_abs_diff']:.6f}")
+    for label in ("single", "batch_1k"):
+        for engine in ("pipeline", "compiled"):
+            p50, p99 = results[label][engine]
+            print(f"{label:<9} {engine:<9} p50 {p50:8.3f} ms | p99 {p99:8.3f} ms")
+    print("-" * 30)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,484 @@
+"""
+Data-parallel training across worker processes with XGBoost's collective.
+
+Every worker loads only its shard of the listings: a byte range of the CSV,
+cut at line boundaries, or every N-th record batch of a feature cache
+directory (see ``src.feature_cache``). The preprocessor statistics are then
+aggregated across shards with ``xgboost.collective`` (allreduce and
+broadcast), so no process ever holds the full dataset:
+
+* the one-hot, ordinal and target encoder vocabularies are the union of the
+  shards' categories, and the ordinal imputer uses the global mode;
+* the numeric imputer medians are exact, found by a bisection over the
+  values' bit patterns with one allreduce of counts per step;
+* the ``StandardScaler`` mean and variance come from global sums;
+* the ``TargetEncoder`` encodings use per-category count, sum and sum of
+  squares, which is all its "auto" smoothing needs. The training matrix gets
+  cross-fitted encodings like ``TargetEncoder.fit_transform``: each of the
+  ``cv`` folds is encoded with statistics of the other folds, across all
+  shards.
+
+The fitted values are written into a pipeline from ``build_pipeline``, then
+each worker builds a ``DMatrix`` from its shard and they train one booster
+together through the tracker (``xgboost.tracker.RabitTracker``, started on
+127.0.0.1). The holdout split and the folds come from a hash of each row, so
+the rows in them do not depend on the worker count. The saved artifact is
+the same ``vehicle_price_pipeline.pkl`` / ``input_columns.pkl`` pair that
+``src.production_train`` writes.
+
+``--scaling 1,2,4`` trains once per worker count and reports wall time,
+speedup and efficiency (speedup / workers) per stage.
+
+Usage:
+    python -m src.distributed_train --data big.csv --workers 4 --out models
+    python -m src.distributed_train --data big.csv --scaling 1,2,4 --n-estimators 300
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import queue
+import time
+import traceback
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.production_train import (
+    DEFAULT_XGB_PARAMS,
+    LEGACY_REFERENCE_YEAR,
+    _booster_params,
+    _dtypes_for,
+    build_pipeline,
+    coerce_numeric,
+    peak_rss_mb,
+    print_scorecard,
+    save_artifacts,
+    split_xy,
+)
+
+HASH_BUCKETS = 10_000
+TRACKER_HOST = "127.0.0.1"
+WORKER_TIMEOUT_SECONDS = 6 * 3600
+_SIGN = np.uint64(1 << 63)
+
+
+# -----------------------------------------------------------------------------
+# SHARDS
+# -----------------------------------------------------------------------------
+def _line_start(f, position, body_start):
+    """First line start at or after ``position``."""
+    if position <= body_start:
+        return body_start
+    f.seek(position - 1)
+    f.readline()
+    return f.tell()
+
+
+def read_shard(path, index, count):
+    """Shard ``index`` of ``count``: a line-aligned byte range of a CSV, or every ``count``-th cache batch."""
+    from src.feature_cache import is_feature_cache, iter_features
+
+    if is_feature_cache(path):
+        return pd.concat(list(iter_features(path, shard=(index, count))), ignore_index=True)
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        header = f.readline()
+        body_start = f.tell()
+        start = _line_start(f, body_start + (size - body_start) * index // count, body_start)
+        end = _line_start(f, body_start + (size - body_start) * (index + 1) // count, body_start)
+        f.seek(start)
+        body = f.read(end - start)
+    # float32 numbers in every shard, so a row hashes the same whichever shard holds it
+    return coerce_numeric(pd.read_csv(io.BytesIO(header + body), dtype=_dtypes_for(path)), downcast=False)
+
+
+def row_hashes(frame):
+    """Content hash per row; decides holdout membership and target-encoding fold."""
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy()
+
+
+# -----------------------------------------------------------------------------
+# CROSS-SHARD STATISTICS
+# -----------------------------------------------------------------------------
+def allreduce(values, op=None):
+    from xgboost import collective
+
+    return collective.allreduce(np.ascontiguousarray(values), op if op is not None else collective.Op.SUM)
+
+
+def allgather(obj):
+    """Every worker's ``obj``, in rank order."""
+    from xgboost import collective
+
+    return [collective.broadcast(obj, root) for root in range(collective.get_world_size())]
+
+
+def _order_keys(values):
+    """uint64 keys that sort like the float64 ``values``."""
+    bits = np.ascontiguousarray(values, dtype=np.float64).view(np.uint64)
+    return np.where(bits >> np.uint64(63), ~bits, bits | _SIGN)
+
+
+def _from_keys(keys):
+    bits = np.where(keys >> np.uint64(63), keys ^ _SIGN, ~keys)
+    return bits.view(np.float64)
+
+
+def global_medians(columns):
+    """
+    Exact ``np.median`` of each column over all shards (NaNs ignored), like
+    ``SimpleImputer(strategy="median")``. Bisects the ordered bit patterns of
+    the two middle values; every step is one allreduce of counts.
+    """
+    from xgboost import collective
+
+    columns = [v[~np.isnan(v)] for v in columns]
+    keys = [np.sort(_order_keys(v)) for v in columns]
+    n = allreduce(np.array([len(v) for v in columns], dtype=np.int64))
+    low = allreduce(np.array([v.min() if len(v) else np.inf for v in columns]), collective.Op.MIN)
+    high = allreduce(np.array([v.max() if len(v) else -np.inf for v in columns]), collective.Op.MAX)
+
+    # Smallest key with at least rank + 1 values at or below it, for both middle ranks
+    ranks = np.r_[(n - 1) // 2, n // 2] + 1
+    lo = np.tile(_order_keys(np.where(n > 0, low, 0.0)), 2)
+    hi = np.tile(_order_keys(np.where(n > 0, high, 0.0)), 2)
+    local = keys + keys
+    while (lo < hi).any():
+        mid = lo + (hi - lo) // np.uint64(2)
+        counts = allreduce(np.array([np.searchsorted(k, m, side="right") for k, m in zip(local, mid)],
+                                    dtype=np.int64))
+        enough = counts >= ranks
+        hi = np.where(enough, mid, hi)
+        lo = np.where(enough, lo, mid + np.uint64(1))
+    middle = _from_keys(lo).reshape(2, -1)
+    return np.where(n > 0, (middle[0] + middle[1]) / 2, np.nan)
+
+
+def global_counts(series_by_column):
+    """``{column: Counter}`` of every value's count over all shards."""
+    local = {}
+    for column, series in series_by_column.items():
+        counts = series.value_counts()
+        local[column] = counts[counts > 0].to_dict()
+    totals = {column: Counter() for column in local}
+    for shard in allgather(local):
+        for column, counts in shard.items():
+            totals[column].update(counts)
+    return totals
+
+
+def _smoothed(n, sz, szz, shift):
+    """``TargetEncoder(smooth="auto")`` encodings from counts and shifted sums (last axis: categories)."""
+    total_n, total_sz, total_szz = n.sum(-1), sz.sum(-1), szz.sum(-1)
+    y_mean = total_sz / total_n + shift
+    y_variance = total_szz / total_n - (total_sz / total_n) ** 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        squared_diffs = np.maximum(szz - sz * sz / n, 0.0)
+        lam = y_variance[..., None] * n / (y_variance[..., None] * n + squared_diffs / n)
+        encoded = lam * (sz / n + shift) + (1 - lam) * y_mean[..., None]
+    return np.where(np.isnan(lam), y_mean[..., None], encoded), y_mean
+
+
+def target_statistics(frame, y, folds, n_folds, categories):
+    """
+    Full and cross-fitted target encodings of every column in ``categories``.
+    Returns ``(encodings, target_mean, crossfit)`` where ``crossfit`` is the
+    shard's ``(rows, columns)`` training matrix block.
+    """
+    from xgboost import collective
+
+    # Shift by rank 0's mean, so the sums of squares keep their precision
+    shift = collective.broadcast(float(np.mean(y)) if len(y) else 0.0, 0)
+    z = y - shift
+    codes, local = [], []
+    for column, cats in categories.items():
+        code = pd.Categorical(frame[column], categories=cats).codes.astype(np.int64)
+        flat = folds * len(cats) + code
+        size = n_folds * len(cats)
+        codes.append(code)
+        local += [np.bincount(flat, minlength=size), np.bincount(flat, weights=z, minlength=size),
+                  np.bincount(flat, weights=z * z, minlength=size)]
+    sizes = [len(part) for part in local]
+    summed = np.split(allreduce(np.concatenate(local).astype(np.float64)), np.cumsum(sizes)[:-1])
+
+    encodings, crossfit = [], np.empty((len(frame), len(categories)))
+    for j, cats in enumerate(categories.values()):
+        n, sz, szz = (summed[3 * j + i].reshape(n_folds, len(cats)) for i in range(3))
+        full, target_mean = _smoothed(n.sum(0), sz.sum(0), szz.sum(0), shift)
+        encodings.append(full)
+        # Fold k is encoded with the statistics of every other fold
+        per_fold, _ = _smoothed(n.sum(0) - n, sz.sum(0) - sz, szz.sum(0) - szz, shift)
+        crossfit[:, j] = per_fold[folds, codes[j]]
+    return encodings, float(target_mean), crossfit
+
+
+def _target_encoder(preprocessor):
+    """The (unfitted) target encoder of a preprocessor from ``build_preprocessor``."""
+    encoder = {name: branch for name, branch, _ in preprocessor.transformers}["target"].named_steps["encoder"]
+    if not hasattr(encoder, "cv"):
+        raise NotImplementedError("Distributed training needs scikit-learn's TargetEncoder")
+    return encoder
+
+
+def fit_preprocessor(pipeline, features, y, folds):
+    """
+    Fit ``pipeline``'s feature step and preprocessor from every shard's
+    ``features`` (the feature step's output) and ``y``; returns this shard's
+    training matrix.
+    """
+    from sklearn.preprocessing._data import _handle_zeros_in_scale
+
+    preprocessor = pipeline.named_steps["preprocessor"]
+    branches = {name: columns for name, _, columns in preprocessor.transformers if len(columns)}
+    encoder = _target_encoder(preprocessor) if "target" in branches else None
+    fills = {"onehot": "Missing", "target": "Unknown"}
+
+    # 1. Vocabularies and the ordinal mode
+    categorical = {c: features[c].astype(object).fillna(fills[b]) if b in fills else features[c].astype(object)
+                   for b in ("ord", "onehot", "target") for c in branches.get(b, [])}
+    counts = global_counts(categorical)
+    vocabulary = {c: sorted(counts[c]) for c in categorical}
+
+    # 2. Numeric medians, then the scaler over the imputed values
+    numeric = branches.get("num", [])
+    values = [features[c].to_numpy(dtype=np.float64, na_value=np.nan) for c in numeric]
+    medians = global_medians(values)
+    imputed = [np.where(np.isnan(v), m, v) for v, m in zip(values, medians)]
+    n_rows = allreduce(np.array([len(features)], dtype=np.int64))[0]
+    mean = allreduce(np.array([v.sum() for v in imputed])) / n_rows
+    variance = allreduce(np.array([np.square(v - m).sum() for v, m in zip(imputed, mean)])) / n_rows
+
+    # 3. Fit the structure on a small frame holding every category, then write in the global statistics
+    length = max([len(v) for v in vocabulary.values()] + [2])
+    template = pd.DataFrame({
+        c: np.resize(np.array(vocabulary[c], dtype=object), length) if c in vocabulary else np.arange(length, dtype=float)
+        for c in features.columns
+    })
+    preprocessor.fit(template, np.arange(length, dtype=np.float64))
+    fitted = preprocessor.named_transformers_
+    if "ord" in branches:
+        # most frequent value, the smallest one on a tie, as SimpleImputer picks it
+        modes = [min(v for v, k in counts[c].items() if k == max(counts[c].values())) for c in branches["ord"]]
+        fitted["ord"].named_steps["imputer"].statistics_ = np.array(modes, dtype=object)
+    if numeric:
+        fitted["num"].named_steps["imputer"].statistics_ = medians
+        scaler = fitted["num"].named_steps["scaler"]
+        scaler.mean_, scaler.var_ = mean, variance
+        scaler.scale_ = _handle_zeros_in_scale(np.sqrt(variance), copy=False)
+        scaler.n_samples_seen_ = np.int64(n_rows)
+
+    matrix = preprocessor.transform(features)
+    if encoder is not None:
+        target = fitted["target"].named_steps["encoder"]
+        fitted_categories = {c: list(cats) for c, cats in zip(branches["target"], target.categories_)}
+        encodings, target_mean, crossfit = target_statistics(
+            pd.DataFrame({c: categorical[c] for c in branches["target"]}), y, folds, encoder.cv, fitted_categories)
+        target.encodings_, target.target_mean_ = encodings, target_mean
+        matrix[:, preprocessor.output_indices_["target"]] = crossfit
+    return matrix
+
+
+def global_metrics(y, predictions):
+    """``production_train.evaluate`` metrics over every shard's holdout rows."""
+    error = predictions - y
+    sums = allreduce(np.array([
+        len(y), np.abs(error).sum(), np.square(error).sum(),
+        (np.abs(error) / np.maximum(np.abs(y), np.finfo(np.float64).eps)).sum(), y.sum(), np.square(y).sum(),
+    ]))
+    n, abs_sum, sq_sum, ape_sum, y_sum, y_sq_sum = sums
+    mape = ape_sum / n
+    return {
+        "accuracy": 100 * (1 - mape),
+        "r2": 1 - sq_sum / (y_sq_sum - y_sum ** 2 / n),
+        "mae": abs_sum / n,
+        "rmse": float(np.sqrt(sq_sum / n)),
+        "mape": mape,
+    }
+
+
+# -----------------------------------------------------------------------------
+# WORKER
+# -----------------------------------------------------------------------------
+def _worker(tracker_args, config, results):
+    import xgboost as xgb
+    from xgboost import collective
+
+    try:
+        with collective.CommunicatorContext(**tracker_args):
+            rank, world = collective.get_rank(), collective.get_world_size()
+            stages = {}
+            t0 = time.perf_counter()
+            shard = read_shard(config["data_path"], rank, world)
+            hashes = row_hashes(shard)
+            holdout = hashes % HASH_BUCKETS < config["test_size"] * HASH_BUCKETS
+            train, test = shard[~holdout], shard[holdout]
+            train_hashes = hashes[~holdout]
+            del shard
+            X, y = split_xy(train)
+            columns = allgather(list(X.columns))[0]
+            X = X.reindex(columns=columns)
+            stages["load_s"] = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            pipeline = build_pipeline(columns, config["reference_year"], config["xgb_params"])
+            n_folds = _target_encoder(pipeline.named_steps["preprocessor"]).cv
+            folds = ((train_hashes // HASH_BUCKETS) % n_folds).astype(np.int64)
+            features = pipeline.named_steps["features"].fit(X).transform(X)
+            matrix = fit_preprocessor(pipeline, features, y.to_numpy(), folds)
+            del features
+            stages["preprocess_s"] = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            params, rounds = _booster_params(config["xgb_params"])
+            params["nthread"] = config["nthread"]
+            dtrain = xgb.DMatrix(matrix.astype(np.float32), label=y.to_numpy(), nthread=config["nthread"])
+            del matrix
+            booster = xgb.train(params, dtrain, num_boost_round=rounds)
+            del dtrain
+            pipeline.named_steps["regressor"].load_model(bytearray(booster.save_raw("ubj")))
+            stages["train_s"] = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            X_test, y_test = split_xy(test)
+            metrics = global_metrics(y_test.to_numpy(), pipeline.predict(X_test.reindex(columns=columns)))
+            stages["evaluate_s"] = time.perf_counter() - t0
+
+            if rank == 0 and config["out_dir"]:
+                save_artifacts(pipeline, columns, config["out_dir"])
+            results.put({"rank": rank, "rows": len(train), "stages": stages, "peak_rss_mb": peak_rss_mb(),
+                         "metrics": metrics if rank == 0 else None})
+    except BaseException:
+        results.put({"error": traceback.format_exc()})
+        raise
+
+
+def train_distributed(data_path, workers, out_dir=None, test_size=0.15, reference_year=LEGACY_REFERENCE_YEAR,
+                      xgb_params=None, nthread=None):
+    """Train with ``workers`` processes; returns the run summary (stages, per-worker rows, metrics)."""
+    from xgboost.tracker import RabitTracker
+
+    config = {
+        "data_path": str(data_path),
+        "out_dir": str(out_dir) if out_dir else None,
+        "test_size": test_size,
+        "reference_year": reference_year,
+        "xgb_params": {**DEFAULT_XGB_PARAMS, **(xgb_params or {})},
+        "nthread": nthread or max(1, (os.cpu_count() or 1) // workers),
+    }
+    tracker = RabitTracker(n_workers=workers, host_ip=TRACKER_HOST)
+    tracker.start()
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [context.Process(target=_worker, args=(tracker.worker_args(), config, results), daemon=True)
+                 for _ in range(workers)]
+
+    t0 = time.perf_counter()
+    for process in processes:
+        process.start()
+    reports = []
+    deadline = time.monotonic() + WORKER_TIMEOUT_SECONDS
+    try:
+        while len(reports) < workers:
+            try:
+                report = results.get(timeout=1.0)
+            except queue.Empty:
+                if time.monotonic() > deadline or any(p.exitcode not in (None, 0) for p in processes):
+                    raise RuntimeError("A training worker exited without reporting")
+                continue
+            if "error" in report:
+                raise RuntimeError(f"Training worker failed:\n{report['error']}")
+            reports.append(report)
+        for process in processes:
+            process.join()
+        tracker.wait_for()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+    wall = time.perf_counter() - t0
+
+    reports.sort(key=lambda r: r["rank"])
+    return {
+        "workers": workers,
+        "wall_s": wall,
+        # a stage takes as long as its slowest worker
+        "stages": {name: max(r["stages"][name] for r in reports) for name in reports[0]["stages"]},
+        "rows": [r["rows"] for r in reports],
+        "peak_rss_mb": max(r["peak_rss_mb"] for r in reports),
+        "metrics": reports[0]["metrics"],
+    }
+
+
+# -----------------------------------------------------------------------------
+# REPORT
+# -----------------------------------------------------------------------------
+def print_scaling(runs):
+    base = runs[0]
+    print("-" * 100)
+    print(f"{'workers':>7}{'wall s':>9}{'load s':>8}{'prep s':>8}{'train s':>9}{'rows/s':>11}"
+          f"{'speedup':>9}{'effic.':>8}{'max RSS MB':>12}{'MAE':>11}")
+    for run in runs:
+        speedup = base["wall_s"] / run["wall_s"]
+        stages = run["stages"]
+        print(f"{run['workers']:>7}{run['wall_s']:>9.1f}{stages['load_s']:>8.1f}{stages['preprocess_s']:>8.1f}"
+              f"{stages['train_s']:>9.1f}{sum(run['rows']) / run['wall_s']:>11,.0f}{speedup:>9.2f}"
+              f"{speedup * base['workers'] / run['workers']:>8.0%}{run['peak_rss_mb']:>12,.0f}"
+              f"{run['metrics']['mae']:>11,.2f}")
+    print("-" * 100)
+    print(f"CPUs available: {os.cpu_count()}; threads per worker: cpu_count // workers")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the vehicle price pipeline across worker processes.")
+    parser.add_argument("--data", required=True, help="Listings CSV with a price column, or a feature cache")
+    parser.add_argument("--out", default=str(Path(__file__).resolve().parent.parent / "models"))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--scaling", default=None,
+                        help="Comma-separated worker counts to compare, e.g. 1,2,4 (artifacts from the last)")
+    parser.add_argument("--threads-per-worker", type=int, default=None,
+                        help="XGBoost threads in each worker (defaults to cpu_count // workers)")
+    parser.add_argument("--test-size", type=float, default=0.15)
+    parser.add_argument("--reference-year", type=int, default=LEGACY_REFERENCE_YEAR,
+                        help="Year vehicle_age is measured from; pinned in the artifact")
+    parser.add_argument("--n-estimators", type=int, default=DEFAULT_XGB_PARAMS["n_estimators"])
+    parser.add_argument("--learning-rate", type=float, default=DEFAULT_XGB_PARAMS["learning_rate"])
+    parser.add_argument("--max-depth", type=int, default=DEFAULT_XGB_PARAMS["max_depth"])
+    parser.add_argument("--register", nargs="?", default=None, metavar="REGISTRY",
+                        const=str(Path(__file__).resolve().parent.parent / "models" / "registry"),
+                        help="Also publish and activate the artifacts as a new registry version")
+    args = parser.parse_args(argv)
+
+    xgb_params = {
+        "n_estimators": args.n_estimators,
+        "learning_rate": args.learning_rate,
+        "max_depth": args.max_depth,
+    }
+    counts = [int(n) for n in args.scaling.split(",")] if args.scaling else [args.workers]
+    runs = []
+    for i, workers in enumerate(counts):
+        run = train_distributed(args.data, workers, args.out if i == len(counts) - 1 else None, args.test_size,
+                                args.reference_year, xgb_params, args.threads_per_worker)
+        print(f"✅ {workers} worker(s): {run['wall_s']:.1f}s, rows per worker {run['rows']}")
+        runs.append(run)
+
+    print_scorecard(runs[-1]["metrics"])
+    if len(runs) > 1:
+        print_scaling(runs)
+    print(f"✅ Deployment Artifacts Saved to {args.out}")
+    print(json.dumps({"metrics": runs[-1]["metrics"], "runs": [{k: v for k, v in r.items() if k != "metrics"}
+                                                              for r in runs]}, indent=2, default=float))
+
+    if args.register:
+        from src.registry import ModelRegistry
+
+        version = ModelRegistry(args.register).publish(args.out, runs[-1]["metrics"], training_data=args.data)
+        print(f"✅ Published and activated registry version {version}")
+
+
+if __name__ == "__main__":
+    main()
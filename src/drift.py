@@ -0,0 +1,502 @@
+"""
+Streaming drift and accuracy monitoring with constant-memory sketches.
+
+``build_profile`` summarizes a reference dataset (ideally the training
+holdout) for one model artifact and saves it as ``drift_profile.json`` next
+to ``vehicle_price_pipeline.pkl``:
+
+* every numeric input and the predicted price: counts over the reference's
+  own quantile bins (``REFERENCE_BINS`` equal-mass bins, plus one bin below
+  and one above the observed range);
+* every categorical input: the share of each category the encoders know;
+* with labels, the absolute error distribution and MAE.
+
+``DriftMonitor`` keeps the same summaries for live traffic in fixed memory:
+``NumericSketch`` counts values into the reference bins (quantiles are read
+back by interpolating within a bin), ``CategorySketch`` counts known
+categories exactly and tracks unseen values, the ones ``TargetEncoder`` and
+``OneHotEncoder`` score as unknown, with a SpaceSaving heavy-hitter table of
+``capacity`` entries. Counts decay by half every ``half_life_rows`` rows, so
+the scores follow recent traffic. Drift is reported as PSI per feature
+(0.1 moderate, 0.25 major), a KS distance for numeric features and the
+unknown-category rate.
+
+``observe`` only puts the frame on a bounded queue; a background thread
+applies the updates in batches. A full queue drops the frame and counts it
+instead of slowing the request down.
+
+Usage:
+    python -m src.drift profile --data holdout.csv
+    python -m src.drift check --data recent_requests.csv
+"""
+
+import argparse
+import json
+import queue
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+FORMAT_VERSION = 1
+PROFILE_FILENAME = "drift_profile.json"
+REFERENCE_BINS = 20
+HEAVY_HITTER_CAPACITY = 64
+DEFAULT_HALF_LIFE_ROWS = 100_000
+DEFAULT_QUEUE_SIZE = 1_024
+PSI_MODERATE = 0.1
+PSI_MAJOR = 0.25
+PREDICTION = "predicted_price"
+ABS_ERROR = "abs_error"
+
+# Smoothing for empty bins, so a PSI term is never log(0)
+_EPSILON = 1e-4
+
+
+def psi(reference, live):
+    """Population stability index between two count vectors over the same bins."""
+    ref = np.asarray(reference, dtype=np.float64)
+    cur = np.asarray(live, dtype=np.float64)
+    if ref.sum() <= 0 or cur.sum() <= 0:
+        return 0.0
+    ref = np.maximum(ref / ref.sum(), _EPSILON)
+    cur = np.maximum(cur / cur.sum(), _EPSILON)
+    return float(np.sum((cur - ref) * np.log(cur / ref)))
+
+
+# -----------------------------------------------------------------------------
+# SKETCHES
+# -----------------------------------------------------------------------------
+class NumericSketch:
+    """Counts over fixed bin edges: ``len(edges) + 1`` floats, whatever the stream length."""
+
+    def __init__(self, edges):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.counts = np.zeros(len(self.edges) + 1)
+        self.missing = 0.0
+        self.low = np.inf
+        self.high = -np.inf
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        finite = np.isfinite(values)
+        self.missing += float((~finite).sum())
+        values = values[finite]
+        if len(values):
+            self.counts += np.bincount(np.searchsorted(self.edges, values, side="right"),
+                                       minlength=len(self.counts))
+            self.low = min(self.low, float(values.min()))
+            self.high = max(self.high, float(values.max()))
+
+    def decay(self, factor):
+        self.counts *= factor
+        self.missing *= factor
+
+    @property
+    def total(self):
+        return float(self.counts.sum())
+
+    def quantile(self, q):
+        """Approximate ``q``-quantile, linear within the bin it falls in."""
+        total = self.total
+        if total <= 0:
+            return float("nan")
+        bounds = np.r_[min(self.low, self.edges[0]), self.edges, max(self.high, self.edges[-1])]
+        cumulative = np.cumsum(self.counts)
+        i = int(np.searchsorted(cumulative, q * total))
+        before = cumulative[i - 1] if i else 0.0
+        share = (q * total - before) / self.counts[i] if self.counts[i] else 0.0
+        return float(bounds[i] + share * (bounds[i + 1] - bounds[i]))
+
+    def ks(self, reference_counts):
+        """Largest gap between the reference and live CDFs at the bin edges."""
+        ref = np.cumsum(reference_counts) / max(np.sum(reference_counts), 1e-12)
+        cur = np.cumsum(self.counts) / max(self.total, 1e-12)
+        return float(np.max(np.abs(ref - cur))) if self.total else 0.0
+
+
+class CategorySketch:
+    """
+    Exact counts for the ``categories`` a model knows, plus a SpaceSaving
+    table of at most ``capacity`` unseen values. A heavy hitter's count may
+    be overestimated by at most its recorded ``error``.
+    """
+
+    def __init__(self, categories, capacity=HEAVY_HITTER_CAPACITY):
+        self.categories = pd.Index([str(c) for c in categories], dtype=object)
+        self.counts = np.zeros(len(self.categories))
+        self.unknown = 0.0
+        self.missing = 0.0
+        self.capacity = capacity
+        self.unseen = {}  # value -> [count, error]
+
+    def update(self, values):
+        values = pd.Series(values, dtype=object)
+        missing = values.isna().to_numpy()
+        self.missing += float(missing.sum())
+        values = values[~missing].astype(str)
+        codes = self.categories.get_indexer(values)
+        known = codes >= 0
+        self.counts += np.bincount(codes[known], minlength=len(self.counts))
+        if not known.all():
+            unseen = values[~known].value_counts()
+            self.unknown += float(unseen.sum())
+            for value, count in unseen.items():
+                self._space_saving(value, float(count))
+
+    def _space_saving(self, value, count):
+        if value in self.unseen:
+            self.unseen[value][0] += count
+        elif len(self.unseen) < self.capacity:
+            self.unseen[value] = [count, 0.0]
+        else:
+            # Replace the smallest entry; its count becomes the newcomer's error bound
+            smallest = min(self.unseen, key=lambda k: self.unseen[k][0])
+            floor = self.unseen.pop(smallest)[0]
+            self.unseen[value] = [floor + count, floor]
+
+    def decay(self, factor):
+        self.counts *= factor
+        self.unknown *= factor
+        self.missing *= factor
+        for entry in self.unseen.values():
+            entry[0] *= factor
+            entry[1] *= factor
+
+    @property
+    def total(self):
+        return float(self.counts.sum() + self.unknown)
+
+    def heavy_hitters(self, n=5):
+        """The ``n`` most frequent values, known or not: ``(value, count, known)``."""
+        known = [(c, float(k), True) for c, k in zip(self.categories, self.counts) if k > 0]
+        unseen = [(v, entry[0], False) for v, entry in self.unseen.items()]
+        return sorted(known + unseen, key=lambda item: -item[1])[:n]
+
+
+# -----------------------------------------------------------------------------
+# REFERENCE PROFILE
+# -----------------------------------------------------------------------------
+def _point_prices(pipeline, features):
+    from src.quantile import quantile_levels, split_band
+
+    return split_band(pipeline.predict(features), quantile_levels(pipeline))[0]
+
+
+def _numeric_reference(values):
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    edges = np.unique(np.quantile(values, np.linspace(0, 1, REFERENCE_BINS + 1)))
+    sketch = NumericSketch(edges)
+    sketch.update(values)
+    return {"edges": edges.tolist(), "counts": sketch.counts.tolist()}
+
+
+def build_profile(pipeline, model_columns, fingerprint, listings, target_col="price"):
+    """Reference summaries of ``listings`` (raw rows, optionally with prices) for one model artifact."""
+    from src.features import build_model_input
+    from src.schema import schema_for
+
+    labels = listings[target_col].to_numpy(dtype=np.float64) if target_col in listings.columns else None
+    schema = schema_for(pipeline, model_columns)
+    checked = schema.validate(listings.drop(columns=[target_col], errors="ignore"))
+    frame = checked.frame[checked.valid]
+    predicted = _point_prices(pipeline, build_model_input(frame, pipeline, model_columns))
+
+    profile = {
+        "format_version": FORMAT_VERSION,
+        "model_fingerprint": fingerprint,
+        "rows": len(frame),
+        "numeric": {column: _numeric_reference(frame[column]) for column in schema.numeric},
+        "categorical": {},
+        "prediction": _numeric_reference(predicted),
+        "accuracy": None,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    for column in schema.categorical:
+        sketch = CategorySketch(schema.vocabulary.get(column, []))
+        sketch.update(frame[column])
+        profile["categorical"][column] = {
+            "categories": sketch.categories.tolist(),
+            "counts": sketch.counts.tolist(),
+            "unknown_rate": sketch.unknown / max(sketch.total, 1.0),
+        }
+    if labels is not None:
+        errors = np.abs(predicted - labels[checked.valid])
+        profile["accuracy"] = {**_numeric_reference(errors), "mae": float(errors.mean())}
+    return profile
+
+
+def profile_path(model_file):
+    return Path(model_file).parent / PROFILE_FILENAME
+
+
+def save_profile(profile, path):
+    with open(path, "w") as f:
+        json.dump(profile, f)
+    return Path(path)
+
+
+def load_profile(path):
+    """The saved profile, or ``None`` when there is none."""
+    try:
+        with open(path) as f:
+            profile = json.load(f)
+    except FileNotFoundError:
+        return None
+    if profile.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported drift profile format {profile.get('format_version')}")
+    return profile
+
+
+# -----------------------------------------------------------------------------
+# MONITOR
+# -----------------------------------------------------------------------------
+class DriftMonitor:
+    """
+    Live sketches for one reference profile. ``observe`` is safe to call from
+    request threads; ``scores`` reads a consistent snapshot.
+
+    ``profile_for(key)`` returns the profile for a model key (e.g. a registry
+    version). When the key passed to ``observe`` changes, the monitor loads
+    that profile and starts from empty sketches, on its own thread.
+    """
+
+    def __init__(self, profile_for, half_life_rows=DEFAULT_HALF_LIFE_ROWS, queue_size=DEFAULT_QUEUE_SIZE):
+        self.profile_for = profile_for
+        self.half_life_rows = half_life_rows
+        self.profile = None
+        self.key = object()
+        self.rows = 0
+        self.dropped = 0
+        self.error = None
+        self._since_decay = 0
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="drift-monitor", daemon=True)
+        self._thread.start()
+
+    def observe(self, frame, prices, key=None, actual=None):
+        """Queue validated input rows and their predicted prices (and sold prices, if known)."""
+        try:
+            self._queue.put_nowait((key, frame, prices, actual))
+        except queue.Full:
+            self.dropped += len(frame)
+
+    def flush(self, timeout=10.0):
+        """Block until everything queued so far has been applied."""
+        done = threading.Event()
+        self._queue.put((None, None, done, None), timeout=timeout)
+        done.wait(timeout)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _reset(self, key):
+        self.key = key
+        self.profile = self.profile_for(key)
+        self.rows = 0
+        self._since_decay = 0
+        if self.profile is None:
+            return
+        self.numeric = {c: NumericSketch(p["edges"]) for c, p in self.profile["numeric"].items()}
+        self.categorical = {c: CategorySketch(p["categories"]) for c, p in self.profile["categorical"].items()}
+        self.prediction = NumericSketch(self.profile["prediction"]["edges"])
+        accuracy = self.profile.get("accuracy")
+        self.errors = NumericSketch(accuracy["edges"]) if accuracy else None
+        self._abs_error = [0.0, 0.0]  # decayed sum and count
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            # Coalesce whatever else is waiting into one vectorized update
+            while not self._queue.empty() and len(items) < 256:
+                items.append(self._queue.get_nowait())
+            for item in items:
+                if item is None:
+                    return
+                key, frame, prices, actual = item
+                if frame is None:
+                    prices.set()
+                    continue
+                try:
+                    with self._lock:
+                        if key != self.key:
+                            self._reset(key)
+                        if self.profile is not None:
+                            self._update(frame, prices, actual)
+                except Exception as e:
+                    self.error = e
+
+    def _update(self, frame, prices, actual):
+        for column, sketch in self.numeric.items():
+            if column in frame.columns:
+                sketch.update(frame[column].to_numpy(dtype=np.float64, na_value=np.nan))
+        for column, sketch in self.categorical.items():
+            if column in frame.columns:
+                sketch.update(frame[column])
+        prices = np.asarray(prices, dtype=np.float64)
+        if prices.ndim == 2:
+            # quantile models: monitor the median output
+            prices = prices[:, prices.shape[1] // 2]
+        self.prediction.update(prices)
+        if actual is not None and self.errors is not None:
+            errors = np.abs(prices - np.asarray(actual, dtype=np.float64))
+            errors = errors[np.isfinite(errors)]
+            self.errors.update(errors)
+            self._abs_error[0] += float(errors.sum())
+            self._abs_error[1] += len(errors)
+
+        self.rows += len(frame)
+        self._since_decay += len(frame)
+        if self.half_life_rows and self._since_decay >= self.half_life_rows:
+            self._since_decay = 0
+            for sketch in [*self.numeric.values(), *self.categorical.values(), self.prediction, self.errors]:
+                if sketch is not None:
+                    sketch.decay(0.5)
+            self._abs_error = [v * 0.5 for v in self._abs_error]
+
+    def scores(self):
+        """Per-feature drift scores against the reference profile."""
+        with self._lock:
+            if self.profile is None:
+                return {"rows": self.rows, "dropped": self.dropped, "profile": None}
+            features = {}
+            for column, sketch in self.numeric.items():
+                reference = self.profile["numeric"][column]["counts"]
+                features[column] = {
+                    "kind": "numeric", "psi": psi(reference, sketch.counts), "ks": sketch.ks(reference),
+                    "median": sketch.quantile(0.5), "missing_rate": sketch.missing / max(sketch.total, 1.0),
+                }
+            for column, sketch in self.categorical.items():
+                reference = self.profile["categorical"][column]
+                features[column] = {
+                    "kind": "categorical",
+                    "psi": psi(reference["counts"] + [reference["unknown_rate"] * sum(reference["counts"])],
+                               np.r_[sketch.counts, sketch.unknown]),
+                    "unknown_rate": sketch.unknown / max(sketch.total, 1.0),
+                    "top_unknown": [v for v, _, known in sketch.heavy_hitters(HEAVY_HITTER_CAPACITY)
+                                    if not known][:5],
+                }
+            reference = self.profile["prediction"]["counts"]
+            features[PREDICTION] = {
+                "kind": "prediction", "psi": psi(reference, self.prediction.counts),
+                "ks": self.prediction.ks(reference), "median": self.prediction.quantile(0.5),
+            }
+            accuracy = None
+            if self.errors is not None and self._abs_error[1] > 0:
+                accuracy = {
+                    "mae": self._abs_error[0] / self._abs_error[1],
+                    "reference_mae": self.profile["accuracy"]["mae"],
+                    "psi": psi(self.profile["accuracy"]["counts"], self.errors.counts),
+                }
+            worst = max(features, key=lambda c: features[c]["psi"])
+            return {
+                "rows": self.rows,
+                "dropped": self.dropped,
+                "model_fingerprint": self.profile["model_fingerprint"],
+                "max_psi": features[worst]["psi"],
+                "max_psi_feature": worst,
+                "features": features,
+                "accuracy": accuracy,
+            }
+
+    def prometheus(self, prefix="vehicle_price"):
+        """Drift scores in Prometheus text format."""
+        scores = self.scores()
+        lines = [f"# TYPE {prefix}_drift_rows gauge", f"{prefix}_drift_rows {scores['rows']}",
+                 f"# TYPE {prefix}_drift_dropped_rows counter", f"{prefix}_drift_dropped_rows {scores['dropped']}"]
+        if scores.get("features"):
+            lines.append(f"# TYPE {prefix}_drift_psi gauge")
+            lines += [f'{prefix}_drift_psi{{feature="{c}"}} {s["psi"]:.6g}' for c, s in scores["features"].items()]
+            lines.append(f"# TYPE {prefix}_unknown_category_rate gauge")
+            lines += [f'{prefix}_unknown_category_rate{{feature="{c}"}} {s["unknown_rate"]:.6g}'
+                      for c, s in scores["features"].items() if s["kind"] == "categorical"]
+        if scores.get("accuracy"):
+            lines += [f"# TYPE {prefix}_live_mae gauge", f"{prefix}_live_mae {scores['accuracy']['mae']:.6g}"]
+        return "\n".join(lines) + "\n"
+
+
+# -----------------------------------------------------------------------------
+# CLI
+# -----------------------------------------------------------------------------
+def print_scores(scores):
+    print("-" * 78)
+    print(f"{'feature':<20}{'PSI':>8}{'KS':>7}{'median':>12}{'unknown':>9}  status / top unseen values")
+    for column, s in sorted(scores["features"].items(), key=lambda item: -item[1]["psi"]):
+        status = "major" if s["psi"] >= PSI_MAJOR else "moderate" if s["psi"] >= PSI_MODERATE else "ok"
+        ks = f"{s['ks']:.3f}" if "ks" in s else ""
+        median = f"{s['median']:,.1f}" if "median" in s else ""
+        unknown = f"{s['unknown_rate']:.1%}" if "unknown_rate" in s else ""
+        extra = ", ".join(map(str, s.get("top_unknown", [])))
+        print(f"{column:<20}{s['psi']:>8.3f}{ks:>7}{median:>12}{unknown:>9}  {status}{'  ' + extra if extra else ''}")
+    print("-" * 78)
+    if scores["accuracy"]:
+        a = scores["accuracy"]
+        print(f"Live MAE ${a['mae']:,.2f} vs reference ${a['reference_mae']:,.2f} (error PSI {a['psi']:.3f})")
+
+
+def main(argv=None):
+    from src.assets import find_assets, load_assets
+    from src.features import build_model_input
+    from src.prediction_cache import artifact_fingerprint
+    from src.production_train import TARGET_COL
+
+    parser = argparse.ArgumentParser(description="Build a drift reference profile or check a file against it.")
+    parser.add_argument("command", choices=["profile", "check"])
+    parser.add_argument("--data", required=True, help="Listings CSV (a price column enables accuracy monitoring)")
+    parser.add_argument("--models-dir", default=None,
+                        help="Directory containing models/ (defaults to the repo root)")
+    parser.add_argument("--nrows", type=int, default=None)
+    parser.add_argument("--chunksize", type=int, default=1_000, help="Rows per observe() call in check")
+    args = parser.parse_args(argv)
+
+    pipeline, model_columns = load_assets(args.models_dir)
+    model_file = find_assets(args.models_dir)[0]
+    fingerprint = artifact_fingerprint(model_file)
+
+    if args.command == "profile":
+        listings = pd.read_csv(args.data, nrows=args.nrows)
+        path = save_profile(build_profile(pipeline, model_columns, fingerprint, listings), profile_path(model_file))
+        print(f"✅ Drift profile for {len(listings):,} rows saved to {path}")
+        return
+
+    profile = load_profile(profile_path(model_file))
+    if profile is None or profile["model_fingerprint"] != fingerprint:
+        raise SystemExit("❌ No drift profile for this model; run `python -m src.drift profile` first")
+
+    from src.schema import schema_for
+
+    monitor = DriftMonitor(lambda key: profile, half_life_rows=0)
+    schema = schema_for(pipeline, model_columns)
+    observe_seconds = predict_seconds = 0.0
+    calls = 0
+    for chunk in pd.read_csv(args.data, nrows=args.nrows, chunksize=args.chunksize):
+        actual = chunk[TARGET_COL].to_numpy(dtype=np.float64) if TARGET_COL in chunk.columns else None
+        checked = schema.validate(chunk.drop(columns=[TARGET_COL], errors="ignore"))
+        frame = checked.frame[checked.valid]
+        t0 = time.perf_counter()
+        prices = _point_prices(pipeline, build_model_input(frame, pipeline, model_columns))
+        t1 = time.perf_counter()
+        monitor.observe(frame, prices, actual=None if actual is None else actual[checked.valid])
+        observe_seconds += time.perf_counter() - t1
+        predict_seconds += t1 - t0
+        calls += 1
+    t0 = time.perf_counter()
+    monitor.flush(timeout=600)
+    apply_seconds = time.perf_counter() - t0
+    scores = monitor.scores()
+    monitor.close()
+
+    print_scores(scores)
+    print(f"Rows: {scores['rows']:,} (dropped {scores['dropped']:,}); worst: {scores['max_psi_feature']} "
+          f"PSI {scores['max_psi']:.3f}")
+    print(f"observe(): {observe_seconds / calls * 1e6:.1f} µs per call "
+          f"({observe_seconds / predict_seconds:.2%} of predict); background apply backlog {apply_seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
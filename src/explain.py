@@ -0,0 +1,224 @@
+"""
+Per-prediction price explanations from XGBoost TreeSHAP contributions.
+
+``Booster.predict(pred_contribs=True)`` returns one contribution per
+transformed feature plus the bias; :func:`contribution_groups` maps every
+transformed column back to the input column it came from (one-hot blocks are
+summed), so each explanation adds up exactly to the predicted price.
+
+Exact TreeSHAP costs a few milliseconds per row, so :class:`Explainer`
+scores in bounded batches, caches explained rows (keyed like the
+prediction cache) and honours a latency budget: when the rows still to be
+explained would exceed it, XGBoost's approximate (Saabas) contributions are
+returned instead and flagged as such.
+
+Usage:
+    python -m src.explain --data listings.csv --rows 2000
+"""
+
+import argparse
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from src.compiled import lower_pipeline
+from src.features import build_model_input
+from src.prediction_cache import row_keys
+from src.quantile import quantile_levels
+
+BASE_VALUE = "base_value"
+DEFAULT_BATCH_ROWS = 2048
+
+
+# -----------------------------------------------------------------------------
+# FEATURE GROUPS
+# -----------------------------------------------------------------------------
+def contribution_groups(pipeline):
+    """Input column behind each transformed column, in the booster's feature order."""
+    if "preprocessor" in pipeline.named_steps:
+        groups = []
+        for spec in lower_pipeline(pipeline)["columns"]:
+            width = len(spec["table"][0]) if spec["kind"] == "categorical" else 1
+            groups.extend([spec["column"]] * width)
+        return groups
+    return list(pipeline[-2].get_feature_names_out())
+
+
+def _iteration_range(regressor):
+    try:
+        return (0, int(regressor.best_iteration) + 1)
+    except AttributeError:
+        return (0, 0)
+
+
+# -----------------------------------------------------------------------------
+# EXPLAINER
+# -----------------------------------------------------------------------------
+class Explainer:
+    """
+    Price attributions per input column for a fitted pipeline.
+
+    ``explain(frame)`` takes raw listing rows and returns
+    ``(contributions, method)``: a frame with one column per model input
+    plus ``base_value`` (each row sums to the prediction) and ``"exact"`` or
+    ``"approximate"``.
+    """
+
+    def __init__(self, pipeline, model_columns, cache_size=2000, batch_rows=DEFAULT_BATCH_ROWS):
+        self.pipeline = pipeline
+        self.model_columns = model_columns
+        self.cache_size = cache_size
+        self.batch_rows = batch_rows
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+        regressor = pipeline.steps[-1][1]
+        self._booster = regressor.get_booster()
+        self._iteration_range = _iteration_range(regressor)
+        # Quantile models return one set of contributions per quantile; explain the median
+        levels = quantile_levels(pipeline)
+        self._output = None if levels is None else int(np.argmin(np.abs(np.asarray(levels) - 0.5)))
+        self._preprocess = pipeline[:-1]
+        groups = contribution_groups(pipeline)
+        self.columns = list(dict.fromkeys(groups))
+        # (n_transformed, n_inputs) 0/1 matrix summing transformed contributions per input column
+        self._group_matrix = np.zeros((len(groups), len(self.columns)), dtype=np.float64)
+        self._group_matrix[np.arange(len(groups)), [self.columns.index(g) for g in groups]] = 1.0
+        self._exact_ms_per_row = None
+
+    def _contributions(self, features, approximate):
+        """Grouped ``(n, n_inputs + 1)`` contributions for post-reindex features."""
+        out = np.empty((len(features), len(self.columns) + 1))
+        for start in range(0, len(features), self.batch_rows):
+            batch = features.iloc[start:start + self.batch_rows]
+            matrix = xgb.DMatrix(self._preprocess.transform(batch), enable_categorical=True)
+            raw = self._booster.predict(
+                matrix, pred_contribs=True, approx_contribs=approximate,
+                iteration_range=self._iteration_range,
+            )
+            if self._output is not None:
+                raw = raw[:, self._output, :]
+            out[start:start + len(batch), :-1] = raw[:, :-1] @ self._group_matrix
+            out[start:start + len(batch), -1] = raw[:, -1]
+        return out
+
+    def _exact(self, features):
+        t0 = time.perf_counter()
+        values = self._contributions(features, approximate=False)
+        ms_per_row = (time.perf_counter() - t0) * 1000 / len(features)
+        previous = self._exact_ms_per_row
+        self._exact_ms_per_row = ms_per_row if previous is None else 0.8 * previous + 0.2 * ms_per_row
+        return values
+
+    def explain(self, frame, budget_ms=None):
+        features = build_model_input(frame, self.pipeline, self.model_columns)
+        keys = row_keys(features)
+        values = np.empty((len(features), len(self.columns) + 1))
+
+        hit = np.zeros(len(keys), dtype=bool)
+        with self._lock:
+            for i, key in enumerate(keys):
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    values[i] = cached
+                    hit[i] = True
+            self.hits += int(hit.sum())
+            self.misses += int((~hit).sum())
+
+        method = "exact"
+        miss = np.flatnonzero(~hit)
+        if len(miss):
+            pending = features.iloc[miss]
+            estimate = None if self._exact_ms_per_row is None else self._exact_ms_per_row * len(miss)
+            if budget_ms is not None and estimate is not None and estimate > budget_ms:
+                # approximate results are not cached so a later call can still get exact ones
+                values[miss] = self._contributions(pending, approximate=True)
+                method = "approximate"
+            else:
+                fresh = self._exact(pending)
+                values[miss] = fresh
+                with self._lock:
+                    for key, row in zip(keys[miss], fresh):
+                        self._cache[key] = row
+                    while len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+
+        return pd.DataFrame(values, columns=self.columns + [BASE_VALUE], index=frame.index), method
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "exact_ms_per_row": self._exact_ms_per_row,
+        }
+
+
+def top_drivers(contributions, k=5):
+    """``[(column, amount), ...]`` for one explained row, largest absolute effect first."""
+    row = contributions.drop(BASE_VALUE)
+    order = row.abs().sort_values(ascending=False).index[:k]
+    return [(column, float(row[column])) for column in order]
+
+
+# -----------------------------------------------------------------------------
+# BENCHMARK
+# -----------------------------------------------------------------------------
+def main(argv=None):
+    from src.assets import load_assets
+    from src.batch_predict import score_frame
+
+    parser = argparse.ArgumentParser(description="Benchmark TreeSHAP explanations.")
+    parser.add_argument("--data", required=True, help="CSV of raw listings")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--models-dir", default=None,
+                        help="Directory containing models/ (defaults to the repo root)")
+    parser.add_argument("--budget-ms", type=float, default=50.0)
+    args = parser.parse_args(argv)
+
+    pipeline, model_columns = load_assets(args.models_dir)
+    listings = pd.read_csv(args.data, nrows=args.rows).drop(columns=["price"], errors="ignore")
+    explainer = Explainer(pipeline, model_columns)
+
+    def timed(fn):
+        t0 = time.perf_counter()
+        result = fn()
+        return result, (time.perf_counter() - t0) * 1000
+
+    (single, _), single_ms = timed(lambda: explainer.explain(listings.head(1)))
+    _, cached_ms = timed(lambda: explainer.explain(listings.head(1)))
+    (exact, _), exact_ms = timed(lambda: explainer.explain(listings))
+
+    budgeted = Explainer(pipeline, model_columns, cache_size=0)
+    budgeted.explain(listings.head(1))  # calibrates the exact cost per row
+    (approx, method), approx_ms = timed(lambda: budgeted.explain(listings, budget_ms=args.budget_ms))
+
+    predicted = score_frame(pipeline, listings, model_columns)
+    if explainer._output is not None:
+        predicted = predicted[:, explainer._output]
+    additivity = float(np.abs(exact.sum(axis=1).to_numpy() - predicted).max())
+    importance = exact.drop(columns=BASE_VALUE).abs().mean().sort_values(ascending=False)
+
+    print("-" * 50)
+    print(f"1 row exact:          {single_ms:8.2f} ms")
+    print(f"1 row cached:         {cached_ms:8.2f} ms")
+    print(f"{len(listings):,} rows exact:    {exact_ms:8.1f} ms")
+    print(f"{len(listings):,} rows, {args.budget_ms:g} ms budget: {approx_ms:8.1f} ms ({method})")
+    print(f"max |sum - predict|:  {additivity:8.3f}")
+    print("Mean |contribution| by input column:")
+    for column, value in importance.items():
+        print(f"   {column:<18} ${value:>10,.0f}")
+    print("-" * 50)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+"""
+Columnar feature cache: typed, partitioned Parquet instead of re-parsing CSV.
+
+``ingest`` streams a raw listings CSV once and writes it as a Parquet
+dataset, hive-partitioned by ``make``:
+
+* strings are dictionary-encoded (``category`` in pandas), numbers use the
+  compact ``COLUMN_DTYPES``;
+* ``vehicle_age`` and ``mileage_per_year`` are materialized with the
+  reference year recorded in the manifest, ``accident_history`` gaps are
+  filled with "None" and ``owner_count`` is coerced to float32, exactly as
+  ``engineer_features`` does. ``year`` is kept, so pipelines with an
+  embedded feature step can still recompute them;
+* the dataset directory is named after the SHA-256 of the source CSV, and
+  ``_manifest.json`` records the hash, schema, row counts per partition and
+  timings. Ingesting an unchanged file is a no-op.
+
+``read_features`` reads only the requested columns and partitions (with
+partition pruning and column projection in Arrow) and hands the buffers to
+pandas without consolidating them into 2-D blocks. ``read_listings`` in
+``src.production_train`` accepts a dataset directory wherever it accepts a
+CSV, so training, tuning, evaluation and the benchmarks pick the cache up
+unchanged. Rows come back grouped by make, not in CSV order, and an
+``nrows`` subset is drawn from every make rather than the first ones.
+
+pandas and pyarrow are imported on demand; the module itself only needs the
+standard library.
+
+Usage:
+    python -m src.feature_cache ingest --data vehicle_price_prediction.csv
+    python -m src.feature_cache bench --data vehicle_price_prediction.csv --columns make,model,year,mileage,price
+"""
+
+import argparse
+import hashlib
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+FORMAT_VERSION = 1
+MANIFEST_FILENAME = "_manifest.json"  # leading underscore: skipped by the Parquet reader
+DEFAULT_CACHE_DIR = BASE_DIR / "data" / "features"
+PARTITION_COL = "make"
+DEFAULT_CHUNKSIZE = 200_000
+ROW_GROUP_ROWS = 128 * 1024
+
+
+def source_sha256(path, chunk_bytes=1 << 20):
+    """SHA-256 of a CSV, or the recorded source hash of a cached dataset directory."""
+    path = Path(path)
+    if is_feature_cache(path):
+        return read_manifest(path)["source"]["sha256"]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_bytes), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_feature_cache(path):
+    return (Path(path) / MANIFEST_FILENAME).is_file()
+
+
+def read_manifest(path):
+    with open(Path(path) / MANIFEST_FILENAME) as f:
+        return json.load(f)
+
+
+# -----------------------------------------------------------------------------
+# INGEST
+# -----------------------------------------------------------------------------
+def _engineer_chunk(chunk, reference_year):
+    """Materialize the feature step's derivations next to the raw columns."""
+    import numpy as np
+
+    from src.features import engineer_features
+
+    engineered = engineer_features(chunk, reference_year)
+    if "year" in chunk.columns:
+        engineered.insert(0, "year", chunk["year"])
+    for column in ("vehicle_age", "mileage_per_year", "owner_count"):
+        if column in engineered.columns:
+            engineered[column] = engineered[column].astype(np.float32)
+    return engineered
+
+
+def _arrow_schema(chunk):
+    """Fixed schema for every chunk: int32-indexed string dictionaries, numbers as read."""
+    import pyarrow as pa
+
+    schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+    fields = [
+        pa.field(f.name, pa.dictionary(pa.int32(), pa.string())) if pa.types.is_dictionary(f.type) else f
+        for f in schema
+    ]
+    return pa.schema(fields)
+
+
+def ingest(data_path, out_dir=DEFAULT_CACHE_DIR, reference_year=None, chunksize=DEFAULT_CHUNKSIZE, force=False):
+    """
+    Convert ``data_path`` into ``out_dir/<sha256[:16]>`` and return that
+    directory. An existing dataset for the same content, format and
+    reference year is reused unless ``force``.
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    from src.features import LEGACY_REFERENCE_YEAR
+    from src.production_train import iter_listing_chunks
+
+    reference_year = LEGACY_REFERENCE_YEAR if reference_year is None else int(reference_year)
+    t0 = time.perf_counter()
+    sha256 = source_sha256(data_path)
+    hash_seconds = time.perf_counter() - t0
+
+    target = Path(out_dir) / sha256[:16]
+    if is_feature_cache(target) and not force:
+        manifest = read_manifest(target)
+        if manifest["format_version"] == FORMAT_VERSION and manifest["reference_year"] == reference_year:
+            return target
+
+    schema = _arrow_schema(_engineer_chunk(next(iter_listing_chunks(data_path, 1_000)), reference_year))
+    rows = 0
+
+    def batches():
+        nonlocal rows
+        for chunk in iter_listing_chunks(data_path, chunksize):
+            chunk = _engineer_chunk(chunk, reference_year)
+            rows += len(chunk)
+            yield from pa.Table.from_pandas(chunk, schema=schema, preserve_index=False).to_batches()
+
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=f".{target.name}.", dir=out_dir))
+    try:
+        t1 = time.perf_counter()
+        ds.write_dataset(
+            batches(), staging, schema=schema, format="parquet",
+            partitioning=ds.partitioning(pa.schema([schema.field(PARTITION_COL)]), flavor="hive"),
+            max_rows_per_group=ROW_GROUP_ROWS, min_rows_per_group=ROW_GROUP_ROWS // 4,
+            existing_data_behavior="overwrite_or_ignore",
+        )
+        write_seconds = time.perf_counter() - t1
+
+        dataset = _open(staging)
+        partitions = {}
+        for fragment in dataset.get_fragments():
+            key = Path(fragment.path).parent.name.split("=", 1)[1]
+            partitions[key] = partitions.get(key, 0) + fragment.count_rows()
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "source": {"path": str(data_path), "sha256": sha256, "bytes": Path(data_path).stat().st_size},
+            "reference_year": reference_year,
+            "partition_by": PARTITION_COL,
+            "rows": rows,
+            "columns": {f.name: str(f.type) for f in schema},
+            "partitions": dict(sorted(partitions.items())),
+            "bytes": sum(p.stat().st_size for p in staging.rglob("*.parquet")),
+            "hash_seconds": hash_seconds,
+            "write_seconds": write_seconds,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        with open(staging / MANIFEST_FILENAME, "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        if target.exists():
+            shutil.rmtree(target)
+        staging.rename(target)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return target
+
+
+# -----------------------------------------------------------------------------
+# READ
+# -----------------------------------------------------------------------------
+def _open(path):
+    import pyarrow.dataset as ds
+
+    # The partition column comes back dictionary-encoded like the others
+    return ds.dataset(path, format="parquet",
+                      partitioning=ds.HivePartitioning.discover(infer_dictionary=True))
+
+
+def _spread_head(dataset, nrows, columns, expression):
+    """``nrows`` rows taken from the head of each fragment in proportion to its row count."""
+    import pyarrow as pa
+
+    # ``expression`` only involves the partition column, so pruning fragments applies it
+    fragments = list(dataset.get_fragments(filter=expression))
+    counts = [fragment.count_rows() for fragment in fragments]
+    total = sum(counts)
+    if nrows >= total:
+        return dataset.to_table(columns=columns, filter=expression)
+    # Largest-remainder rounding so the shares add up to exactly nrows
+    shares = [nrows * count / total for count in counts]
+    takes = [int(share) for share in shares]
+    by_remainder = sorted(range(len(shares)), key=lambda i: takes[i] - shares[i])
+    for i in by_remainder[: nrows - sum(takes)]:
+        takes[i] += 1
+    tables = [
+        # A scanner with the dataset schema fills in the partition column
+        fragment.scanner(schema=dataset.schema, columns=columns).head(take)
+        for fragment, take in zip(fragments, takes) if take
+    ]
+    return pa.concat_tables(tables) if tables else dataset.head(0, columns=columns, filter=expression)
+
+
+def read_features(path, columns=None, partitions=None, nrows=None):
+    """
+    Read a cached dataset as a DataFrame.
+
+    ``columns`` projects columns before any data is decoded; ``partitions``
+    keeps only those ``make`` values, so other partition files are never
+    opened. ``nrows`` takes the leading rows of every file in proportion to
+    its size, so a subset covers all makes instead of the first few. Numeric columns are handed to pandas without a copy where Arrow
+    allows it, and strings stay dictionary-encoded as ``category``.
+    """
+    import pyarrow.dataset as ds
+
+    dataset = _open(path)
+    if columns is not None:
+        columns = [c for c in columns if c in dataset.schema.names]
+    expression = None
+    if partitions is not None:
+        expression = ds.field(PARTITION_COL).isin([str(p) for p in partitions])
+
+    if nrows is not None:
+        table = _spread_head(dataset, nrows, columns, expression)
+    else:
+        # One batch and file in flight: less decode memory, about the same speed
+        table = dataset.to_table(columns=columns, filter=expression, batch_readahead=1, fragment_readahead=1)
+    # Source column order (the partition column is otherwise appended last)
+    order = [c for c in read_manifest(path)["columns"] if c in table.column_names]
+    return table.select(order).to_pandas(split_blocks=True, self_destruct=True)
+
+
+def iter_features(path, batch_rows=DEFAULT_CHUNKSIZE, columns=None, shard=None):
+    """
+    Stream a cached dataset as DataFrames of about ``batch_rows`` rows.
+    ``shard=(index, count)`` keeps every ``count``-th Arrow record batch,
+    starting at ``index``, so ``count`` readers split the rows between them.
+    """
+    import pyarrow as pa
+
+    order = [c for c in read_manifest(path)["columns"] if columns is None or c in columns]
+    batches, rows = [], 0
+    for i, batch in enumerate(_open(path).to_batches(columns=order)):
+        if shard is not None and i % shard[1] != shard[0]:
+            continue
+        batches.append(batch)
+        rows += batch.num_rows
+        if rows >= batch_rows:
+            yield pa.Table.from_batches(batches).to_pandas(split_blocks=True, self_destruct=True)
+            batches, rows = [], 0
+    if batches:
+        yield pa.Table.from_batches(batches).to_pandas(split_blocks=True, self_destruct=True)
+
+
+# -----------------------------------------------------------------------------
+# BENCHMARK
+# -----------------------------------------------------------------------------
+_LOAD_SCRIPT = """
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+import pandas as pd, pyarrow
+from src.feature_cache import read_features
+from src.production_train import read_listings
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+t0 = time.perf_counter()
+frame = {loader}
+seconds = time.perf_counter() - t0
+print(json.dumps({{"seconds": seconds, "rows": len(frame), "columns": frame.shape[1],
+                  "frame_mb": frame.memory_usage(deep=True).sum() / 2**20,
+                  "peak_rss_mb": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline) / 1024}}))
+"""
+
+
+def measure_load(loader, repeats=3):
+    """Median load time and peak RSS growth of ``loader`` (a Python expression) in fresh interpreters."""
+    runs = []
+    for _ in range(repeats):
+        script = _LOAD_SCRIPT.format(root=str(BASE_DIR), loader=loader)
+        output = subprocess.run([sys.executable, "-c", script], check=True, capture_output=True, text=True)
+        runs.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    return {key: sorted(r[key] for r in runs)[len(runs) // 2] for key in runs[0]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or benchmark the columnar feature cache.")
+    parser.add_argument("command", choices=["ingest", "bench"])
+    parser.add_argument("--data", required=True, help="Raw listings CSV")
+    parser.add_argument("--out", default=str(DEFAULT_CACHE_DIR))
+    parser.add_argument("--reference-year", type=int, default=None,
+                        help="Year vehicle_age is measured from (defaults to the legacy 2025)")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the content hash matches")
+    parser.add_argument("--columns", default=None, help="Comma-separated projection for the benchmark")
+    parser.add_argument("--partition", default=None, help="A make to read on its own in the benchmark")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    dataset = ingest(args.data, args.out, args.reference_year, args.chunksize, args.force)
+    manifest = read_manifest(dataset)
+    if args.command == "ingest":
+        print("-" * 30)
+        print(f"Source:          {manifest['source']['path']} ({manifest['source']['bytes'] / 2**20:,.1f} MB)")
+        print(f"SHA-256:         {manifest['source']['sha256'][:16]}")
+        print(f"Rows:            {manifest['rows']:,} in {len(manifest['partitions'])} '{PARTITION_COL}' partitions")
+        print(f"Parquet size:    {manifest['bytes'] / 2**20:,.1f} MB")
+        print(f"Wall time:       {time.perf_counter() - t0:.1f}s (hash {manifest['hash_seconds']:.1f}s, "
+              f"write {manifest['write_seconds']:.1f}s when built)")
+        print("-" * 30)
+        print(f"✅ Feature cache at {dataset}")
+        return
+
+    columns = args.columns.split(",") if args.columns else None
+    partition = args.partition or next(iter(manifest["partitions"]))
+    loaders = [
+        ("pd.read_csv", f"pd.read_csv({args.data!r})"),
+        ("read_listings (CSV, typed)", f"read_listings({args.data!r})"),
+        ("feature cache, all columns", f"read_features({str(dataset)!r})"),
+    ]
+    if columns:
+        loaders.insert(1, (f"pd.read_csv, {len(columns)} columns", f"pd.read_csv({args.data!r}, usecols={columns!r})"))
+        loaders.append((f"feature cache, {len(columns)} columns", f"read_features({str(dataset)!r}, {columns!r})"))
+    loaders.append((f"feature cache, make={partition}",
+                    f"read_features({str(dataset)!r}, {columns!r}, partitions=[{partition!r}])"))
+
+    print("-" * 86)
+    print(f"{'loader':<34}{'rows':>10}{'cols':>6}{'load s':>9}{'frame MB':>10}{'peak RSS MB':>13}{'speedup':>9}")
+    base = None
+    for label, loader in loaders:
+        r = measure_load(loader, args.repeats)
+        base = base or r["seconds"]
+        print(f"{label:<34}{r['rows']:>10,}{r['columns']:>6}{r['seconds']:>9.3f}{r['frame_mb']:>10.1f}"
+              f"{r['peak_rss_mb']:>13.1f}{base / r['seconds']:>8.1f}x")
+    print("-" * 86)
+    print(f"CSV {manifest['source']['bytes'] / 2**20:,.1f} MB -> Parquet {manifest['bytes'] / 2**20:,.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
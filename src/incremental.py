@@ -0,0 +1,355 @@
+"""
+Incremental retraining from newly sold listings.
+
+Instead of refitting the whole pipeline, an update:
+
+1. merges the new rows into per-category running statistics (count, mean and
+   sum of squared deviations) for every ``TargetEncoder`` column and
+   recomputes ``encodings_`` / ``target_mean_`` in place, with the same
+   empirical-Bayes smoothing as ``TargetEncoder.fit``,
+2. continues boosting the existing booster on the new rows
+   (``XGBRegressor.fit(..., xgb_model=booster)``),
+3. compares the candidate with the current model on a holdout, and only
+   replaces ``vehicle_price_pipeline.pkl`` if the MAE has not regressed.
+
+Other preprocessing statistics (imputer fills, scaler, one-hot vocabulary)
+stay frozen until the next full retrain.
+
+The running statistics are kept next to the model in
+``target_encoding_stats.json``, stamped with the fingerprint of the artifact
+they were saved with and its encoder categories. Statistics that do not match
+the loaded model (e.g. left over from before a full retrain) are never
+applied. For such artifacts, and ones trained before the file existed, pass
+``--base-data`` to rebuild them in a streaming pass over the original CSV.
+
+Usage:
+    python -m src.incremental --new-data sales_2025_06.csv --rounds 200
+    python -m src.incremental --new-data sales.csv --base-data vehicle_price_prediction.csv --full-retrain
+"""
+
+import argparse
+import copy
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.metrics import mean_absolute_error
+
+from src.assets import COLUMNS_FILENAME, MODEL_FILENAME, STATS_FILENAME, find_assets, load_assets
+from src.features import build_model_input
+from src.prediction_cache import artifact_fingerprint
+from src.production_train import (
+    StageTimer,
+    iter_listing_chunks,
+    read_listings,
+    split_xy,
+)
+from src.quantile import quantile_levels, split_band
+
+DEFAULT_ROUNDS = 200
+
+
+# -----------------------------------------------------------------------------
+# TARGET-ENCODING STATISTICS
+# -----------------------------------------------------------------------------
+def target_encoder_branches(pipeline):
+    """``(imputer_steps, encoder, columns)`` for each TargetEncoder branch of the preprocessor."""
+    if "preprocessor" not in pipeline.named_steps:
+        return []
+    branches = []
+    for name, branch, columns in pipeline.named_steps["preprocessor"].transformers_:
+        steps = getattr(branch, "steps", None)
+        if steps and type(steps[-1][1]).__name__ == "TargetEncoder":
+            encoder = steps[-1][1]
+            if not hasattr(encoder, "encodings_"):
+                raise NotImplementedError("Only sklearn's TargetEncoder can be updated incrementally")
+            branches.append((branch[:-1], encoder, list(columns)))
+    return branches
+
+
+def encoder_categories(pipeline):
+    """``{column: [category, ...]}`` of every TargetEncoder column, as strings."""
+    return {
+        column: [str(c) for c in categories]
+        for _, encoder, columns in target_encoder_branches(pipeline)
+        for column, categories in zip(columns, encoder.categories_)
+    }
+
+
+def _merge(count_a, mean_a, m2_a, count_b, mean_b, m2_b):
+    """Chan et al. parallel merge of (count, mean, M2) moments."""
+    count = count_a + count_b
+    safe = np.where(count == 0, 1, count)
+    delta = mean_b - mean_a
+    mean = mean_a + delta * count_b / safe
+    m2 = m2_a + m2_b + delta ** 2 * count_a * count_b / safe
+    return count, mean, m2
+
+
+class TargetStats:
+    """
+    Running target moments per category for every target-encoded column, plus
+    the global moments. ``model`` identifies the artifact they belong to:
+    its fingerprint and encoder categories when saved (see :meth:`matches`).
+    """
+
+    def __init__(self, columns=None, total=None, model=None):
+        self.columns = columns or {}
+        self.total = total or {"count": 0.0, "mean": 0.0, "m2": 0.0}
+        self.model = model
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        columns = {
+            column: {"categories": entry["categories"], **{k: np.asarray(entry[k]) for k in ("count", "mean", "m2")}}
+            for column, entry in data["columns"].items()
+        }
+        return cls(columns, data["total"], data.get("model"))
+
+    def matches(self, pipeline, fingerprint):
+        """``None`` if these statistics belong to ``pipeline``, else why not."""
+        if self.model is None:
+            return "it does not record which model it was built for"
+        if self.model["fingerprint"] != fingerprint:
+            return f"it was built for model {self.model['fingerprint'][:12]}, not {fingerprint[:12]}"
+        if self.model["encoder_categories"] != encoder_categories(pipeline):
+            return "its categories differ from the model's TargetEncoder"
+        return None
+
+    def save(self, path, pipeline, fingerprint):
+        """Write the statistics, stamped as belonging to ``pipeline`` saved with ``fingerprint``."""
+        self.model = {"fingerprint": fingerprint, "encoder_categories": encoder_categories(pipeline)}
+        data = {
+            "model": self.model,
+            "total": self.total,
+            "columns": {
+                column: {"categories": entry["categories"],
+                         **{k: entry[k].tolist() for k in ("count", "mean", "m2")}}
+                for column, entry in self.columns.items()
+            },
+        }
+        with open(path, "w") as f:
+            json.dump(data, f)
+
+    def update(self, pipeline, features, y):
+        """Fold a batch of (post-``build_model_input``) rows and prices into the statistics."""
+        y = np.asarray(y, dtype=np.float64)
+        count_b = float(len(y))
+        if not count_b:
+            return
+        mean_b = float(y.mean())
+        m2_b = float(((y - mean_b) ** 2).sum())
+        t = self.total
+        t["count"], t["mean"], t["m2"] = (
+            float(v) for v in _merge(t["count"], t["mean"], t["m2"], count_b, mean_b, m2_b)
+        )
+
+        for imputer, _, columns in target_encoder_branches(pipeline):
+            imputed = pd.DataFrame(imputer.transform(features[columns]), columns=columns)
+            for column in columns:
+                grouped = pd.DataFrame({"key": imputed[column].astype(str).to_numpy(), "y": y}).groupby("key")["y"]
+                batch = grouped.agg(["count", "mean"])
+                batch["m2"] = grouped.var(ddof=0) * batch["count"]
+
+                entry = self.columns.setdefault(
+                    column, {"categories": [], "count": np.zeros(0), "mean": np.zeros(0), "m2": np.zeros(0)}
+                )
+                categories = sorted(set(entry["categories"]) | set(batch.index))
+                old = pd.DataFrame({k: entry[k] for k in ("count", "mean", "m2")}, index=entry["categories"])
+                old = old.reindex(categories, fill_value=0.0)
+                new = batch.reindex(categories, fill_value=0.0)
+                count, mean, m2 = _merge(
+                    old["count"].to_numpy(), old["mean"].to_numpy(), old["m2"].to_numpy(),
+                    new["count"].to_numpy(), new["mean"].to_numpy(), new["m2"].to_numpy(),
+                )
+                entry.update(categories=categories, count=count, mean=mean, m2=m2)
+
+    def apply(self, pipeline):
+        """Rewrite each TargetEncoder's categories, encodings and target mean from the statistics."""
+        y_mean = self.total["mean"]
+        y_variance = self.total["m2"] / self.total["count"]
+        for _, encoder, columns in target_encoder_branches(pipeline):
+            categories, encodings = [], []
+            for column in columns:
+                entry = self.columns[column]
+                count, mean, m2 = entry["count"], entry["mean"], entry["m2"]
+                if encoder.smooth == "auto":
+                    # TargetEncoder's empirical-Bayes shrinkage (Micci-Barreca eq. 5/6)
+                    with np.errstate(divide="ignore", invalid="ignore"):
+                        lam = y_variance * count / (y_variance * count + m2 / count)
+                    encoding = np.where(np.isnan(lam), y_mean, lam * mean + (1 - lam) * y_mean)
+                else:
+                    encoding = (encoder.smooth * y_mean + count * mean) / (encoder.smooth + count)
+                categories.append(np.asarray(entry["categories"], dtype=object))
+                encodings.append(encoding)
+            encoder.categories_ = categories
+            encoder.encodings_ = encodings
+            encoder.target_mean_ = y_mean
+
+
+def bootstrap_stats(pipeline, model_columns, data_path, chunksize=200_000):
+    """Rebuild the statistics from the original training CSV in one streaming pass."""
+    stats = TargetStats()
+    for chunk in iter_listing_chunks(data_path, chunksize):
+        X, y = split_xy(chunk)
+        stats.update(pipeline, build_model_input(X, pipeline, model_columns), y)
+    return stats
+
+
+# -----------------------------------------------------------------------------
+# UPDATE
+# -----------------------------------------------------------------------------
+def _mae(pipeline, model_columns, X, y):
+    predicted = pipeline.predict(build_model_input(X, pipeline, model_columns))
+    return float(mean_absolute_error(y, split_band(predicted, quantile_levels(pipeline))[0]))
+
+
+def incremental_update(pipeline, model_columns, stats, X_new, y_new, rounds=DEFAULT_ROUNDS, learning_rate=None):
+    """Candidate pipeline: refreshed target encodings plus ``rounds`` more boosting rounds on the new rows."""
+    candidate = copy.deepcopy(pipeline)
+    features = build_model_input(X_new, candidate, model_columns)
+    if stats is not None:
+        stats.update(candidate, features, y_new)
+        stats.apply(candidate)
+
+    regressor = candidate.steps[-1][1]
+    previous_rounds = regressor.get_booster().num_boosted_rounds()
+    matrix = candidate[:-1].transform(features)
+    params = {"n_estimators": rounds}
+    if learning_rate is not None:
+        params["learning_rate"] = learning_rate
+    regressor.set_params(**params)
+    regressor.fit(matrix, np.asarray(y_new, dtype=np.float64), xgb_model=regressor.get_booster())
+    regressor.set_params(n_estimators=previous_rounds + rounds)
+    return candidate
+
+
+def save_atomically(pipeline, model_columns, stats, models_dir):
+    """Write the artifacts to temporary files and ``os.replace`` them into ``models_dir``."""
+    models_dir = Path(models_dir)
+    with tempfile.TemporaryDirectory(dir=models_dir) as staging:
+        staging = Path(staging)
+        joblib.dump(pipeline, staging / MODEL_FILENAME)
+        joblib.dump(list(model_columns), staging / COLUMNS_FILENAME)
+        if stats is not None:
+            # The fingerprint is a content hash, so it survives the move into models_dir
+            stats.save(staging / STATS_FILENAME, pipeline, artifact_fingerprint(staging / MODEL_FILENAME))
+        for path in staging.iterdir():
+            os.replace(path, models_dir / path.name)
+    return models_dir / MODEL_FILENAME
+
+
+def full_retrain(pipeline, base_path, X_new, y_new):
+    """Refit the same pipeline configuration from scratch on base + new data (for comparison)."""
+    from sklearn.base import clone
+
+    X_base, y_base = split_xy(read_listings(base_path))
+    X_all = pd.concat([X_base, X_new.astype(X_base.dtypes.to_dict(), errors="ignore")], ignore_index=True)
+    y_all = pd.concat([y_base, pd.Series(y_new)], ignore_index=True)
+    retrained = clone(pipeline)
+    retrained.fit(X_all, y_all)
+    return retrained
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Incrementally update the vehicle price pipeline.")
+    parser.add_argument("--new-data", required=True, help="CSV of newly sold listings with a price column")
+    parser.add_argument("--models-dir", default=None,
+                        help="Directory containing models/ (defaults to the repo root)")
+    parser.add_argument("--base-data", default=None,
+                        help="Original training CSV (bootstraps the encoder statistics, used by --full-retrain)")
+    parser.add_argument("--rounds", type=int, default=DEFAULT_ROUNDS, help="Additional boosting rounds")
+    parser.add_argument("--learning-rate", type=float, default=None)
+    parser.add_argument("--holdout-fraction", type=float, default=0.2,
+                        help="Share of the new rows kept out of the update for the acceptance check")
+    parser.add_argument("--tolerance", type=float, default=0.0,
+                        help="Allowed relative holdout MAE increase before the update is rejected")
+    parser.add_argument("--full-retrain", action="store_true",
+                        help="Also refit from scratch on base + new data and compare wall time and MAE")
+    parser.add_argument("--append-to", default=None,
+                        help="Append the new rows to this CSV once the update is accepted")
+    parser.add_argument("--dry-run", action="store_true", help="Evaluate but never replace the artifacts")
+    args = parser.parse_args(argv)
+    if args.full_retrain and not args.base_data:
+        parser.error("--full-retrain requires --base-data")
+
+    timer = StageTimer()
+    pipeline, model_columns = load_assets(args.models_dir)
+    model_file, _ = find_assets(args.models_dir)
+    models_dir = model_file.parent
+    stats_path = models_dir / STATS_FILENAME
+
+    start = time.perf_counter()
+    stats = None
+    if target_encoder_branches(pipeline):
+        problem = f"{stats_path} is missing"
+        if stats_path.exists():
+            stats = TargetStats.load(stats_path)
+            mismatch = stats.matches(pipeline, artifact_fingerprint(model_file))
+            if mismatch is not None:
+                stats = None
+                problem = f"{stats_path} does not match the loaded model: {mismatch}"
+        if stats is None and args.base_data:
+            print(f"⚠️ {problem}; rebuilding it from {args.base_data}")
+            stats = bootstrap_stats(pipeline, model_columns, args.base_data)
+            timer("Bootstrapped target-encoding statistics from the base data")
+        elif stats is None:
+            parser.error(f"{problem}; pass --base-data to rebuild it")
+    bootstrap_seconds = time.perf_counter() - start
+
+    new = read_listings(args.new_data)
+    holdout = np.random.default_rng(42).random(len(new)) < args.holdout_fraction
+    X_new, y_new = split_xy(new[~holdout])
+    X_hold, y_hold = split_xy(new[holdout])
+    timer(f"Loaded {len(new):,} new rows ({holdout.sum():,} held out)")
+
+    start = time.perf_counter()
+    candidate = incremental_update(pipeline, model_columns, stats, X_new, y_new, args.rounds, args.learning_rate)
+    update_seconds = time.perf_counter() - start
+    timer("✅ Incremental update complete")
+
+    current_mae = _mae(pipeline, model_columns, X_hold, y_hold)
+    candidate_mae = _mae(candidate, model_columns, X_hold, y_hold)
+    accepted = candidate_mae <= current_mae * (1 + args.tolerance)
+    timer("Evaluated holdout")
+
+    print("-" * 50)
+    print(f"Holdout rows:          {len(y_hold):,}")
+    print(f"Current model MAE:     ${current_mae:,.2f}")
+    print(f"Updated model MAE:     ${candidate_mae:,.2f}")
+    print(f"Incremental update:    {update_seconds:,.1f}s"
+          + (f" (+{bootstrap_seconds:,.1f}s one-off bootstrap)" if bootstrap_seconds > 0.5 else ""))
+    if args.full_retrain:
+        start = time.perf_counter()
+        retrained = full_retrain(pipeline, args.base_data, X_new, y_new)
+        retrain_seconds = time.perf_counter() - start
+        retrained_mae = _mae(retrained, model_columns, X_hold, y_hold)
+        timer("Full retrain complete")
+        print(f"Full retrain:          {retrain_seconds:,.1f}s (MAE ${retrained_mae:,.2f}, "
+              f"{retrain_seconds / update_seconds:,.1f}x slower)")
+    print("-" * 50)
+
+    if not accepted:
+        print("❌ Update rejected: holdout MAE regressed; artifacts left unchanged")
+        raise SystemExit(1)
+    if args.dry_run:
+        print("Dry run: artifacts left unchanged")
+        return
+
+    saved = save_atomically(candidate, model_columns, stats, models_dir)
+    print(f"✅ Updated model saved to {saved}")
+    if args.append_to:
+        header = pd.read_csv(args.append_to, nrows=0).columns
+        new.reindex(columns=header).to_csv(args.append_to, mode="a", header=False, index=False)
+        print(f"   Appended {len(new):,} rows to {args.append_to}")
+
+
+if __name__ == "__main__":
+    main()
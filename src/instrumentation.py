@@ -0,0 +1,349 @@
+"""
+Opt-in per-stage instrumentation for the prediction hot path.
+
+``instrument_pipeline`` returns a copy of a fitted pipeline whose steps
+(``features``, ``preprocessor``, the regressor) and ``ColumnTransformer``
+branches (``ord``, ``onehot``, ``target``, ``num``) are wrapped in timers.
+``Instrumentation.stage`` times any other block, such as building the
+request DataFrame or the app's feature-engineering step. Every stage records:
+
+* wall time, as a Prometheus histogram,
+* rows processed,
+* net Python allocator blocks (``sys.getallocatedblocks``) left allocated
+  across the stage, which is cheap enough to collect on every call.
+
+``prometheus()`` renders the totals in the Prometheus text format, and each
+request can be written to a JSON-lines log with its stage breakdown.
+``capture_profile()`` runs one request under cProfile and tracemalloc.
+
+Instrumentation is off unless enabled explicitly or through
+``VEHICLE_PRICE_INSTRUMENT=1`` (``VEHICLE_PRICE_METRICS_LOG`` names the
+JSON-lines file). When it is off, ``instrument_pipeline``
+returns the pipeline unchanged and ``stage()`` returns a shared no-op
+context. Only the standard library is imported at module level.
+
+Measure the overhead and print a stage breakdown:
+    python -m src.instrumentation --rows 1 --rows 1000 --profile
+"""
+
+import argparse
+import contextlib
+import copy
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+ENV_VAR = "VEHICLE_PRICE_INSTRUMENT"
+LOG_ENV_VAR = "VEHICLE_PRICE_METRICS_LOG"
+METRIC_PREFIX = "vehicle_price"
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0, 5.0)
+
+_NULL_STAGE = contextlib.nullcontext()
+
+
+class StageStats:
+    def __init__(self, buckets):
+        self.count = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.alloc_blocks = 0
+        self.bucket_counts = [0] * len(buckets)
+
+
+class _Stage:
+    __slots__ = ("instrumentation", "name", "rows", "started", "blocks")
+
+    def __init__(self, instrumentation, name, rows):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self):
+        self.blocks = sys.getallocatedblocks()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.started
+        self.instrumentation.record(self.name, seconds, self.rows, sys.getallocatedblocks() - self.blocks)
+        return False
+
+
+class Instrumentation:
+    """
+    Thread-safe stage statistics plus an optional JSON-lines request log.
+
+    ``begin()``/``end()`` bracket one request on the calling thread; stages
+    recorded in between are attached to it and written as one log record.
+    """
+
+    def __init__(self, enabled=None, log_path=None, buckets=DEFAULT_BUCKETS):
+        if enabled is None:
+            enabled = os.environ.get(ENV_VAR, "").lower() in ("1", "true", "yes")
+        if log_path is None:
+            log_path = os.environ.get(LOG_ENV_VAR) or None
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self.log_path = log_path
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._log = open(log_path, "a", buffering=1) if (enabled and log_path) else None
+
+    def stage(self, name, rows=None):
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, rows)
+
+    def record(self, name, seconds, rows=None, alloc_blocks=0):
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = StageStats(self.buckets)
+            stats.count += 1
+            stats.seconds += seconds
+            stats.rows += rows or 0
+            stats.alloc_blocks += alloc_blocks
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    stats.bucket_counts[i] += 1
+
+        trace = getattr(self._local, "trace", None)
+        if trace is not None:
+            entry = {"stage": name, "ms": round(seconds * 1000, 3), "rows": rows, "alloc_blocks": alloc_blocks}
+            if tracemalloc.is_tracing():
+                entry["traced_kb"] = round(tracemalloc.get_traced_memory()[0] / 1024, 1)
+            trace["stages"].append(entry)
+
+    # -- per-request traces ---------------------------------------------------
+    def begin(self, event, **fields):
+        if self.enabled:
+            self._local.trace = {"event": event, **fields, "stages": [], "_started": time.perf_counter()}
+
+    def end(self, **fields):
+        """Close the calling thread's request, log it and return it (``None`` when disabled)."""
+        trace = getattr(self._local, "trace", None)
+        if trace is None:
+            return None
+        self._local.trace = None
+        trace.update(fields)
+        trace["total_ms"] = round((time.perf_counter() - trace.pop("_started")) * 1000, 3)
+        trace["ts"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self._local.last = trace
+        if self._log is not None:
+            self._log.write(json.dumps(trace, default=str) + "\n")
+        return trace
+
+    def last_trace(self):
+        """The calling thread's most recently completed request."""
+        return getattr(self._local, "last", None)
+
+    # -- export ---------------------------------------------------------------
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: {
+                    "count": s.count,
+                    "seconds": s.seconds,
+                    "mean_ms": s.seconds * 1000 / s.count if s.count else 0.0,
+                    "rows": s.rows,
+                    "alloc_blocks_per_call": s.alloc_blocks / s.count if s.count else 0.0,
+                }
+                for name, s in self._stats.items()
+            }
+
+    def prometheus(self):
+        """All stage statistics in the Prometheus text exposition format."""
+        name = f"{METRIC_PREFIX}_stage_seconds"
+        lines = [
+            f"# HELP {name} Wall time per hot-path stage.",
+            f"# TYPE {name} histogram",
+        ]
+        with self._lock:
+            stats = sorted(self._stats.items())
+            for stage, s in stats:
+                for bound, count in zip(self.buckets, s.bucket_counts):
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{bound:g}"}} {count}')
+                lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {s.count}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {s.seconds:.6f}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {s.count}')
+
+            rows = f"{METRIC_PREFIX}_stage_rows_total"
+            lines += [f"# HELP {rows} Rows processed per stage.", f"# TYPE {rows} counter"]
+            lines += [f'{rows}{{stage="{stage}"}} {s.rows}' for stage, s in stats]
+
+            blocks = f"{METRIC_PREFIX}_stage_alloc_blocks"
+            lines += [f"# HELP {blocks} Mean net Python allocator blocks per call of a stage.",
+                      f"# TYPE {blocks} gauge"]
+            lines += [f'{blocks}{{stage="{stage}"}} {s.alloc_blocks / s.count:.1f}' for stage, s in stats]
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+# -----------------------------------------------------------------------------
+# PIPELINE WRAPPING
+# -----------------------------------------------------------------------------
+class TimedStep:
+    """A fitted step that times ``transform``/``predict`` and otherwise behaves like ``step``."""
+
+    def __init__(self, step, name, instrumentation):
+        self.step = step
+        self.name = name
+        self.instrumentation = instrumentation
+
+    def __getattr__(self, attribute):
+        return getattr(self.step, attribute)
+
+    def transform(self, X, **params):
+        with self.instrumentation.stage(self.name, len(X)):
+            return self.step.transform(X, **params)
+
+    def predict(self, X, **params):
+        with self.instrumentation.stage(self.name, len(X)):
+            return self.step.predict(X, **params)
+
+
+def instrument_pipeline(pipeline, instrumentation):
+    """
+    A shallow copy of ``pipeline`` reporting each step, and each branch of a
+    ``ColumnTransformer`` step, as a stage. Fitted state is shared, not copied.
+    Returns ``pipeline`` itself when instrumentation is disabled.
+    """
+    if not instrumentation.enabled or not hasattr(pipeline, "steps"):
+        return pipeline
+    steps = []
+    for name, step in pipeline.steps:
+        if hasattr(step, "transformers_"):
+            step = copy.copy(step)
+            step.transformers_ = [
+                (branch, transformer if isinstance(transformer, str)
+                 else TimedStep(transformer, f"{name}.{branch}", instrumentation), columns)
+                for branch, transformer, columns in step.transformers_
+            ]
+        steps.append((name, TimedStep(step, name, instrumentation)))
+    timed = copy.copy(pipeline)
+    timed.steps = steps
+    return timed
+
+
+# -----------------------------------------------------------------------------
+# PROFILE CAPTURE
+# -----------------------------------------------------------------------------
+class ProfileCapture:
+    """
+    cProfile for the calling thread between ``start()`` and ``stop()``. Also
+    traces allocations, so stages recorded meanwhile report ``traced_kb``.
+    """
+
+    def __init__(self, trace_memory=True):
+        self.profile = cProfile.Profile()
+        self.trace_memory = trace_memory
+        self.peak_kb = None
+        self.running = False
+        self._started_tracing = False
+
+    def start(self):
+        self._started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start()
+        self.profile.enable()
+        self.running = True
+        return self
+
+    def stop(self):
+        if not self.running:
+            return self
+        self.running = False
+        self.profile.disable()
+        if self.trace_memory:
+            self.peak_kb = tracemalloc.get_traced_memory()[1] / 1024
+        if self._started_tracing:
+            tracemalloc.stop()
+        return self
+
+    def top(self, n=25, sort="cumulative"):
+        out = io.StringIO()
+        pstats.Stats(self.profile, stream=out).sort_stats(sort).print_stats(n)
+        return out.getvalue()
+
+    def dump(self, path):
+        self.profile.dump_stats(path)
+        return path
+
+
+@contextlib.contextmanager
+def capture_profile(trace_memory=True):
+    """Profile the block; see :class:`ProfileCapture`."""
+    capture = ProfileCapture(trace_memory).start()
+    try:
+        yield capture
+    finally:
+        capture.stop()
+
+
+# -----------------------------------------------------------------------------
+# OVERHEAD BENCHMARK
+# -----------------------------------------------------------------------------
+def main(argv=None):
+    from src.assets import load_assets
+    from src.benchmark import p50_ms, synthesize_listings
+    from src.features import build_model_input
+
+    parser = argparse.ArgumentParser(description="Measure instrumentation overhead and show a stage breakdown.")
+    parser.add_argument("--rows", type=int, action="append", help="Batch size (repeatable; default 1 and 1000)")
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--models-dir", default=None,
+                        help="Directory containing models/ (defaults to the repo root)")
+    parser.add_argument("--profile", action="store_true", help="Also profile one request of the largest batch")
+    args = parser.parse_args(argv)
+
+    pipeline, model_columns = load_assets(args.models_dir)
+    off = Instrumentation(enabled=False)
+    on = Instrumentation(enabled=True)
+    timed = instrument_pipeline(pipeline, on)
+
+    def request(instrumentation, model, listings):
+        instrumentation.begin("predict", rows=len(listings))
+        with instrumentation.stage("build_model_input", len(listings)):
+            features = build_model_input(listings, pipeline, model_columns)
+        model.predict(features)
+        return instrumentation.end()
+
+    print("-" * 62)
+    print(f"{'rows':>8}{'plain ms':>12}{'disabled ms':>13}{'enabled ms':>12}{'overhead':>11}")
+    for rows in args.rows or [1, 1000]:
+        listings = synthesize_listings(model_columns, rows, pipeline)
+        repeats = max(5, args.repeats * 10 // (rows + 9))
+        plain, disabled, enabled = p50_ms([
+            lambda: pipeline.predict(build_model_input(listings, pipeline, model_columns)),
+            lambda: request(off, instrument_pipeline(pipeline, off), listings),
+            lambda: request(on, timed, listings),
+        ], repeats)
+        print(f"{rows:>8,}{plain:>12.3f}{disabled:>13.3f}{enabled:>12.3f}{enabled / plain - 1:>+11.1%}")
+    print("-" * 62)
+
+    print(f"{'stage':<28}{'calls':>7}{'mean ms':>10}{'rows':>10}{'blocks/call':>13}")
+    for name, s in sorted(on.snapshot().items(), key=lambda item: -item[1]["seconds"]):
+        print(f"{name:<28}{s['count']:>7}{s['mean_ms']:>10.3f}{s['rows']:>10,}{s['alloc_blocks_per_call']:>13.1f}")
+    print("-" * 62)
+
+    if args.profile:
+        with capture_profile() as capture:
+            trace = request(on, timed, listings)
+        print(json.dumps(trace, indent=2))
+        print(f"Peak traced memory: {capture.peak_kb:,.0f} KB")
+        print(capture.top(15))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Local load-test harness for the scoring service.
+
+Fires requests from ``--concurrency`` client threads for ``--duration``
+seconds and reports throughput and tail latency.
+
+Usage:
+    python -m src.server --port 8000 &
+    python -m src.load_test --url http://127.0.0.1:8000 --concurrency 32 --duration 10
+"""
+
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+# Defaults from the Streamlit form in app.py
+SAMPLE_LISTING = {
+    "make": "Toyota",
+    "model": "Camry",
+    "year": 2019,
+    "mileage": 45000,
+    "engine_hp": 180,
+    "transmission": "Automatic",
+    "fuel_type": "Gasoline",
+    "drivetrain": "FWD",
+    "condition": "Excellent",
+    "accident_history": "None",
+    "seller_type": "Dealer",
+    "trim": "SE",
+    "body_type": "Sedan",
+    "exterior_color": "Black",
+    "interior_color": "Black",
+    "owner_count": 1,
+    "brand_popularity": 0.5,
+}
+
+
+def _load_listings(path, limit):
+    import pandas as pd
+
+    frame = pd.read_csv(path, nrows=limit).drop(columns=["price"], errors="ignore")
+    return json.loads(frame.to_json(orient="records"))
+
+
+def run_load_test(url, listings, concurrency=16, duration=10.0, batch_size=1):
+    """Hammer ``url`` and return throughput / latency statistics."""
+    if batch_size == 1:
+        endpoint = url.rstrip("/") + "/predict"
+        bodies = [json.dumps(listing).encode() for listing in listings]
+    else:
+        endpoint = url.rstrip("/") + "/predict/batch"
+        bodies = [
+            json.dumps({"rows": [listings[(i + j) % len(listings)] for j in range(batch_size)]}).encode()
+            for i in range(0, len(listings), batch_size)
+        ]
+
+    latencies = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    stop_at = time.perf_counter() + duration
+
+    def worker(slot):
+        i = slot
+        while time.perf_counter() < stop_at:
+            request = urllib.request.Request(
+                endpoint, data=bodies[i % len(bodies)], headers={"Content-Type": "application/json"}
+            )
+            t0 = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    response.read()
+                latencies[slot].append(time.perf_counter() - t0)
+            except (urllib.error.URLError, OSError):
+                errors[slot] += 1
+            i += concurrency
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(slot,)) for slot in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    all_latencies = np.concatenate([np.asarray(l) for l in latencies]) * 1000
+    requests = len(all_latencies)
+    return {
+        "requests": requests,
+        "errors": sum(errors),
+        "seconds": elapsed,
+        "requests_per_sec": requests / elapsed,
+        "rows_per_sec": requests * batch_size / elapsed,
+        "p50_ms": float(np.percentile(all_latencies, 50)) if requests else float("nan"),
+        "p95_ms": float(np.percentile(all_latencies, 95)) if requests else float("nan"),
+        "p99_ms": float(np.percentile(all_latencies, 99)) if requests else float("nan"),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the HTTP scoring service.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="Rows per request; 1 uses /predict, more uses /predict/batch")
+    parser.add_argument("--data", help="CSV of listings to replay (defaults to one sample listing)")
+    args = parser.parse_args(argv)
+
+    listings = _load_listings(args.data, 10_000) if args.data else [SAMPLE_LISTING]
+    stats = run_load_test(args.url, listings, args.concurrency, args.duration, args.batch_size)
+
+    print("-" * 30)
+    print(f"Requests:    {stats['requests']:,} ({stats['errors']} errors) in {stats['seconds']:.1f}s")
+    print(f"Throughput:  {stats['requests_per_sec']:,.0f} req/sec | {stats['rows_per_sec']:,.0f} rows/sec")
+    print(f"Latency:     p50 {stats['p50_ms']:.2f} ms | p95 {stats['p95_ms']:.2f} ms | p99 {stats['p99_ms']:.2f} ms")
+    print("-" * 30)
+
+
+if __name__ == "__main__":
+    main()
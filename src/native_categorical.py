@@ -0,0 +1,165 @@
+"""
+Native categorical pipeline variant.
+
+Instead of dense one-hot plus cross-fitted target encoding, the string
+columns are cast to pandas ``category`` dtype with a vocabulary frozen at
+fit time (stored in the artifact) and handed straight to
+``XGBRegressor(enable_categorical=True)``. Numeric columns go through as
+float32; XGBoost handles their missing values natively, so no imputer or
+scaler is needed.
+
+Benchmark against the encoded pipeline:
+    python -m src.native_categorical --data vehicle_price_prediction.csv --n-estimators 500
+"""
+
+import argparse
+import multiprocessing as mp
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.pipeline import Pipeline
+
+from src.features import DERIVED_COLS, FEATURE_STEP, LEGACY_REFERENCE_YEAR, VehicleFeatureEngineer
+from src.production_train import (
+    DEFAULT_XGB_PARAMS,
+    HIGH_CARD_COLS,
+    LOW_CARD_COLS,
+    NUMERIC_COLS,
+    ORDINAL_COLS,
+)
+
+CATEGORICAL_STEP = "categorical"
+
+
+class CategoricalCaster(BaseEstimator, TransformerMixin):
+    """
+    Cast categorical columns to a fixed ``category`` vocabulary and numeric
+    columns to float32. Unseen categories become missing at predict time.
+    """
+
+    def __init__(self, categorical_columns, numeric_columns):
+        self.categorical_columns = categorical_columns
+        self.numeric_columns = numeric_columns
+
+    def fit(self, X, y=None):
+        self.categories_ = {}
+        for column in self.categorical_columns:
+            values = X[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.cat.remove_unused_categories()
+                categories = values.cat.categories
+            else:
+                categories = pd.Index(values.dropna().unique())
+            self.categories_[column] = sorted(str(c) for c in categories)
+        self.feature_names_out_ = list(self.categorical_columns) + list(self.numeric_columns)
+        return self
+
+    def transform(self, X):
+        columns = {}
+        for column in self.categorical_columns:
+            values = X[column] if column in X.columns else pd.Series(np.nan, index=X.index)
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.astype(object)
+            dtype = pd.CategoricalDtype(self.categories_[column])
+            columns[column] = values.where(values.isna(), values.astype(str)).astype(dtype)
+        for column in self.numeric_columns:
+            values = X[column] if column in X.columns else pd.Series(np.nan, index=X.index)
+            columns[column] = pd.to_numeric(values, errors="coerce").astype(np.float32)
+        return pd.DataFrame(columns, index=X.index)[self.feature_names_out_]
+
+    def get_feature_names_out(self, input_features=None):
+        return np.asarray(self.feature_names_out_, dtype=object)
+
+
+def build_native_pipeline(columns, reference_year=LEGACY_REFERENCE_YEAR, xgb_params=None):
+    columns = set(columns) | set(DERIVED_COLS)
+    categorical = [c for c in ORDINAL_COLS + LOW_CARD_COLS + HIGH_CARD_COLS if c in columns]
+    numeric = [c for c in NUMERIC_COLS if c in columns]
+    params = {**DEFAULT_XGB_PARAMS, **(xgb_params or {}), "enable_categorical": True}
+    return Pipeline(steps=[
+        (FEATURE_STEP, VehicleFeatureEngineer(reference_year=reference_year)),
+        (CATEGORICAL_STEP, CategoricalCaster(categorical, numeric)),
+        ("regressor", xgb.XGBRegressor(**params)),
+    ])
+
+
+# -----------------------------------------------------------------------------
+# BENCHMARK
+# -----------------------------------------------------------------------------
+def _run_variant(variant, data_path, nrows, xgb_params, repeats):
+    """Train and measure one variant; runs in its own process so peak RSS is isolated."""
+    from sklearn.model_selection import train_test_split
+
+    from src.benchmark import p50_ms
+    from src.production_train import build_pipeline, evaluate, peak_rss_mb, read_listings, split_xy
+
+    X, y = split_xy(read_listings(data_path, nrows=nrows))
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.15, random_state=42)
+    rss_before = peak_rss_mb()
+
+    builder = build_native_pipeline if variant == "native" else build_pipeline
+    pipeline = builder(X_train.columns, xgb_params=xgb_params)
+    t0 = time.perf_counter()
+    pipeline.fit(X_train, y_train)
+    train_seconds = time.perf_counter() - t0
+
+    metrics = evaluate(pipeline, X_test, y_test)
+    single = X_test.head(1)
+    batch = X_test.head(1000)
+    (single_ms,) = p50_ms([lambda: pipeline.predict(single)], repeats)
+    (batch_ms,) = p50_ms([lambda: pipeline.predict(batch)], max(3, repeats // 10))
+    return {
+        "variant": variant,
+        "train_seconds": train_seconds,
+        "peak_rss_mb": peak_rss_mb(),
+        "fit_rss_growth_mb": peak_rss_mb() - rss_before,
+        "model_bytes": len(pickle.dumps(pipeline)),
+        "single_p50_ms": single_ms,
+        "batch_1k_p50_ms": batch_ms,
+        "mae": metrics["mae"],
+        "mape": metrics["mape"],
+    }
+
+
+def compare_variants(data_path, nrows=None, xgb_params=None, repeats=100):
+    ctx = mp.get_context("spawn")
+    results = []
+    for variant in ("encoded", "native"):
+        with ctx.Pool(1) as pool:
+            results.append(pool.apply(_run_variant, (variant, data_path, nrows, xgb_params, repeats)))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark encoded vs native categorical pipelines.")
+    parser.add_argument("--data", required=True, help="Listings CSV with a price column")
+    parser.add_argument("--nrows", type=int, default=None)
+    parser.add_argument("--n-estimators", type=int, default=DEFAULT_XGB_PARAMS["n_estimators"])
+    parser.add_argument("--learning-rate", type=float, default=DEFAULT_XGB_PARAMS["learning_rate"])
+    parser.add_argument("--max-depth", type=int, default=DEFAULT_XGB_PARAMS["max_depth"])
+    parser.add_argument("--repeats", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    xgb_params = {
+        "n_estimators": args.n_estimators,
+        "learning_rate": args.learning_rate,
+        "max_depth": args.max_depth,
+    }
+    results = compare_variants(args.data, args.nrows, xgb_params, args.repeats)
+
+    print("-" * 78)
+    print(f"{'variant':<9}{'train s':>9}{'peak RSS':>11}{'model MB':>10}{'1-row ms':>10}"
+          f"{'1k ms':>9}{'MAE':>10}{'MAPE':>9}")
+    for r in results:
+        print(f"{r['variant']:<9}{r['train_seconds']:>9.1f}{r['peak_rss_mb']:>9.0f}MB"
+              f"{r['model_bytes'] / 2**20:>10.2f}{r['single_p50_ms']:>10.2f}{r['batch_1k_p50_ms']:>9.1f}"
+              f"{r['mae']:>10,.1f}{r['mape']:>9.2%}")
+    print("-" * 78)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Process-pool parallel scoring over one shared, memory-mapped model.
+
+``export_shared`` writes the compiled preprocessing tables plus the boosted
+trees in the flat ``TreeEnsemble`` layout. Each worker memory-maps the same
+``.npy`` files read-only, so the model occupies the page cache once no matter
+how many workers run, and cold start is an ``mmap`` instead of an unpickle.
+
+The parent builds the feature matrix once, spills it to a memory-mapped
+scratch file and hands workers ``(start, stop)`` row ranges; only the
+predictions travel back through the pool.
+
+Usage:
+    python -m src.parallel_scoring export --out models/shared
+    python -m src.parallel_scoring bench --data listings.csv --rows 500000 --workers 4
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src.compiled import CompiledScorer, export_compiled
+from src.tree_ensemble import TreeEnsemble
+
+DEFAULT_SHARED_DIR = Path(__file__).resolve().parent.parent / "models" / "shared"
+DEFAULT_CHUNK_ROWS = 20_000
+ENGINES = ("mmap", "native")
+
+
+# -----------------------------------------------------------------------------
+# EXPORT
+# -----------------------------------------------------------------------------
+def export_shared(pipeline, out_dir=DEFAULT_SHARED_DIR):
+    """Write compiled preprocessing plus the memory-mappable tree arrays."""
+    out_dir = export_compiled(pipeline, out_dir)
+    scorer = CompiledScorer.load(out_dir)
+    ensemble = TreeEnsemble.from_booster(scorer.booster, scorer.spec["iteration_range"])
+    ensemble.save(out_dir)
+    return out_dir
+
+
+# -----------------------------------------------------------------------------
+# WORKERS
+# -----------------------------------------------------------------------------
+def process_memory():
+    """Resident memory of this process in MB, split into file-backed and anonymous."""
+    stats = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "RssAnon", "RssFile", "RssShmem"):
+                    stats[key] = int(value.split()[0]) / 1024
+    except OSError:
+        import resource
+
+        stats["VmRSS"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return stats
+
+
+_worker = {}
+
+
+def _init_worker(model_dir, engine):
+    if engine == "mmap":
+        _worker["predict"] = TreeEnsemble.load(model_dir, mmap=True).predict
+    else:
+        scorer = CompiledScorer.load(model_dir)
+        iteration_range = scorer.iteration_range
+        _worker["predict"] = lambda m: scorer.booster.inplace_predict(m, iteration_range=iteration_range)
+
+
+def _score_range(task):
+    matrix_path, start, stop = task
+    matrix = np.load(matrix_path, mmap_mode="r")
+    prices = _worker["predict"](matrix[start:stop])
+    return start, np.asarray(prices, dtype=np.float64), os.getpid(), process_memory()
+
+
+class ParallelScorer:
+    """
+    Score large batches across ``workers`` processes sharing one model.
+
+    Use as a context manager so the pool and scratch files are cleaned up.
+    """
+
+    def __init__(self, model_dir=DEFAULT_SHARED_DIR, workers=None, engine="mmap",
+                 chunk_rows=DEFAULT_CHUNK_ROWS):
+        if engine not in ENGINES:
+            raise ValueError(f"engine must be one of {ENGINES}")
+        self.model_dir = Path(model_dir)
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_rows = chunk_rows
+        self.preprocessor = CompiledScorer.load(self.model_dir, load_booster=False)
+        self.worker_memory = {}
+        self._scratch = tempfile.TemporaryDirectory(
+            dir="/dev/shm" if os.path.isdir("/dev/shm") else None
+        )
+        self._pool = mp.get_context("spawn" if os.name == "nt" else "fork").Pool(
+            self.workers, initializer=_init_worker, initargs=(str(self.model_dir), engine)
+        )
+
+    def predict(self, rows):
+        matrix = self.preprocessor.transform(rows)
+        matrix_path = os.path.join(self._scratch.name, f"matrix-{id(matrix)}.npy")
+        np.save(matrix_path, matrix)
+
+        n = len(matrix)
+        # at least one range per worker so small batches still spread out
+        step = max(1, min(self.chunk_rows, -(-n // self.workers)))
+        tasks = [(matrix_path, start, min(start + step, n)) for start in range(0, n, step)]
+
+        prices = np.empty(n, dtype=np.float64)
+        try:
+            for start, chunk, pid, memory in self._pool.imap_unordered(_score_range, tasks):
+                prices[start:start + len(chunk)] = chunk
+                self.worker_memory[pid] = memory
+        finally:
+            os.remove(matrix_path)
+        return prices
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+        self._scratch.cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# -----------------------------------------------------------------------------
+# BENCHMARK
+# -----------------------------------------------------------------------------
+def benchmark(model_dir, listings, max_workers, engine="mmap", repeats=3):
+    """Time the same batch at 1..max_workers processes and report speedup."""
+    results = []
+    baseline = None
+    for workers in range(1, max_workers + 1):
+        with ParallelScorer(model_dir, workers=workers, engine=engine) as scorer:
+            scorer.predict(listings.head(workers))  # warm every worker
+            timings = []
+            for _ in range(repeats):
+                t0 = time.perf_counter()
+                scorer.predict(listings)
+                timings.append(time.perf_counter() - t0)
+            seconds = min(timings)
+            baseline = baseline or seconds
+            results.append(
+                {
+                    "workers": workers,
+                    "seconds": seconds,
+                    "rows_per_sec": len(listings) / seconds,
+                    "speedup": baseline / seconds,
+                    "efficiency": baseline / seconds / workers,
+                    "worker_memory": dict(scorer.worker_memory),
+                }
+            )
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export or benchmark shared-model parallel scoring.")
+    parser.add_argument("command", choices=["export", "bench"])
+    parser.add_argument("--models-dir", default=None,
+                        help="Directory containing models/ (defaults to the repo root)")
+    parser.add_argument("--out", default=str(DEFAULT_SHARED_DIR))
+    parser.add_argument("--data", help="CSV of listings to benchmark with (bench only)")
+    parser.add_argument("--rows", type=int, default=200_000,
+                        help="Rows to score, tiling --data if it is smaller")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--engine", choices=ENGINES, default="mmap",
+                        help="mmap: shared tree arrays; native: per-worker XGBoost booster")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        from src.assets import load_assets
+
+        pipeline, _ = load_assets(args.models_dir)
+        out_dir = export_shared(pipeline, args.out)
+        print(f"✅ Shared model saved to {out_dir}")
+        return
+
+    import pandas as pd
+
+    if not args.data:
+        parser.error("bench requires --data")
+    listings = pd.read_csv(args.data, nrows=args.rows)
+    repeats = -(-args.rows // len(listings))
+    listings = pd.concat([listings] * repeats, ignore_index=True).head(args.rows)
+
+    print("-" * 30)
+    for result in benchmark(args.out, listings, args.workers, args.engine):
+        rss = [m.get("VmRSS", 0) for m in result["worker_memory"].values()]
+        shared = [m.get("RssFile", 0) for m in result["worker_memory"].values()]
+        print(
+            f"{result['workers']:>2} workers | {result['rows_per_sec']:>12,.0f} rows/sec | "
+            f"speedup {result['speedup']:.2f}x ({result['efficiency']:.0%}) | "
+            f"RSS/worker {np.mean(rss):.0f} MB (file-backed {np.mean(shared):.0f} MB)"
+        )
+    print("-" * 30)
+
+
+if __name__ == "__main__":
+    main()
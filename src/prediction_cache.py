@@ -0,0 +1,195 @@
+"""
+LRU/TTL prediction cache keyed on the post-``reindex`` feature row.
+
+Rows are canonicalized (numeric columns as float64, everything else as
+strings) and hashed column-wise with ``pd.util.hash_array``, so a whole
+batch is keyed without per-row Python. Only cache misses reach
+``pipeline.predict``, in a single call.
+
+Every lookup carries the fingerprint of the loaded model artifact; when it
+changes the cache is cleared so stale prices are never served after a model
+swap.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from src.features import build_model_input
+
+DEFAULT_MAXSIZE = 10_000
+DEFAULT_TTL_SECONDS = 3600.0
+
+# Keeps missing values distinct from a literal "None" category
+_MISSING_TOKEN = "\x00<NA>"
+_FNV_PRIME = np.uint64(1099511628211)
+
+
+# -----------------------------------------------------------------------------
+# FINGERPRINTS & KEYS
+# -----------------------------------------------------------------------------
+_fingerprints = {}
+
+
+def artifact_fingerprint(path):
+    """
+    SHA-256 of the artifact file. The digest is only recomputed when the
+    file's size or mtime changes, so this is cheap to call per request.
+    """
+    path = os.fspath(path)
+    stat = os.stat(path)
+    signature = (stat.st_size, stat.st_mtime_ns)
+    cached = _fingerprints.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    fingerprint = digest.hexdigest()
+    _fingerprints[path] = (signature, fingerprint)
+    return fingerprint
+
+
+def row_keys(features):
+    """
+    Canonical 64-bit hash per row of a post-reindex feature frame. Numeric
+    columns hash as float64 (so ``45000`` and ``45000.0`` collide on purpose),
+    everything else as strings.
+    """
+    keys = np.zeros(len(features), dtype=np.uint64)
+    for column in features.columns:
+        values = features[column]
+        if values.dtype.kind in "biuf":
+            hashed = pd.util.hash_array(values.to_numpy(dtype=np.float64))
+        else:
+            values = values.to_numpy(dtype=object)
+            missing = pd.isna(values)
+            if missing.any():
+                values = np.where(missing, _MISSING_TOKEN, values)
+            hashed = pd.util.hash_array(values.astype(str).astype(object), categorize=False)
+        keys = (keys * _FNV_PRIME) ^ hashed
+    return keys
+
+
+# -----------------------------------------------------------------------------
+# CACHE
+# -----------------------------------------------------------------------------
+class PredictionCache:
+    """Thread-safe LRU cache with per-entry TTL and hit/miss counters."""
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, ttl=DEFAULT_TTL_SECONDS, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.fingerprint = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # () for point predictions, (k,) for a k-quantile price band
+        self._value_shape = ()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _check_fingerprint(self, fingerprint):
+        if fingerprint != self.fingerprint:
+            if self.fingerprint is not None:
+                self.invalidations += 1
+            self._entries.clear()
+            self._value_shape = ()
+            self.fingerprint = fingerprint
+
+    def get_many(self, keys, fingerprint):
+        """Return cached prices (NaN where missing) and the boolean hit mask."""
+        hit = np.zeros(len(keys), dtype=bool)
+        now = self.clock()
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            prices = np.full((len(keys),) + self._value_shape, np.nan)
+            for i, key in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                price, expires_at = entry
+                if expires_at < now:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                prices[i] = price
+                hit[i] = True
+            self.hits += int(hit.sum())
+            self.misses += int(len(keys) - hit.sum())
+        return prices, hit
+
+    def put_many(self, keys, prices, fingerprint):
+        expires_at = self.clock() + self.ttl
+        with self._lock:
+            if fingerprint != self.fingerprint:
+                # the model changed while these were being computed
+                return
+            self._value_shape = np.shape(prices)[1:]
+            for key, price in zip(keys, prices):
+                self._entries[key] = (price if self._value_shape else float(price), expires_at)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def predict(self, pipeline, features, fingerprint):
+        """``pipeline.predict(features)`` with cached rows skipped."""
+        keys = row_keys(features)
+        prices, hit = self.get_many(keys, fingerprint)
+        if not hit.all():
+            miss = ~hit
+            fresh = np.asarray(pipeline.predict(features[miss]), dtype=np.float64)
+            if prices.shape[1:] != fresh.shape[1:]:
+                # first rows cached for this model, so nothing could have hit yet
+                prices = np.full((len(keys),) + fresh.shape[1:], np.nan)
+            prices[miss] = fresh
+            self.put_many(keys[miss], fresh, fingerprint)
+        return prices
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+class CachedPredictor:
+    """
+    Raw listing rows in, prices out, through ``build_model_input`` and a
+    :class:`PredictionCache`. ``fingerprint`` identifies the loaded pipeline
+    (see :func:`artifact_fingerprint`); a predictor built for a new artifact
+    invalidates entries left by the previous one.
+    """
+
+    def __init__(self, pipeline, model_columns, fingerprint, cache=None):
+        self.pipeline = pipeline
+        self.model_columns = model_columns
+        self.fingerprint = fingerprint
+        self.cache = cache if cache is not None else PredictionCache()
+
+    def predict(self, frame):
+        features = build_model_input(frame, self.pipeline, self.model_columns)
+        return self.cache.predict(self.pipeline, features, self.fingerprint)
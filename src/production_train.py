@@ -0,0 +1,478 @@
+"""
+Reproducible training entry point (the script version of ``train_model.ipynb``).
+
+Loads the listings CSV with compact dtypes (``category`` for strings,
+int32/float32 for numbers), fits the same pipeline as the notebook and
+writes ``vehicle_price_pipeline.pkl`` and ``input_columns.pkl``.
+
+``--variant native`` swaps the encoders for XGBoost's native categorical
+support (see ``src/native_categorical.py``); ``--variant quantile`` trains a
+multi-quantile booster that predicts a price band (see ``src/quantile.py``).
+
+With ``--external-memory`` the CSV is never fully materialized: the
+preprocessor is fitted on a random sample, then XGBoost streams transformed
+chunks through its ``DataIter`` interface into an on-disk page cache.
+
+Peak RSS and wall time are logged for every stage.
+
+Usage:
+    python -m src.production_train --data vehicle_price_prediction.csv --out models
+    python -m src.production_train --data big.csv --out models --external-memory --chunksize 200000
+"""
+
+import argparse
+import json
+import resource
+import tempfile
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
+from sklearn.metrics import mean_absolute_error, mean_absolute_percentage_error, mean_squared_error, r2_score
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder, StandardScaler
+
+try:
+    from sklearn.preprocessing import TargetEncoder
+    IS_SKLEARN_TARGET_ENCODER = True
+except ImportError:
+    try:
+        from category_encoders import TargetEncoder
+        IS_SKLEARN_TARGET_ENCODER = False
+    except ImportError:
+        raise ImportError("TargetEncoder missing. Run: pip install category_encoders")
+
+from src.assets import COLUMNS_FILENAME, MODEL_FILENAME, STATS_FILENAME
+from src.features import DERIVED_COLS, FEATURE_STEP, LEGACY_REFERENCE_YEAR, VehicleFeatureEngineer
+
+# -----------------------------------------------------------------------------
+# FEATURE SCHEMA
+# -----------------------------------------------------------------------------
+TARGET_COL = "price"
+
+# High Cardinality -> Target Encoding
+HIGH_CARD_COLS = ["make", "model", "trim", "exterior_color", "interior_color"]
+
+# Low Cardinality -> One-Hot Encoding
+LOW_CARD_COLS = ["transmission", "fuel_type", "drivetrain", "body_type", "seller_type", "accident_history"]
+
+# Ordinal -> Ordinal Encoding
+ORDINAL_COLS = ["condition"]
+CONDITION_ORDER = ["Fair", "Good", "Excellent"]
+
+# Numeric -> Scaling
+NUMERIC_COLS = ["mileage", "engine_hp", "owner_count", "vehicle_age", "mileage_per_year", "brand_popularity"]
+
+# Compact in-memory dtypes for the raw CSV (numbers coerced after parsing, see coerce_numeric)
+COLUMN_DTYPES = {
+    **{c: "category" for c in HIGH_CARD_COLS + LOW_CARD_COLS + ORDINAL_COLS},
+    "year": "int32",
+    "mileage": "int32",
+    "engine_hp": "int32",
+    "owner_count": "float32",
+    "brand_popularity": "float32",
+    "vehicle_age": "float32",
+    "mileage_per_year": "float32",
+    TARGET_COL: "float32",
+}
+
+# Configuration optimized for large-scale tabular data
+DEFAULT_XGB_PARAMS = {
+    "n_estimators": 2000,
+    "learning_rate": 0.02,
+    "max_depth": 9,
+    "subsample": 0.85,
+    "colsample_bytree": 0.85,
+    "tree_method": "hist",
+    "random_state": 42,
+    "n_jobs": -1,
+}
+
+
+# -----------------------------------------------------------------------------
+# RESOURCE LOGGING
+# -----------------------------------------------------------------------------
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB (Linux reports KB)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class StageTimer:
+    """Prints wall time and peak RSS after each named training stage."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = []
+
+    def __call__(self, name):
+        elapsed = time.perf_counter() - self.start
+        self.stages.append({"stage": name, "elapsed_s": round(elapsed, 3), "peak_rss_mb": round(peak_rss_mb(), 1)})
+        print(f"[{elapsed:8.1f}s | peak RSS {peak_rss_mb():8.1f} MB] {name}")
+
+
+# -----------------------------------------------------------------------------
+# DATA LOADING
+# -----------------------------------------------------------------------------
+def _dtypes_for(path):
+    """``read_csv`` dtypes: only the categories. Numbers are coerced after parsing (see ``coerce_numeric``)."""
+    header = pd.read_csv(path, nrows=0).columns
+    return {c: t for c, t in COLUMN_DTYPES.items() if c in header and t == "category"}
+
+
+def coerce_numeric(frame, downcast=True):
+    """
+    Coerce the numeric columns in place like the notebook did: blanks and
+    non-numeric text become NaN for the pipeline's median imputers. Values
+    are stored as float32; with ``downcast`` an integer column without NaN
+    gets its compact int dtype. Chunked readers pass ``downcast=False`` so
+    every chunk has the same dtypes.
+    """
+    for column, dtype in COLUMN_DTYPES.items():
+        if dtype == "category" or column not in frame.columns:
+            continue
+        values = pd.to_numeric(frame[column], errors="coerce").astype(np.float32)
+        if downcast and dtype.startswith("int") and not values.isna().any():
+            values = values.astype(dtype)
+        frame[column] = values
+    return frame
+
+
+def read_listings(path, nrows=None, columns=None):
+    """Read the full CSV with compact dtypes, or a columnar feature cache directory (see ``src.feature_cache``)."""
+    from src.feature_cache import is_feature_cache, read_features
+
+    if is_feature_cache(path):
+        return read_features(path, columns=columns, nrows=nrows)
+    return coerce_numeric(pd.read_csv(path, dtype=_dtypes_for(path), nrows=nrows, usecols=columns))
+
+
+def iter_listing_chunks(path, chunksize):
+    """Stream the CSV (or a feature cache directory) in compact-dtype chunks."""
+    from src.feature_cache import is_feature_cache, iter_features
+
+    if is_feature_cache(path):
+        yield from iter_features(path, chunksize)
+        return
+    for chunk in pd.read_csv(path, dtype=_dtypes_for(path), chunksize=chunksize):
+        yield coerce_numeric(chunk, downcast=False)
+
+
+def split_xy(df):
+    # Derived columns are recomputed from `year` inside the pipeline
+    X = df.drop(columns=[TARGET_COL] + DERIVED_COLS, errors="ignore")
+    return X, df[TARGET_COL].astype(np.float64)
+
+
+# -----------------------------------------------------------------------------
+# PIPELINE
+# -----------------------------------------------------------------------------
+def build_preprocessor(columns):
+    """The notebook's ColumnTransformer, restricted to ``columns`` that exist."""
+    columns = set(columns) | set(DERIVED_COLS)
+    valid_high = [c for c in HIGH_CARD_COLS if c in columns]
+    valid_low = [c for c in LOW_CARD_COLS if c in columns]
+    valid_ord = [c for c in ORDINAL_COLS if c in columns]
+    valid_num = [c for c in NUMERIC_COLS if c in columns]
+
+    ordinal_transformer = Pipeline(steps=[
+        ("imputer", SimpleImputer(strategy="most_frequent")),
+        ("encoder", OrdinalEncoder(categories=[CONDITION_ORDER], handle_unknown="use_encoded_value", unknown_value=-1)),
+    ])
+    onehot_transformer = Pipeline(steps=[
+        ("imputer", SimpleImputer(strategy="constant", fill_value="Missing")),
+        ("encoder", OneHotEncoder(drop="first", sparse_output=False, handle_unknown="ignore")),
+    ])
+    target_encoder_impl = (
+        TargetEncoder(smooth="auto", target_type="continuous") if IS_SKLEARN_TARGET_ENCODER else TargetEncoder()
+    )
+    target_transformer = Pipeline(steps=[
+        ("imputer", SimpleImputer(strategy="constant", fill_value="Unknown")),
+        ("encoder", target_encoder_impl),
+    ])
+    numeric_transformer = Pipeline(steps=[
+        ("imputer", SimpleImputer(strategy="median")),
+        ("scaler", StandardScaler()),
+    ])
+
+    return ColumnTransformer(
+        transformers=[
+            ("ord", ordinal_transformer, valid_ord),
+            ("onehot", onehot_transformer, valid_low),
+            ("target", target_transformer, valid_high),
+            ("num", numeric_transformer, valid_num),
+        ],
+        remainder="drop",
+    )
+
+
+def build_pipeline(columns, reference_year=LEGACY_REFERENCE_YEAR, xgb_params=None):
+    params = {**DEFAULT_XGB_PARAMS, **(xgb_params or {})}
+    return Pipeline(steps=[
+        (FEATURE_STEP, VehicleFeatureEngineer(reference_year=reference_year)),
+        ("preprocessor", build_preprocessor(columns)),
+        ("regressor", xgb.XGBRegressor(**params)),
+    ])
+
+
+# -----------------------------------------------------------------------------
+# EVALUATION & EXPORT
+# -----------------------------------------------------------------------------
+def evaluate(pipeline, X_test, y_test):
+    y_pred = pipeline.predict(X_test)
+    if y_pred.ndim == 2:
+        # quantile variant: score the median output
+        from src.quantile import quantile_levels, split_band
+
+        y_pred = split_band(y_pred, quantile_levels(pipeline))[0]
+    mape = mean_absolute_percentage_error(y_test, y_pred)
+    return {
+        "accuracy": 100 * (1 - mape),
+        "r2": r2_score(y_test, y_pred),
+        "mae": mean_absolute_error(y_test, y_pred),
+        "rmse": float(np.sqrt(mean_squared_error(y_test, y_pred))),
+        "mape": mape,
+    }
+
+
+def print_scorecard(metrics):
+    print("-" * 30)
+    print("MODEL PERFORMANCE SCORECARD")
+    print("-" * 30)
+    print(f"Accuracy: {metrics['accuracy']:.2f}%")
+    print(f"R² Score: {metrics['r2']:.4f}")
+    print(f"MAE:      ${metrics['mae']:,.2f}")
+    print(f"RMSE:     ${metrics['rmse']:,.2f}")
+    print("-" * 30)
+
+
+def save_artifacts(pipeline, input_columns, out_dir):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    joblib.dump(pipeline, out_dir / MODEL_FILENAME)
+    joblib.dump(list(input_columns), out_dir / COLUMNS_FILENAME)
+    # Statistics left by src.incremental describe the replaced model's encoders
+    (out_dir / STATS_FILENAME).unlink(missing_ok=True)
+    return out_dir / MODEL_FILENAME, out_dir / COLUMNS_FILENAME
+
+
+# -----------------------------------------------------------------------------
+# IN-MEMORY TRAINING
+# -----------------------------------------------------------------------------
+def train_in_memory(data_path, test_size=0.15, reference_year=LEGACY_REFERENCE_YEAR,
+                    xgb_params=None, timer=None, nrows=None, variant="encoded"):
+    timer = timer or StageTimer()
+    df = read_listings(data_path, nrows=nrows)
+    timer(f"Loaded {len(df):,} rows ({df.memory_usage(deep=True).sum() / 2**20:,.0f} MB in memory)")
+
+    X, y = split_xy(df)
+    del df
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=42)
+    del X, y
+
+    if variant == "native":
+        from src.native_categorical import build_native_pipeline
+
+        pipeline = build_native_pipeline(X_train.columns, reference_year, xgb_params)
+    elif variant == "quantile":
+        from src.quantile import build_quantile_pipeline
+
+        pipeline = build_quantile_pipeline(X_train.columns, reference_year, xgb_params)
+    else:
+        pipeline = build_pipeline(X_train.columns, reference_year, xgb_params)
+    pipeline.fit(X_train, y_train)
+    timer("✅ Training Pipeline Complete")
+
+    metrics = evaluate(pipeline, X_test, y_test)
+    timer("Evaluated holdout")
+    return pipeline, list(X_train.columns), metrics
+
+
+# -----------------------------------------------------------------------------
+# EXTERNAL-MEMORY TRAINING
+# -----------------------------------------------------------------------------
+def _holdout_mask(n, chunk_index, test_size, seed):
+    """Deterministic per-chunk split, so every pass over the CSV agrees."""
+    return np.random.default_rng([seed, chunk_index]).random(n) < test_size
+
+
+class ListingChunkIter(xgb.DataIter):
+    """Feeds preprocessed training chunks of the CSV to XGBoost."""
+
+    def __init__(self, data_path, chunksize, preprocess, test_size, seed, cache_prefix):
+        super().__init__(cache_prefix=cache_prefix)
+        self.data_path = data_path
+        self.chunksize = chunksize
+        self.preprocess = preprocess
+        self.test_size = test_size
+        self.seed = seed
+        self._chunks = None
+        self._index = 0
+
+    def reset(self):
+        self._chunks = None
+        self._index = 0
+
+    def next(self, input_data):
+        if self._chunks is None:
+            self._chunks = iter_listing_chunks(self.data_path, self.chunksize)
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            return 0
+
+        train = chunk[~_holdout_mask(len(chunk), self._index, self.test_size, self.seed)]
+        self._index += 1
+        X, y = split_xy(train)
+        input_data(data=self.preprocess.transform(X).astype(np.float32), label=y.to_numpy())
+        return 1
+
+
+def _booster_params(xgb_params):
+    params = {**DEFAULT_XGB_PARAMS, **(xgb_params or {})}
+    rounds = params.pop("n_estimators")
+    params["seed"] = params.pop("random_state")
+    params["nthread"] = params.pop("n_jobs")
+    if params["nthread"] == -1:
+        params.pop("nthread")
+    params.setdefault("objective", "reg:squarederror")
+    return params, rounds
+
+
+def train_external_memory(data_path, chunksize=200_000, test_size=0.15, fit_fraction=0.25,
+                          reference_year=LEGACY_REFERENCE_YEAR, xgb_params=None, timer=None, seed=42):
+    timer = timer or StageTimer()
+
+    # Pass 1: random sample for the preprocessor statistics + the holdout set
+    sample_parts, holdout_parts = [], []
+    rng = np.random.default_rng(seed)
+    for index, chunk in enumerate(iter_listing_chunks(data_path, chunksize)):
+        holdout = _holdout_mask(len(chunk), index, test_size, seed)
+        holdout_parts.append(chunk[holdout])
+        train = chunk[~holdout]
+        sample_parts.append(train[rng.random(len(train)) < fit_fraction])
+    sample = pd.concat(sample_parts, ignore_index=True)
+    holdout = pd.concat(holdout_parts, ignore_index=True)
+    del sample_parts, holdout_parts
+    timer(f"Sampled {len(sample):,} rows for preprocessing, held out {len(holdout):,}")
+
+    X_sample, y_sample = split_xy(sample)
+    pipeline = build_pipeline(X_sample.columns, reference_year, xgb_params)
+    preprocess = pipeline[:-1]
+    preprocess.fit(X_sample, y_sample)
+    input_columns = list(X_sample.columns)
+    del sample, X_sample, y_sample
+    timer("Fitted preprocessor")
+
+    # Pass 2+: stream transformed chunks into XGBoost's external-memory cache
+    params, rounds = _booster_params(xgb_params)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        iterator = ListingChunkIter(
+            data_path, chunksize, preprocess, test_size, seed, cache_prefix=str(Path(cache_dir) / "dtrain")
+        )
+        dtrain = xgb.DMatrix(iterator)
+        timer(f"Built external-memory DMatrix ({dtrain.num_row():,} rows)")
+        booster = xgb.train(params, dtrain, num_boost_round=rounds)
+        del dtrain
+    timer("✅ Training Pipeline Complete")
+
+    regressor = pipeline.named_steps["regressor"]
+    regressor.load_model(bytearray(booster.save_raw("ubj")))
+
+    X_test, y_test = split_xy(holdout)
+    metrics = evaluate(pipeline, X_test, y_test)
+    timer("Evaluated holdout")
+    return pipeline, input_columns, metrics
+
+
+# -----------------------------------------------------------------------------
+# CLI
+# -----------------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the vehicle price pipeline.")
+    parser.add_argument("--data", required=True, help="Listings CSV with a price column")
+    parser.add_argument("--out", default=str(Path(__file__).resolve().parent.parent / "models"))
+    parser.add_argument("--test-size", type=float, default=0.15)
+    parser.add_argument("--reference-year", type=int, default=LEGACY_REFERENCE_YEAR,
+                        help="Year vehicle_age is measured from; pinned in the artifact")
+    parser.add_argument("--n-estimators", type=int, default=DEFAULT_XGB_PARAMS["n_estimators"])
+    parser.add_argument("--learning-rate", type=float, default=DEFAULT_XGB_PARAMS["learning_rate"])
+    parser.add_argument("--max-depth", type=int, default=DEFAULT_XGB_PARAMS["max_depth"])
+    parser.add_argument("--nrows", type=int, default=None, help="Only read the first N rows")
+    parser.add_argument("--variant", choices=["encoded", "native", "quantile"], default="encoded",
+                        help="encoded: one-hot/target encoders; native: XGBoost categorical support; "
+                             "quantile: encoded with a 10/50/90%% quantile band")
+    parser.add_argument("--external-memory", action="store_true",
+                        help="Stream chunks through XGBoost's DataIter instead of loading the CSV")
+    parser.add_argument("--chunksize", type=int, default=200_000)
+    parser.add_argument("--register", nargs="?", default=None, metavar="REGISTRY",
+                        const=str(Path(__file__).resolve().parent.parent / "models" / "registry"),
+                        help="Also publish and activate the artifacts as a new registry version")
+    parser.add_argument("--comparables", nargs="?", default=None, metavar="DIR",
+                        const=str(Path(__file__).resolve().parent.parent / "models" / "comparables"),
+                        help="Also build the comparable-listings index over the training data")
+    parser.add_argument("--drift-profile", action="store_true",
+                        help="Also save the drift reference profile next to the pipeline (see src.drift)")
+    parser.add_argument("--fit-fraction", type=float, default=0.25,
+                        help="Share of training rows used to fit the preprocessor (external memory)")
+    args = parser.parse_args(argv)
+    if args.external_memory and args.variant != "encoded":
+        parser.error("--external-memory only supports the encoded variant")
+
+    xgb_params = {
+        "n_estimators": args.n_estimators,
+        "learning_rate": args.learning_rate,
+        "max_depth": args.max_depth,
+    }
+    timer = StageTimer()
+    if args.external_memory:
+        pipeline, input_columns, metrics = train_external_memory(
+            args.data, args.chunksize, args.test_size, args.fit_fraction,
+            args.reference_year, xgb_params, timer,
+        )
+    else:
+        pipeline, input_columns, metrics = train_in_memory(
+            args.data, args.test_size, args.reference_year, xgb_params, timer, args.nrows, args.variant,
+        )
+
+    print_scorecard(metrics)
+    model_path, cols_path = save_artifacts(pipeline, input_columns, args.out)
+    timer("Saved artifacts")
+
+    print("✅ Deployment Artifacts Saved:")
+    print(f"   1. {model_path}")
+    print(f"   2. {cols_path}")
+    print(json.dumps({"metrics": metrics, "stages": timer.stages}, indent=2, default=float))
+
+    if args.comparables:
+        from src.comparables import build_comparables
+        from src.prediction_cache import artifact_fingerprint
+
+        out_dir = build_comparables(pipeline, input_columns, artifact_fingerprint(model_path),
+                                    read_listings(args.data, nrows=args.nrows), args.comparables)
+        print(f"✅ Comparables index saved to {out_dir}")
+
+    if args.drift_profile:
+        from src.drift import build_profile, profile_path, save_profile
+        from src.prediction_cache import artifact_fingerprint
+
+        listings = read_listings(args.data, nrows=args.nrows)
+        listings = listings.sample(min(len(listings), 100_000), random_state=42)
+        path = save_profile(build_profile(pipeline, input_columns, artifact_fingerprint(model_path), listings),
+                            profile_path(model_path))
+        print(f"✅ Drift profile saved to {path}")
+
+    if args.register:
+        from src.registry import ModelRegistry
+
+        version = ModelRegistry(args.register).publish(args.out, metrics, training_data=args.data)
+        print(f"✅ Published and activated registry version {version}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Prediction intervals from a single multi-quantile booster.
+
+The quantile variant is the encoded pipeline with the regressor switched to
+``objective="reg:quantileerror"`` and ``quantile_alpha=[0.1, 0.5, 0.9]``.
+XGBoost fits one output per quantile inside the same booster, so one
+preprocessing pass and one ``predict`` call return an ``(n, 3)`` array: the
+low end of the band, the median (the point estimate) and the high end.
+
+Train it with ``python -m src.production_train --variant quantile``.
+
+Benchmark against a point-only model on the same split:
+    python -m src.quantile --data vehicle_price_prediction.csv --n-estimators 500
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+QUANTILES = (0.1, 0.5, 0.9)
+QUANTILE_OBJECTIVE = "reg:quantileerror"
+
+
+def quantile_params(quantiles=QUANTILES):
+    return {"objective": QUANTILE_OBJECTIVE, "quantile_alpha": list(quantiles)}
+
+
+def build_quantile_pipeline(columns, reference_year=None, xgb_params=None, quantiles=QUANTILES):
+    from src.features import LEGACY_REFERENCE_YEAR
+    from src.production_train import build_pipeline
+
+    params = {**(xgb_params or {}), **quantile_params(quantiles)}
+    return build_pipeline(columns, reference_year or LEGACY_REFERENCE_YEAR, params)
+
+
+def quantile_levels(pipeline):
+    """The quantiles a pipeline predicts, or ``None`` for a point-only model."""
+    params = pipeline.steps[-1][1].get_params()
+    if params.get("objective") != QUANTILE_OBJECTIVE:
+        return None
+    alpha = params.get("quantile_alpha")
+    return [float(a) for a in np.atleast_1d(alpha)]
+
+
+def split_band(predictions, levels):
+    """
+    ``(point, low, high)`` from raw predictions. Point-only predictions give
+    a zero-width band. Quantile outputs are sorted per row first, so crossed
+    quantiles never produce an inverted band.
+    """
+    predictions = np.asarray(predictions, dtype=np.float64)
+    if predictions.ndim == 1 or levels is None:
+        return predictions, predictions, predictions
+    predictions = np.sort(predictions, axis=1)
+    median = int(np.argmin(np.abs(np.asarray(levels) - 0.5)))
+    return predictions[:, median], predictions[:, 0], predictions[:, -1]
+
+
+def band_metrics(y_true, predictions, levels):
+    """Coverage and width of the outer band plus the median's MAE."""
+    point, low, high = split_band(predictions, levels)
+    y_true = np.asarray(y_true, dtype=np.float64)
+    return {
+        "nominal_coverage": levels[-1] - levels[0],
+        "coverage": float(((y_true >= low) & (y_true <= high)).mean()),
+        "mean_width": float((high - low).mean()),
+        "median_mae": float(np.abs(y_true - point).mean()),
+    }
+
+
+# -----------------------------------------------------------------------------
+# BENCHMARK
+# -----------------------------------------------------------------------------
+def compare(data_path, nrows=None, xgb_params=None, repeats=50):
+    from sklearn.model_selection import train_test_split
+
+    from src.benchmark import p50_ms
+    from src.production_train import build_pipeline, read_listings, split_xy
+
+    X, y = split_xy(read_listings(data_path, nrows=nrows))
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.15, random_state=42)
+
+    results = []
+    for variant, builder in (("point", build_pipeline), ("quantile", build_quantile_pipeline)):
+        pipeline = builder(X_train.columns, xgb_params=xgb_params)
+        t0 = time.perf_counter()
+        pipeline.fit(X_train, y_train)
+        train_seconds = time.perf_counter() - t0
+
+        levels = quantile_levels(pipeline) or [0.5]
+        predictions = pipeline.predict(X_test)
+        batch = X_test.head(1000)
+        (single_ms,) = p50_ms([lambda: pipeline.predict(X_test.head(1))], repeats)
+        (batch_ms,) = p50_ms([lambda: pipeline.predict(batch)], max(3, repeats // 5))
+        (full_ms,) = p50_ms([lambda: pipeline.predict(X_test)], 3)
+        results.append({
+            "variant": variant,
+            "train_seconds": train_seconds,
+            "model_bytes": len(pipeline.steps[-1][1].get_booster().save_raw("ubj")),
+            "single_p50_ms": single_ms,
+            "batch_1k_p50_ms": batch_ms,
+            "full_ms": full_ms,
+            **band_metrics(y_test, predictions, levels),
+        })
+    return results, len(X_test)
+
+
+def main(argv=None):
+    from src.production_train import DEFAULT_XGB_PARAMS
+
+    parser = argparse.ArgumentParser(description="Benchmark quantile intervals against point predictions.")
+    parser.add_argument("--data", required=True, help="Listings CSV with a price column")
+    parser.add_argument("--nrows", type=int, default=None)
+    parser.add_argument("--n-estimators", type=int, default=DEFAULT_XGB_PARAMS["n_estimators"])
+    parser.add_argument("--learning-rate", type=float, default=DEFAULT_XGB_PARAMS["learning_rate"])
+    parser.add_argument("--max-depth", type=int, default=DEFAULT_XGB_PARAMS["max_depth"])
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    xgb_params = {
+        "n_estimators": args.n_estimators,
+        "learning_rate": args.learning_rate,
+        "max_depth": args.max_depth,
+    }
+    results, n_test = compare(args.data, args.nrows, xgb_params, args.repeats)
+
+    print("-" * 92)
+    print(f"{'variant':<9}{'train s':>9}{'model MB':>10}{'1-row ms':>10}{'1k ms':>8}"
+          f"{f'{n_test:,} rows ms':>15}{'median MAE':>12}{'coverage':>10}{'width':>9}")
+    for r in results:
+        band = f"{r['coverage']:>10.1%}{r['mean_width']:>9,.0f}" if r["nominal_coverage"] else f"{'-':>10}{'-':>9}"
+        print(f"{r['variant']:<9}{r['train_seconds']:>9.1f}{r['model_bytes'] / 2**20:>10.2f}"
+              f"{r['single_p50_ms']:>10.2f}{r['batch_1k_p50_ms']:>8.1f}{r['full_ms']:>15.1f}"
+              f"{r['median_mae']:>12,.1f}{band}")
+    print("-" * 92)
+    point, band = results
+    print(f"Band overhead: {band['single_p50_ms'] / point['single_p50_ms'] - 1:+.0%} single row, "
+          f"{band['batch_1k_p50_ms'] / point['batch_1k_p50_ms'] - 1:+.0%} per 1k batch "
+          f"(nominal coverage {band['nominal_coverage']:.0%})")
+
+
+if __name__ == "__main__":
+    main()
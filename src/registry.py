@@ -0,0 +1,398 @@
+"""
+Local model registry with atomic hot-swap of pipeline artifacts.
+
+Every published model is an immutable, checksummed version directory:
+
+    models/registry/
+        CURRENT                         name of the active version
+        history.json                    activation log, newest last
+        versions/v0003/
+            vehicle_price_pipeline.pkl
+            input_columns.pkl
+            drift_profile.json          optional, see src.drift
+            metadata.json               SHA-256 per file, reference year,
+                                        metrics, training data hash
+
+``publish`` copies the artifacts into a staging directory and renames it into
+``versions/`` in one step, and ``activate`` rewrites ``CURRENT`` with
+``os.replace``, so a reader never sees a half-written version or pointer.
+
+``HotSwapModel`` serves the active version and polls ``CURRENT`` on a
+background thread. A new version is checksum-verified, loaded and warmed up
+off the request path, then published by swapping a single reference:
+in-flight requests finish on the model they started with, and no request
+waits on a load. If the new version fails to load, the old one keeps serving.
+
+Only the standard library is imported at module level, like ``src.warm_start``.
+
+Usage:
+    python -m src.registry publish --from models --metrics metrics.json --data vehicle_price_prediction.csv
+    python -m src.registry list
+    python -m src.registry activate v0002
+    python -m src.registry rollback
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from src.warm_start import warm_up
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_REGISTRY_DIR = BASE_DIR / "models" / "registry"
+
+CURRENT_FILENAME = "CURRENT"
+HISTORY_FILENAME = "history.json"
+METADATA_FILENAME = "metadata.json"
+VERSIONS_DIRNAME = "versions"
+DEFAULT_POLL_SECONDS = 5.0
+
+
+def file_sha256(path, chunk_bytes=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_bytes), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_atomically(path, text):
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    with os.fdopen(fd, "w") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# -----------------------------------------------------------------------------
+# REGISTRY
+# -----------------------------------------------------------------------------
+class ModelRegistry:
+    def __init__(self, root=DEFAULT_REGISTRY_DIR):
+        self.root = Path(root)
+        self.versions_dir = self.root / VERSIONS_DIRNAME
+
+    def exists(self):
+        return (self.root / CURRENT_FILENAME).exists()
+
+    def versions(self):
+        """Published version names, oldest first."""
+        if not self.versions_dir.exists():
+            return []
+        return sorted(p.name for p in self.versions_dir.iterdir() if (p / METADATA_FILENAME).exists())
+
+    def current(self):
+        """Name of the active version, or ``None`` before anything was activated."""
+        try:
+            return (self.root / CURRENT_FILENAME).read_text().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def history(self):
+        try:
+            return json.loads((self.root / HISTORY_FILENAME).read_text())
+        except FileNotFoundError:
+            return []
+
+    def path(self, version):
+        return self.versions_dir / version
+
+    def metadata(self, version):
+        with open(self.path(version) / METADATA_FILENAME) as f:
+            return json.load(f)
+
+    def verify(self, version):
+        """Raise ``ValueError`` if any artifact of ``version`` does not match its recorded checksum."""
+        meta = self.metadata(version)
+        for name, expected in meta["files"].items():
+            if file_sha256(self.path(version) / name) != expected:
+                raise ValueError(f"Checksum mismatch for {version}/{name}; the artifact is corrupt")
+        return meta
+
+    def publish(self, source_dir, metrics=None, training_data=None, notes=None, activate=True):
+        """
+        Copy the pipeline, column list and drift profile (when there is one)
+        from ``source_dir`` into a new version and return its name. ``training_data`` (a CSV path or feature
+        cache directory) is hashed into the metadata so a model can be traced
+        back to its data; a cache records the hash of the CSV it came from.
+        """
+        import joblib
+
+        from src.assets import COLUMNS_FILENAME, MODEL_FILENAME
+        from src.drift import PROFILE_FILENAME
+        from src.feature_cache import source_sha256
+        from src.features import pipeline_reference_year
+
+        source_dir = Path(source_dir)
+        self.versions_dir.mkdir(parents=True, exist_ok=True)
+        existing = self.versions()
+        version = f"v{int(existing[-1][1:]) + 1 if existing else 1:04d}"
+
+        staging = Path(tempfile.mkdtemp(dir=self.versions_dir, prefix=f".{version}."))
+        try:
+            files = {}
+            for name in (MODEL_FILENAME, COLUMNS_FILENAME, PROFILE_FILENAME):
+                if name == PROFILE_FILENAME and not (source_dir / name).exists():
+                    continue
+                shutil.copy2(source_dir / name, staging / name)
+                files[name] = file_sha256(staging / name)
+            meta = {
+                "version": version,
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "source": str(source_dir.resolve()),
+                "files": files,
+                "reference_year": pipeline_reference_year(joblib.load(staging / MODEL_FILENAME)),
+                "metrics": metrics or {},
+                "training_data": None,
+                "notes": notes,
+            }
+            if training_data is not None:
+                meta["training_data"] = {"path": str(training_data), "sha256": source_sha256(training_data)}
+            with open(staging / METADATA_FILENAME, "w") as f:
+                json.dump(meta, f, indent=2, default=float)
+            # A rename within one filesystem is atomic: the version appears complete or not at all
+            os.rename(staging, self.path(version))
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        if activate:
+            self.activate(version)
+        return version
+
+    def activate(self, version):
+        """Verify ``version`` and point ``CURRENT`` at it."""
+        return self._activate(version)
+
+    def rollback(self):
+        """Re-activate the version that was active before the current one.
+
+        Each rollback walks one activation further back, so repeated rollbacks never
+        bounce between the same two versions.
+        """
+        stack = self.activations()
+        if len(stack) < 2:
+            raise ValueError("Nothing to roll back to")
+        return self._activate(stack[-2], rolled_back_from=stack[-1])
+
+    def activations(self):
+        """Versions activated and not rolled back past, oldest first; the last one is current."""
+        stack = []
+        for entry in self.history():
+            if "rolled_back_from" in entry:
+                stack.pop()
+            elif not stack or stack[-1] != entry["version"]:
+                stack.append(entry["version"])
+        return stack
+
+    def _activate(self, version, **details):
+        if version not in self.versions():
+            raise ValueError(f"Unknown version {version!r}; published: {', '.join(self.versions()) or 'none'}")
+        self.verify(version)
+        entry = {"version": version, "activated_at": time.strftime("%Y-%m-%dT%H:%M:%S"), **details}
+        _write_atomically(self.root / HISTORY_FILENAME, json.dumps(self.history() + [entry], indent=2))
+        _write_atomically(self.root / CURRENT_FILENAME, version + "\n")
+        return version
+
+    def load(self, version=None):
+        """``(pipeline, model_columns, fingerprint, metadata)`` for ``version`` (default: current)."""
+        import joblib
+
+        from src.assets import COLUMNS_FILENAME, MODEL_FILENAME
+
+        version = version or self.current()
+        if version is None:
+            raise FileNotFoundError(f"No active version in {self.root}")
+        meta = self.verify(version)
+        pipeline = joblib.load(self.path(version) / MODEL_FILENAME)
+        columns = joblib.load(self.path(version) / COLUMNS_FILENAME)
+        # Same value as artifact_fingerprint() on the pipeline file, so caches and indexes keyed on it carry over
+        return pipeline, columns, meta["files"][MODEL_FILENAME], meta
+
+
+# -----------------------------------------------------------------------------
+# HOT SWAP
+# -----------------------------------------------------------------------------
+class HotSwapModel:
+    """
+    The registry's active model, reloaded in the background whenever
+    ``CURRENT`` changes.
+
+    Exposes the same ``start()`` / ``ready`` / ``result()`` / ``timings``
+    interface as :class:`src.warm_start.ModelLoader`; ``result()`` returns
+    the ``(pipeline, model_columns, fingerprint)`` of whichever version is
+    live at the time of the call. ``predict`` goes through ``cache`` (a
+    :class:`src.prediction_cache.PredictionCache`) when one is given; its
+    entries are invalidated by the fingerprint change on a swap. With an
+    enabled ``instrumentation`` (:mod:`src.instrumentation`), ``predict``
+    reports per-step timings.
+    """
+
+    def __init__(self, registry, poll_seconds=DEFAULT_POLL_SECONDS, warm_up=True, cache=None,
+                 instrumentation=None, verbose=True):
+        self.registry = registry
+        self.cache = cache
+        self.instrumentation = instrumentation
+        self.poll_seconds = poll_seconds
+        self.warm_up = warm_up
+        self.verbose = verbose
+        self.timings = {}
+        self.error = None
+        self.swaps = 0
+        self.failed_versions = set()
+        # (version, pipeline, model_columns, fingerprint, timed pipeline), replaced as a whole
+        self._live = None
+        self._done = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="model-hot-swap", daemon=True)
+
+    def start(self):
+        self._started_at = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    @property
+    def ready(self):
+        return self._done.is_set()
+
+    @property
+    def version(self):
+        live = self._live
+        return live[0] if live else None
+
+    def result(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise TimeoutError("Model is still loading")
+        live = self._live
+        if live is None:
+            raise self.error
+        return live[1:4]
+
+    def predict(self, frame):
+        return self.predict_live(frame)[0]
+
+    def predict_live(self, frame):
+        """``(predictions, (pipeline, model_columns, fingerprint, version))`` of the model that scored ``frame``."""
+        from src.features import build_model_input
+
+        # One snapshot per call, so a swap mid-batch cannot mix two models
+        version, pipeline, columns, fingerprint, timed = self._live
+        snapshot = (pipeline, columns, fingerprint, version)
+        features = build_model_input(frame, timed, columns)
+        if self.cache is not None:
+            return self.cache.predict(timed, features, fingerprint), snapshot
+        return timed.predict(features), snapshot
+
+    def stats(self):
+        return {"version": self.version, "swaps": self.swaps, "failed_versions": sorted(self.failed_versions)}
+
+    def _load(self, version):
+        t0 = time.perf_counter()
+        pipeline, columns, fingerprint, _ = self.registry.load(version)
+        t1 = time.perf_counter()
+        if self.warm_up:
+            warm_up(pipeline, columns)
+        self.timings.update(load_s=t1 - t0, warmup_s=time.perf_counter() - t1)
+        timed = pipeline
+        if self.instrumentation is not None:
+            from src.instrumentation import instrument_pipeline
+
+            timed = instrument_pipeline(pipeline, self.instrumentation)
+        return version, pipeline, columns, fingerprint, timed
+
+    def _run(self):
+        while True:
+            version = self.registry.current()
+            if version is not None and version != self.version and version not in self.failed_versions:
+                try:
+                    live = self._load(version)
+                except Exception as e:
+                    self.error = e
+                    self.failed_versions.add(version)
+                    if self.verbose:
+                        print(f"⚠️ Could not load model {version}, still serving {self.version}: {e}")
+                else:
+                    if self._live is not None:
+                        self.swaps += 1
+                        if self.verbose:
+                            print(f"✅ Swapped model {self._live[0]} -> {version}")
+                    self._live = live
+            elif version is None and not self._done.is_set():
+                self.error = FileNotFoundError(f"No active version in {self.registry.root}")
+
+            if not self._done.is_set() and (self._live is not None or self.error is not None):
+                self.timings.setdefault("import_s", 0.0)
+                self.timings["ready_s"] = time.perf_counter() - self._started_at
+                self._done.set()
+            if self._stop.wait(self.poll_seconds):
+                return
+
+
+# -----------------------------------------------------------------------------
+# CLI
+# -----------------------------------------------------------------------------
+def print_versions(registry):
+    current = registry.current()
+    print("-" * 78)
+    print(f"  {'version':<9}{'created':<21}{'ref year':>9}{'MAE':>12}  training data")
+    for version in registry.versions():
+        meta = registry.metadata(version)
+        mae = meta["metrics"].get("mae")
+        data = meta["training_data"]["sha256"][:12] if meta["training_data"] else "-"
+        marker = "*" if version == current else " "
+        print(f"{marker} {version:<9}{meta['created_at']:<21}{meta['reference_year']:>9}"
+              f"{f'${mae:,.2f}' if mae is not None else '-':>12}  {data}")
+    print("-" * 78)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Publish, list, activate and roll back model versions.")
+    parser.add_argument("command", choices=["publish", "list", "activate", "rollback", "verify"])
+    parser.add_argument("version", nargs="?", help="Version for activate/verify (verify defaults to current)")
+    parser.add_argument("--registry", default=str(DEFAULT_REGISTRY_DIR))
+    parser.add_argument("--from", dest="source", default=str(BASE_DIR / "models"),
+                        help="Directory holding the pipeline and input_columns to publish")
+    parser.add_argument("--metrics", default=None,
+                        help="JSON file with evaluation metrics (production_train's output works)")
+    parser.add_argument("--data", default=None, help="Training CSV, hashed into the metadata")
+    parser.add_argument("--notes", default=None)
+    parser.add_argument("--no-activate", action="store_true", help="Publish without switching traffic")
+    args = parser.parse_args(argv)
+
+    registry = ModelRegistry(args.registry)
+    if args.command == "publish":
+        metrics = None
+        if args.metrics:
+            with open(args.metrics) as f:
+                metrics = json.load(f)
+            metrics = metrics.get("metrics", metrics)
+        version = registry.publish(args.source, metrics, args.data, args.notes, activate=not args.no_activate)
+        print(f"✅ Published {version}{' (active)' if not args.no_activate else ''}")
+    elif args.command == "activate":
+        if not args.version:
+            parser.error("activate needs a version")
+        print(f"✅ Active version: {registry.activate(args.version)}")
+    elif args.command == "rollback":
+        print(f"✅ Rolled back to {registry.rollback()}")
+    elif args.command == "verify":
+        version = args.version or registry.current()
+        registry.verify(version)
+        print(f"✅ {version}: all checksums match")
+        return
+    print_versions(registry)
+
+
+if __name__ == "__main__":
+    main()
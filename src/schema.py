@@ -0,0 +1,286 @@
+"""
+Input schema validation and coercion, compiled once per model version.
+
+``InputSchema.from_pipeline`` reads the raw columns a model needs from
+``input_columns.pkl`` (``vehicle_age``/``mileage_per_year`` are replaced by
+``year``) and the category vocabularies of the fitted encoders. ``validate``
+then checks a whole batch column by column:
+
+* numeric columns are coerced with ``pd.to_numeric`` (thousands separators
+  allowed) and checked against ``NUMERIC_BOUNDS``;
+* categorical columns are matched to the vocabulary, case- and
+  whitespace-insensitively, so ``" toyota"`` becomes ``"Toyota"``;
+* every column is only inspected through its distinct values
+  (``pd.factorize``), so the cost grows with cardinality, not rows.
+
+Problems come back as one structured record per row and column (``row``,
+``column``, ``code``, ``severity``, ``message``, ``value``) instead of a single
+opaque exception. Errors make a row invalid; warnings (unknown categories,
+missing categoricals the encoders impute) do not.
+
+Benchmark validation against predict on a listings file:
+    python -m src.schema --data vehicle_price_prediction.csv --nrows 100000
+"""
+
+import argparse
+import threading
+import time
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from src.features import DERIVED_COLS, pipeline_reference_year
+from src.production_train import HIGH_CARD_COLS, LOW_CARD_COLS, ORDINAL_COLS, TARGET_COL
+
+CATEGORICAL_COLS = HIGH_CARD_COLS + LOW_CARD_COLS + ORDINAL_COLS
+
+# Plausible domains; values outside them are data-entry errors, not rare cars
+NUMERIC_BOUNDS = {
+    "year": (1900, None),  # upper bound: the model's reference year + 1
+    "mileage": (0, 2_000_000),
+    "engine_hp": (1, 2_000),
+    "owner_count": (0, 50),
+    "brand_popularity": (0.0, 1.0),
+}
+INTEGER_COLS = ["year", "mileage", "engine_hp"]
+
+# accident_history is imputed to "None" by the feature step, so a gap is not a problem
+IMPUTED_BY_FEATURES = {"accident_history"}
+
+ISSUE_COLUMNS = ["row", "column", "code", "severity", "message", "value"]
+
+
+def pipeline_vocabulary(pipeline):
+    """Category vocabularies learned by the fitted encoders, keyed by column."""
+    vocabulary = {}
+    steps = getattr(pipeline, "named_steps", {})
+    if "preprocessor" in steps:
+        for name, branch, columns in steps["preprocessor"].transformers_:
+            encoder = getattr(branch, "steps", [(None, branch)])[-1][1]
+            if hasattr(encoder, "categories_"):
+                for column, categories in zip(columns, encoder.categories_):
+                    vocabulary[column] = [str(c) for c in categories if str(c) not in ("Missing", "Unknown")]
+    elif "categorical" in steps:
+        vocabulary.update(steps["categorical"].categories_)
+    return vocabulary
+
+
+# -----------------------------------------------------------------------------
+# VALIDATION
+# -----------------------------------------------------------------------------
+class ValidationResult:
+    """Coerced frame, per-row issues and the mask of rows that are safe to score."""
+
+    def __init__(self, frame, issues, valid):
+        self.frame = frame
+        self.issues = issues
+        self.valid = valid
+
+    @property
+    def errors(self):
+        return self.issues[self.issues["severity"] == "error"]
+
+    @property
+    def warnings(self):
+        return self.issues[self.issues["severity"] == "warning"]
+
+    def row_issues(self):
+        """``{row: [{"column", "code", "severity", "message", "value"}, ...]}`` for rows with issues."""
+        grouped = {}
+        for record in self.issues.to_dict("records"):
+            value = record["value"]
+            record["value"] = None if pd.isna(value) else value.item() if hasattr(value, "item") else value
+            grouped.setdefault(int(record.pop("row")), []).append(record)
+        return grouped
+
+    def summary(self):
+        """Issue counts by ``(severity, code)``."""
+        return self.issues.groupby(["severity", "code"]).size().to_dict()
+
+
+class InputSchema:
+    def __init__(self, numeric, categorical, vocabulary=None, bounds=None):
+        self.numeric = list(numeric)
+        self.categorical = list(categorical)
+        self.vocabulary = {column: list(values) for column, values in (vocabulary or {}).items()}
+        self.bounds = dict(bounds or {})
+        self._exact = {column: set(values) for column, values in self.vocabulary.items()}
+        self._canonical = {
+            column: {str(value).strip().lower(): value for value in values}
+            for column, values in self.vocabulary.items()
+        }
+
+    @classmethod
+    def from_pipeline(cls, pipeline, model_columns):
+        raw = [c for c in model_columns if c not in DERIVED_COLS]
+        if any(c in model_columns for c in DERIVED_COLS) and "year" not in raw:
+            raw.append("year")
+        categorical = [c for c in raw if c in CATEGORICAL_COLS]
+        numeric = [c for c in raw if c not in CATEGORICAL_COLS]
+
+        bounds = {c: NUMERIC_BOUNDS[c] for c in numeric if c in NUMERIC_BOUNDS}
+        if "year" in bounds:
+            bounds["year"] = (bounds["year"][0], pipeline_reference_year(pipeline) + 1)
+        return cls(numeric, categorical, pipeline_vocabulary(pipeline), bounds)
+
+    @property
+    def columns(self):
+        return self.numeric + self.categorical
+
+    def validate(self, frame):
+        n = len(frame)
+        out = {}
+        found = []
+
+        def flag(mask, column, code, severity, message, values=None):
+            rows = np.flatnonzero(mask)
+            if len(rows):
+                found.append((rows, column, code, severity, message,
+                              values(rows) if values is not None else np.full(len(rows), None, dtype=object)))
+
+        for column in self.columns:
+            if column not in frame.columns:
+                flag(np.ones(n, dtype=bool), column, "missing_column", "error", f"'{column}' is required")
+                continue
+            if column in self.numeric:
+                out[column] = self._coerce_numeric(column, frame[column], flag)
+            else:
+                # object, not inferred str: no per-row string conversion when the frame is built
+                out[column] = pd.Series(self._coerce_categorical(column, frame[column], flag),
+                                        index=frame.index, dtype=object)
+
+        valid = np.ones(n, dtype=bool)
+        if not found:
+            return ValidationResult(pd.DataFrame(out, index=frame.index), pd.DataFrame(columns=ISSUE_COLUMNS), valid)
+
+        counts = [len(f[0]) for f in found]
+        rows = np.concatenate([f[0] for f in found])
+        order = np.argsort(rows, kind="stable")
+        columns = {name: np.repeat(np.array([f[i] for f in found], dtype=object), counts)[order]
+                   for i, name in enumerate(ISSUE_COLUMNS[1:5], start=1)}
+        value = np.concatenate([np.asarray(f[5], dtype=object) for f in found])[order]
+        issues = pd.DataFrame({"row": rows[order], **columns, "value": value})
+        valid[rows[np.array([f[3] == "error" for f in found]).repeat(counts)]] = False
+        return ValidationResult(pd.DataFrame(out, index=frame.index), issues, valid)
+
+    def _coerce_numeric(self, column, series, flag):
+        if series.dtype.kind in "biuf":
+            values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        else:
+            # Parse each distinct string once
+            codes, uniques = pd.factorize(series)
+            cleaned = pd.Series(np.asarray(uniques, dtype=object)).astype(str).str.replace(",", "", regex=False)
+            parsed = pd.to_numeric(cleaned.str.strip(), errors="coerce").to_numpy(dtype=np.float64)
+            values = np.where(codes < 0, np.nan, parsed[codes] if len(parsed) else np.nan)
+
+        def raw(rows):
+            return series.iloc[rows].to_numpy(dtype=object)
+
+        missing = series.isna().to_numpy()
+        flag(missing, column, "missing_value", "error", f"'{column}' is empty")
+        flag(~missing & np.isnan(values), column, "not_numeric", "error", f"'{column}' must be a number", raw)
+
+        low, high = self.bounds.get(column, (None, None))
+        with np.errstate(invalid="ignore"):
+            out_of_range = np.zeros(len(values), dtype=bool)
+            if low is not None:
+                out_of_range |= values < low
+            if high is not None:
+                out_of_range |= values > high
+        flag(out_of_range, column, "out_of_range", "error",
+             f"'{column}' must be between {low if low is not None else '-inf'} and "
+             f"{high if high is not None else 'inf'}", raw)
+
+        if column in INTEGER_COLS and not np.isnan(values).any() and (values == np.round(values)).all():
+            return values.astype(np.int64)
+        return values
+
+    def _coerce_categorical(self, column, series, flag):
+        codes, uniques = pd.factorize(series.to_numpy(dtype=object))
+        exact = self._exact.get(column)
+        if exact:
+            canonical = self._canonical[column]
+            resolved = np.array([
+                v if v in exact else canonical.get(str(v).strip().lower(), v) for v in uniques
+            ] + [None], dtype=object)
+            known = np.array([v in exact for v in resolved[:-1]] + [True], dtype=bool)
+        else:
+            resolved = np.array([str(v).strip() for v in uniques] + [None], dtype=object)
+            known = np.ones(len(resolved), dtype=bool)
+        # code -1 (missing) picks the trailing None / True
+        values = resolved[codes]
+
+        missing = codes < 0
+        if column not in IMPUTED_BY_FEATURES:
+            flag(missing, column, "missing_value", "warning", f"'{column}' is empty; it will be imputed")
+        flag(~known[codes], column, "unknown_category", "warning",
+             f"'{column}' value was not seen in training; it is scored as an unknown category",
+             lambda rows: values[rows])
+        return values
+
+
+# pipeline -> {model_columns: InputSchema}. Weak keys, so a pipeline retired by a
+# hot swap is freed with its schemas instead of being pinned by this cache.
+_compiled = weakref.WeakKeyDictionary()
+_compiled_lock = threading.Lock()
+
+
+def schema_for(pipeline, model_columns):
+    """The compiled schema of a loaded pipeline, built once per pipeline object."""
+    model_columns = tuple(model_columns)
+    with _compiled_lock:
+        schema = _compiled.get(pipeline, {}).get(model_columns)
+    if schema is None:
+        schema = InputSchema.from_pipeline(pipeline, list(model_columns))
+        with _compiled_lock:
+            _compiled.setdefault(pipeline, {})[model_columns] = schema
+    return schema
+
+
+# -----------------------------------------------------------------------------
+# BENCHMARK
+# -----------------------------------------------------------------------------
+def main(argv=None):
+    from src.assets import load_assets
+    from src.features import build_model_input
+
+    parser = argparse.ArgumentParser(description="Validate a listings file and compare the cost with predict.")
+    parser.add_argument("--data", required=True, help="Listings CSV (a price column is ignored)")
+    parser.add_argument("--nrows", type=int, default=None)
+    parser.add_argument("--models-dir", default=None,
+                        help="Directory containing models/ (defaults to the repo root)")
+    parser.add_argument("--show", type=int, default=5, help="Print the issues of this many rows")
+    args = parser.parse_args(argv)
+
+    pipeline, model_columns = load_assets(args.models_dir)
+    listings = pd.read_csv(args.data, nrows=args.nrows).drop(columns=[TARGET_COL], errors="ignore")
+
+    t0 = time.perf_counter()
+    schema = InputSchema.from_pipeline(pipeline, model_columns)
+    compile_ms = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    result = schema.validate(listings)
+    validate_ms = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    pipeline.predict(build_model_input(result.frame[result.valid], pipeline, model_columns))
+    predict_ms = (time.perf_counter() - t0) * 1000
+
+    for row, row_issues in list(result.row_issues().items())[:args.show]:
+        print(f"row {row}:")
+        for issue in row_issues:
+            print(f"  {issue['severity']:<8}{issue['code']:<18}{issue['message']} (got {issue['value']!r})")
+    print("-" * 30)
+    print(f"Rows:            {len(listings):,} ({result.valid.mean():.1%} valid)")
+    for (severity, code), count in sorted(result.summary().items()):
+        print(f"  {severity:<8}{code:<18}{count:>8,}")
+    print(f"Compile:         {compile_ms:,.1f} ms")
+    print(f"Validate:        {validate_ms:,.1f} ms ({validate_ms / predict_ms:.1%} of predict)")
+    print(f"Predict:         {predict_ms:,.1f} ms")
+    print("-" * 30)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,454 @@
+"""
+Headless HTTP scoring service.
+
+Loads the model assets once at startup and exposes JSON endpoints:
+
+    GET  /health          -> {"status": "ok", "batches": ..., "rows": ...}
+    GET  /metrics         -> per-stage timings in Prometheus text format (--instrument)
+    GET  /drift           -> per-feature drift scores against the reference profile (--drift)
+    POST /predict         {"make": "Toyota", ...}          -> {"price": 18250.4}
+    POST /predict/batch   {"rows": [{...}, {...}]}          -> {"prices": [...]}
+
+A quantile model (``--variant quantile``) answers with its median as
+``price``/``prices`` and adds the outer band as ``price_low`` and
+``price_high`` (see ``src.quantile``).
+
+Rows are validated and coerced against the model's input schema first (see
+``src.schema``). A listing with errors gets a 422 from ``/predict``; in a
+batch its price is ``null``. Either way the response carries an ``issues``
+object mapping row numbers to ``{"column", "code", "severity", "message",
+"value"}`` records.
+
+``--instrument`` (or ``VEHICLE_PRICE_INSTRUMENT=1``) times request parsing,
+validation, queueing and every pipeline step (see ``src.instrumentation``).
+``--metrics-log`` appends one JSON line per request and per batch, and a
+``?profile=1`` request is scored on its own under cProfile, returning the
+hottest functions.
+
+Concurrent requests are coalesced by ``MicroBatcher`` into a single
+vectorized ``pipeline.predict`` call once ``--max-batch`` rows are queued or
+``--max-wait-ms`` has elapsed since the first queued request.
+
+``--drift`` feeds every scored row to a ``DriftMonitor`` (see ``src.drift``)
+that compares live inputs and predictions with the model's
+``drift_profile.json``; the scores are served on ``/drift`` and appended to
+``/metrics``.
+
+``--shadow-log`` appends every scored row, after reindexing to the model's
+columns, to Arrow segments under ``data/shadow/`` for offline replay against
+a candidate model (see ``src.shadow``).
+
+With ``--registry`` the service follows the registry's active version and
+hot-swaps to a newly activated one without a restart (see ``src.registry``).
+
+Usage:
+    python -m src.server --port 8000 --max-wait-ms 5
+    python -m src.server --registry models/registry
+    python -m src.server --instrument --metrics-log requests.jsonl
+    python -m src.server --drift
+    python -m src.server --shadow-log --shadow-sample 0.1
+"""
+
+import argparse
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from src.assets import find_assets, load_assets
+from src.drift import DEFAULT_HALF_LIFE_ROWS, PROFILE_FILENAME, DriftMonitor, load_profile, profile_path
+from src.features import build_model_input
+from src.instrumentation import Instrumentation, ProfileCapture, instrument_pipeline
+from src.prediction_cache import CachedPredictor, PredictionCache, artifact_fingerprint
+from src.quantile import quantile_levels, split_band
+from src.registry import DEFAULT_POLL_SECONDS, HotSwapModel, ModelRegistry
+from src.schema import schema_for
+from src.shadow import DEFAULT_SHADOW_DIR, ShadowLog
+from src.valuation_index import IndexedPredictor
+
+DEFAULT_MAX_BATCH = 1024
+DEFAULT_MAX_WAIT_MS = 5.0
+REQUEST_TIMEOUT_SECONDS = 30
+
+
+def price_fields(prices, levels):
+    """
+    Response fields for raw predictions: ``price``, plus ``price_low`` and
+    ``price_high`` for a quantile model, whose ``price`` is the median.
+    """
+    point, low, high = split_band(prices, levels)
+    fields = {"price": point.tolist()}
+    if levels:
+        fields.update(price_low=low.tolist(), price_high=high.tolist())
+    return fields
+
+
+# -----------------------------------------------------------------------------
+# MICRO-BATCHING
+# -----------------------------------------------------------------------------
+class MicroBatcher:
+    """
+    Coalesce DataFrames submitted from many threads into one ``predict_fn``
+    call. ``predict_fn`` returns ``(predictions, model)``, where ``model`` is
+    the ``(pipeline, model_columns, fingerprint, version)`` that scored the
+    batch; ``submit`` returns a Future resolving to that frame's predictions
+    and ``model``.
+    """
+
+    _STOP = object()
+
+    def __init__(self, predict_fn, max_batch_rows=DEFAULT_MAX_BATCH, max_wait_ms=DEFAULT_MAX_WAIT_MS,
+                 instrumentation=None):
+        self.predict_fn = predict_fn
+        self.instrumentation = instrumentation or Instrumentation(enabled=False)
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000.0
+        self.batches = 0
+        self.rows = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, frame):
+        future = Future()
+        self._queue.put((frame, future))
+        return future
+
+    def close(self):
+        self._queue.put(self._STOP)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                return
+            pending = [item]
+            rows = len(item[0])
+            deadline = time.monotonic() + self.max_wait
+
+            stop = False
+            while rows < self.max_batch_rows:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stop = True
+                    break
+                pending.append(item)
+                rows += len(item[0])
+
+            self._flush(pending)
+            if stop:
+                return
+
+    def _flush(self, pending):
+        frames = [frame for frame, _ in pending]
+        instrumentation = self.instrumentation
+        instrumentation.begin("batch", requests=len(pending))
+        try:
+            with instrumentation.stage("batch.concat", sum(len(f) for f in frames)):
+                batch = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+            with instrumentation.stage("batch.predict", len(batch)):
+                prices, model = self.predict_fn(batch)
+                prices = np.asarray(prices, dtype=np.float64)
+        except Exception as e:
+            instrumentation.end(error=str(e))
+            for _, future in pending:
+                future.set_exception(e)
+            return
+        instrumentation.end(rows=len(batch))
+
+        self.batches += 1
+        self.rows += len(batch)
+        offset = 0
+        for frame, future in pending:
+            future.set_result((prices[offset:offset + len(frame)], model))
+            offset += len(frame)
+
+
+def make_predict_fn(pipeline, model_columns):
+    def predict(frame):
+        return pipeline.predict(build_model_input(frame, pipeline, model_columns))
+
+    return predict
+
+
+def with_model(predict, model):
+    """A ``MicroBatcher`` predict_fn pairing ``predict``'s output with the fixed ``model`` behind it."""
+    def predict_fn(frame):
+        return predict(frame), model
+
+    return predict_fn
+
+
+# -----------------------------------------------------------------------------
+# HTTP
+# -----------------------------------------------------------------------------
+class ScoringHandler(BaseHTTPRequestHandler):
+    server_version = "VehiclePriceScoring/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"null")
+
+    def _send_text(self, status, text):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        drift = self.server.drift
+        if self.path == "/metrics" and (self.server.instrumentation.enabled or drift is not None):
+            text = self.server.instrumentation.prometheus() if self.server.instrumentation.enabled else ""
+            self._send_text(200, text + (drift.prometheus() if drift is not None else ""))
+            return
+        if self.path == "/drift" and drift is not None:
+            self._send_json(200, drift.scores())
+            return
+        if self.path != "/health":
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+        batcher = self.server.batcher
+        health = {"status": "ok", "batches": batcher.batches, "rows": batcher.rows}
+        if self.server.cache is not None:
+            health["cache"] = self.server.cache.stats()
+        if self.server.index is not None:
+            health["valuation_index"] = self.server.index.stats()
+        if self.server.model is not None:
+            health["model"] = self.server.model.stats()
+        if self.server.shadow is not None:
+            health["shadow_log"] = self.server.shadow.stats()
+        self._send_json(200, health)
+
+    def do_POST(self):
+        instrumentation = self.server.instrumentation
+        path, _, query = self.path.partition("?")
+        profile = instrumentation.enabled and "profile=1" in query.split("&")
+        instrumentation.begin("request", path=path)
+        capture = ProfileCapture().start() if profile else None
+        try:
+            self._handle_post(path, capture)
+        finally:
+            if capture is not None:
+                capture.stop()
+            instrumentation.end()
+
+    def _handle_post(self, path, capture):
+        instrumentation = self.server.instrumentation
+        try:
+            with instrumentation.stage("request.read"):
+                payload = self._read_json()
+        except (ValueError, UnicodeDecodeError) as e:
+            self._send_json(400, {"error": f"Invalid JSON: {e}"})
+            return
+
+        if path == "/predict":
+            if not isinstance(payload, dict):
+                self._send_json(400, {"error": "Expected a JSON object describing one vehicle"})
+                return
+            records = [payload]
+        elif path == "/predict/batch":
+            records = payload.get("rows") if isinstance(payload, dict) else payload
+            if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+                self._send_json(400, {"error": "Expected {\"rows\": [{...}, ...]}"})
+                return
+            if not records:
+                self._send_json(200, {"prices": []})
+                return
+        else:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+
+        try:
+            with instrumentation.stage("request.frame", len(records)):
+                frame = pd.DataFrame.from_records(records)
+            with instrumentation.stage("request.validate", len(records)):
+                checked = schema_for(*self.server.assets()[:2]).validate(frame)
+        except Exception as e:
+            self._send_json(500, {"error": f"Validation Error: {e}"})
+            return
+        response = {"issues": checked.row_issues()} if len(checked.issues) else {}
+        if path == "/predict" and not checked.valid[0]:
+            self._send_json(422, {"error": "Invalid listing", **response})
+            return
+
+        try:
+            prices = model = None
+            if checked.valid.any():
+                frame = checked.frame if checked.valid.all() else checked.frame[checked.valid]
+                if capture is not None:
+                    # Scored on this thread, outside the batcher, so the profile covers the whole request
+                    prices, model = self.server.batcher.predict_fn(frame)
+                    prices = np.asarray(prices, dtype=np.float64)
+                else:
+                    with instrumentation.stage("request.wait", len(frame)):
+                        prices, model = self.server.batcher.submit(frame).result(timeout=REQUEST_TIMEOUT_SECONDS)
+        except Exception as e:
+            self._send_json(500, {"error": f"Prediction Error: {e}"})
+            return
+        # Attributed to the model that scored the rows, even if a hot-swap has happened since
+        if model is not None and self.server.drift is not None:
+            self.server.drift.observe(frame, prices, key=model[3])
+        if model is not None and self.server.shadow is not None:
+            self.server.shadow.log(frame, prices, *model[:3])
+
+        if capture is not None:
+            capture.stop()
+            response["profile"] = {"peak_traced_kb": capture.peak_kb, "top": capture.top(20)}
+
+        pipeline = model[0] if model is not None else self.server.assets()[0]
+        fields = price_fields(prices if prices is not None else np.empty(0), quantile_levels(pipeline))
+        if path == "/predict":
+            self._send_json(200, {**{name: values[0] for name, values in fields.items()}, **response})
+            return
+        body = {}
+        for name, values in fields.items():
+            rows = iter(values)
+            body["prices" if name == "price" else name] = [next(rows) if ok else None for ok in checked.valid]
+        self._send_json(200, {**body, **response})
+
+
+class ScoringServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, batcher, assets, cache=None, index=None, model=None, instrumentation=None,
+                 drift=None, shadow=None, verbose=False):
+        super().__init__(address, ScoringHandler)
+        self.batcher = batcher
+        self.assets = assets
+        self.instrumentation = instrumentation or Instrumentation(enabled=False)
+        self.cache = cache
+        self.index = index
+        self.model = model
+        self.drift = drift
+        self.shadow = shadow
+        self.verbose = verbose
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve vehicle price predictions over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH,
+                        help="Rows that trigger an immediate flush")
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS,
+                        help="Latency window for coalescing concurrent requests")
+    parser.add_argument("--models-dir", default=None,
+                        help="Directory containing models/ (defaults to the repo root)")
+    parser.add_argument("--cache-size", type=int, default=0,
+                        help="Entries in the prediction cache (0 disables it)")
+    parser.add_argument("--cache-ttl", type=float, default=3600.0, help="Cache entry TTL in seconds")
+    parser.add_argument("--valuation-index", default=None,
+                        help="Precomputed valuation index directory (see src.valuation_index)")
+    parser.add_argument("--registry", default=None,
+                        help="Serve the active version of this model registry and hot-swap on changes")
+    parser.add_argument("--poll-seconds", type=float, default=DEFAULT_POLL_SECONDS,
+                        help="How often to check the registry for a new active version")
+    parser.add_argument("--instrument", action="store_true", default=None,
+                        help="Time every request stage and pipeline step; serve them on /metrics")
+    parser.add_argument("--metrics-log", default=None, help="Append one JSON line per request and batch")
+    parser.add_argument("--drift", action="store_true",
+                        help="Monitor input and prediction drift against the model's drift_profile.json")
+    parser.add_argument("--drift-half-life", type=int, default=DEFAULT_HALF_LIFE_ROWS,
+                        help="Rows after which the drift sketches' counts are halved (0 never decays)")
+    parser.add_argument("--shadow-log", nargs="?", default=None, metavar="DIR", const=str(DEFAULT_SHADOW_DIR),
+                        help="Append scored rows to a shadow log for offline replay (see src.shadow)")
+    parser.add_argument("--shadow-sample", type=float, default=1.0, help="Share of scored rows to log")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args(argv)
+    instrumentation = Instrumentation(enabled=args.instrument, log_path=args.metrics_log)
+    if args.registry and args.valuation_index:
+        parser.error("--valuation-index is tied to one model artifact and cannot follow registry swaps")
+
+    cache = None
+    if args.cache_size > 0:
+        cache = PredictionCache(maxsize=args.cache_size, ttl=args.cache_ttl)
+    model = None
+    if args.registry:
+        model = HotSwapModel(ModelRegistry(args.registry), args.poll_seconds, cache=cache,
+                             instrumentation=instrumentation).start()
+        model.result()
+        predict_fn = model.predict_live
+
+        def assets():
+            return model.result()
+    else:
+        pipeline, model_columns = load_assets(args.models_dir)
+        fingerprint = artifact_fingerprint(find_assets(args.models_dir)[0])
+
+        def assets():
+            return pipeline, model_columns, fingerprint
+
+        timed = instrument_pipeline(pipeline, instrumentation)
+        if cache is not None:
+            predict = CachedPredictor(timed, model_columns, fingerprint, cache).predict
+        else:
+            predict = make_predict_fn(timed, model_columns)
+    index = None
+    if args.valuation_index:
+        # Index hits skip the model entirely; misses go through the cache/pipeline path
+        index = IndexedPredictor(pipeline, model_columns, fingerprint, args.valuation_index, fallback=predict)
+        predict = index.predict
+    if model is None:
+        predict_fn = with_model(predict, (pipeline, model_columns, fingerprint, None))
+    drift = None
+    if args.drift:
+        def profile_for(version):
+            if version is not None:
+                return load_profile(model.registry.path(version) / PROFILE_FILENAME)
+            profile = load_profile(profile_path(find_assets(args.models_dir)[0]))
+            return profile if profile is not None and profile["model_fingerprint"] == fingerprint else None
+
+        drift = DriftMonitor(profile_for, half_life_rows=args.drift_half_life)
+    shadow = ShadowLog(args.shadow_log, args.shadow_sample) if args.shadow_log else None
+    batcher = MicroBatcher(predict_fn, args.max_batch, args.max_wait_ms, instrumentation)
+    server = ScoringServer((args.host, args.port), batcher, assets, cache=cache, index=index, model=model,
+                           instrumentation=instrumentation, drift=drift, shadow=shadow, verbose=args.verbose)
+
+    if model is not None:
+        print(f"✅ Serving model {model.version} from {args.registry}")
+    print(f"✅ Scoring service listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.close()
+        if drift is not None:
+            drift.close()
+        if shadow is not None:
+            shadow.close()
+        if model is not None:
+            model.stop()
+        instrumentation.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,421 @@
+"""
+Shadow logging of scored inputs and offline replay against a candidate model.
+
+``ShadowLog`` records the rows a model actually scored: the canonical frame
+after ``build_model_input`` (schema-coerced, reindexed to the model's
+columns), plus any raw column the reindex dropped so a candidate with a
+different column list can rebuild its own input. Each row also carries the
+time, the fingerprint of the model that scored it and the price it returned.
+
+``log`` only puts the frame on a bounded queue (a full queue drops the frame
+and counts it). A background thread does the reindexing and writes Arrow IPC
+record batches, zstd-compressed, to append-only segment files under
+``data/shadow/``. A segment only ever grows by whole batches, a new one is
+started on rotation or when the column layout changes, and a reader stops
+cleanly at a batch cut short by a crash.
+
+``replay`` scores the logged rows in large batches with the live and the
+candidate pipeline, optionally across ``--workers`` processes, and reports
+price deltas overall and by make, age band and accident history, next to
+each model's throughput, batch and single-row latency on the same rows. The
+live model's replayed prices are checked against the logged ones, so a
+mismatch shows up before the comparison is trusted.
+
+Usage:
+    python -m src.server --shadow-log
+    VEHICLE_PRICE_SHADOW_LOG=data/shadow streamlit run app.py
+    python -m src.shadow replay --logs data/shadow --candidate models/compact --workers 4
+"""
+
+import argparse
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_SHADOW_DIR = BASE_DIR / "data" / "shadow"
+ENV_VAR = "VEHICLE_PRICE_SHADOW_LOG"
+SAMPLE_ENV_VAR = "VEHICLE_PRICE_SHADOW_SAMPLE"
+
+SEGMENT_SUFFIX = ".arrows"
+FLUSH_ROWS = 10_000
+FLUSH_SECONDS = 5.0
+ROTATE_BYTES = 64 << 20
+DEFAULT_QUEUE_SIZE = 1_024
+
+LOGGED_AT = "logged_at"
+MODEL_FINGERPRINT = "model_fingerprint"
+LOGGED_PRICE = "logged_price"
+META_COLUMNS = [LOGGED_AT, MODEL_FINGERPRINT, LOGGED_PRICE]
+
+AGE_BINS = [-np.inf, 3, 7, 12, np.inf]
+AGE_LABELS = ["0-3 yrs", "4-7 yrs", "8-12 yrs", "13+ yrs"]
+DEFAULT_BATCH_ROWS = 50_000
+LATENCY_ROWS = 200
+
+
+def point_prices(pipeline, predictions):
+    from src.quantile import quantile_levels, split_band
+
+    return split_band(predictions, quantile_levels(pipeline))[0]
+
+
+def canonical_rows(frame, pipeline, model_columns):
+    """The model's post-reindex input plus the raw columns it does not keep."""
+    from src.features import build_model_input
+
+    features = build_model_input(frame, pipeline, model_columns)
+    extra = [c for c in frame.columns if c not in features.columns]
+    if extra:
+        features = pd.concat([features, frame[extra]], axis=1)
+    return features.reset_index(drop=True)
+
+
+# -----------------------------------------------------------------------------
+# LOGGING
+# -----------------------------------------------------------------------------
+class ShadowLog:
+    """
+    Append-only log of scored rows. Disabled (every call a no-op) unless a
+    ``directory`` is given or ``VEHICLE_PRICE_SHADOW_LOG`` names one.
+    ``sample`` (or ``VEHICLE_PRICE_SHADOW_SAMPLE``) keeps that share of rows.
+    """
+
+    def __init__(self, directory=None, sample=None, flush_rows=FLUSH_ROWS, flush_seconds=FLUSH_SECONDS,
+                 rotate_bytes=ROTATE_BYTES, queue_size=DEFAULT_QUEUE_SIZE):
+        if directory is None:
+            directory = os.environ.get(ENV_VAR) or None
+        if sample is None:
+            sample = float(os.environ.get(SAMPLE_ENV_VAR) or 1.0)
+        self.directory = Path(directory) if directory else None
+        self.sample = sample
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.rotate_bytes = rotate_bytes
+        self.rows = 0
+        self.dropped = 0
+        self.segments = 0
+        self.error = None
+        self._rng = np.random.default_rng()
+        self._buffer = []
+        self._buffered = 0
+        self._writer = None
+        self._sink = None
+        self._schema = None
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        if self.enabled:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name="shadow-log", daemon=True)
+            self._thread.start()
+
+    @property
+    def enabled(self):
+        return self.directory is not None
+
+    def log(self, frame, prices, pipeline, model_columns, fingerprint):
+        """Queue validated rows and the prices ``pipeline`` returned for them."""
+        if not self.enabled or not len(frame):
+            return
+        if self.sample < 1.0:
+            keep = self._rng.random(len(frame)) < self.sample
+            if not keep.any():
+                return
+            frame, prices = frame[keep], np.asarray(prices)[keep]
+        try:
+            self._queue.put_nowait((time.time(), frame, prices, pipeline, model_columns, fingerprint))
+        except queue.Full:
+            self.dropped += len(frame)
+
+    def flush(self, timeout=10.0):
+        """Block until everything queued so far is written."""
+        if self.enabled:
+            done = threading.Event()
+            self._queue.put(done, timeout=timeout)
+            done.wait(timeout)
+
+    def close(self):
+        if self.enabled and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def stats(self):
+        return {"directory": str(self.directory), "rows": self.rows, "dropped": self.dropped,
+                "segments": self.segments, "error": repr(self.error) if self.error else None}
+
+    # -- background writer -----------------------------------------------------
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_seconds)
+            except queue.Empty:
+                item = False
+            try:
+                if item is None or isinstance(item, threading.Event):
+                    self._write()
+                    if item is None:
+                        self._close_segment()
+                        return
+                    item.set()
+                    continue
+                if item is not False:
+                    self._buffer.append(self._record(*item))
+                    self._buffered += len(self._buffer[-1])
+                if self._buffered >= self.flush_rows or (
+                        self._buffered and time.monotonic() - last_flush >= self.flush_seconds):
+                    self._write()
+                    last_flush = time.monotonic()
+            except Exception as e:
+                self.error = e
+                self._buffer, self._buffered = [], 0
+
+    def _record(self, logged_at, frame, prices, pipeline, model_columns, fingerprint):
+        rows = canonical_rows(frame, pipeline, model_columns)
+        rows.insert(0, LOGGED_AT, np.full(len(rows), logged_at))
+        rows.insert(1, MODEL_FINGERPRINT, fingerprint)
+        rows.insert(2, LOGGED_PRICE, point_prices(pipeline, np.asarray(prices, dtype=np.float64)))
+        return rows
+
+    def _write(self):
+        import pyarrow as pa
+
+        if not self._buffer:
+            return
+        # Frames of one model share a layout; a swap to a different layout starts a new segment
+        groups = {}
+        for rows in self._buffer:
+            groups.setdefault(tuple(rows.columns), []).append(rows)
+        for frames in groups.values():
+            table = pa.Table.from_pandas(pd.concat(frames, ignore_index=True), preserve_index=False)
+            if self._writer is None or not table.schema.equals(self._schema) or self._sink.tell() > self.rotate_bytes:
+                self._open_segment(table.schema)
+            self._writer.write_table(table)
+            self._sink.flush()
+            self.rows += table.num_rows
+        self._buffer, self._buffered = [], 0
+
+    def _open_segment(self, schema):
+        import pyarrow as pa
+
+        self._close_segment()
+        name = f"shadow-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self.segments:04d}{SEGMENT_SUFFIX}"
+        self._sink = open(self.directory / name, "xb")
+        self._writer = pa.ipc.new_stream(self._sink, schema, options=pa.ipc.IpcWriteOptions(compression="zstd"))
+        self._schema = schema
+        self.segments += 1
+
+    def _close_segment(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._sink.close()
+            self._writer = self._sink = None
+
+
+def read_shadow_log(path, fingerprint=None):
+    """Every logged row under ``path`` (a directory or one segment) as one DataFrame, oldest first."""
+    import pyarrow as pa
+
+    path = Path(path)
+    segments = sorted(path.glob(f"*{SEGMENT_SUFFIX}")) if path.is_dir() else [path]
+    tables = []
+    for segment in segments:
+        with pa.OSFile(str(segment)) as source:
+            try:
+                reader = pa.ipc.open_stream(source)
+            except pa.ArrowInvalid:
+                continue  # created but nothing written yet
+            while True:
+                try:
+                    tables.append(pa.Table.from_batches([reader.read_next_batch()]))
+                except StopIteration:
+                    break
+                except (pa.ArrowInvalid, OSError):
+                    break  # batch cut short by a crash; everything before it is intact
+    if not tables:
+        raise FileNotFoundError(f"No shadow log rows under {path}")
+    rows = pa.concat_tables(tables, promote_options="default").to_pandas()
+    if fingerprint is not None:
+        rows = rows[rows[MODEL_FINGERPRINT] == fingerprint].reset_index(drop=True)
+    return rows
+
+
+# -----------------------------------------------------------------------------
+# REPLAY
+# -----------------------------------------------------------------------------
+_WORKER_MODELS = {}
+
+
+def _load(model_dir):
+    import joblib
+
+    from src.assets import COLUMNS_FILENAME, MODEL_FILENAME
+
+    model_dir = Path(model_dir)
+    return joblib.load(model_dir / MODEL_FILENAME), joblib.load(model_dir / COLUMNS_FILENAME)
+
+
+def _init_worker(model_dirs):
+    for name, model_dir in model_dirs.items():
+        _WORKER_MODELS[name] = _load(model_dir)
+
+
+def _score(name, rows):
+    """``(point prices, seconds)`` for one batch, input building included."""
+    from src.features import build_model_input
+
+    pipeline, model_columns = _WORKER_MODELS[name]
+    t0 = time.perf_counter()
+    predictions = pipeline.predict(build_model_input(rows, pipeline, model_columns))
+    return point_prices(pipeline, predictions), time.perf_counter() - t0
+
+
+def score_all(model_dirs, rows, batch_rows=DEFAULT_BATCH_ROWS, workers=1):
+    """
+    Prices and timings of every model on the same batches of ``rows``. Models
+    run one after the other, each across all ``workers``, so throughput is
+    measured on an otherwise idle pool.
+    """
+    batches = [rows.iloc[i:i + batch_rows] for i in range(0, len(rows), batch_rows)]
+    warm_up = rows.iloc[:min(len(rows), 100)]
+    results = {}
+    pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(model_dirs,)) if workers > 1 else None
+    try:
+        if pool is None:
+            _init_worker(model_dirs)
+        for name in model_dirs:
+            if pool is None:
+                _score(name, warm_up)
+                t0 = time.perf_counter()
+                scored = [_score(name, batch) for batch in batches]
+            else:
+                list(pool.map(_score, [name] * workers, [warm_up] * workers))
+                t0 = time.perf_counter()
+                scored = list(pool.map(_score, [name] * len(batches), batches))
+            wall = time.perf_counter() - t0
+            seconds = np.array([s for _, s in scored])
+            results[name] = {
+                "prices": np.concatenate([p for p, _ in scored]),
+                "rows_per_s": len(rows) / wall,
+                "batch_p50_ms": float(np.median(seconds) * 1000),
+                "batch_p95_ms": float(np.percentile(seconds, 95) * 1000),
+            }
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return results
+
+
+def single_row_latency(model_dirs, rows, n=LATENCY_ROWS):
+    """Median milliseconds to score one logged row, models interleaved row by row."""
+    _init_worker(model_dirs)
+    sample = rows.sample(min(n, len(rows)), random_state=0)
+    timings = {name: [] for name in model_dirs}
+    for i in range(len(sample)):
+        for name in model_dirs:
+            timings[name].append(_score(name, sample.iloc[i:i + 1])[1])
+    return {name: float(np.median(seconds) * 1000) for name, seconds in timings.items()}
+
+
+def age_band(rows, reference_year):
+    age = rows["vehicle_age"] if "vehicle_age" in rows.columns else reference_year - rows["year"]
+    return pd.cut(pd.to_numeric(age, errors="coerce"), AGE_BINS, labels=AGE_LABELS).astype(str)
+
+
+def segment_deltas(rows, live, candidate, reference_year, threshold=0.05):
+    """
+    Candidate - live price differences overall and per make, age band and
+    accident history. ``pct_delta`` is the segment's total change over its
+    total live price, so a few near-zero live prices cannot dominate it;
+    ``moved_share`` counts rows whose own price moved by more than ``threshold``.
+    """
+    frame = pd.DataFrame({
+        "make": rows["make"].fillna("Missing").astype(str).to_numpy(),
+        "age_band": age_band(rows, reference_year).to_numpy(),
+        # the feature step imputes a missing history as "None"
+        "accident_history": rows["accident_history"].fillna("None").astype(str).to_numpy(),
+        "live": live,
+        "candidate": candidate,
+    })
+    frame["delta"] = frame["candidate"] - frame["live"]
+    frame["abs_delta"] = frame["delta"].abs()
+    frame["moved"] = frame["abs_delta"] > threshold * frame["live"].abs()
+
+    def summarize(grouped):
+        table = grouped.agg(
+            rows=("delta", "size"), live_mean=("live", "mean"), candidate_mean=("candidate", "mean"),
+            mean_delta=("delta", "mean"), mean_abs_delta=("abs_delta", "mean"), moved_share=("moved", "mean"),
+        )
+        table.insert(5, "pct_delta", table["mean_delta"] / table["live_mean"])
+        return table
+
+    parts = [summarize(frame.assign(value="all").groupby("value")).assign(segment="overall")]
+    for segment in ["make", "age_band", "accident_history"]:
+        parts.append(summarize(frame.groupby(segment)).rename_axis("value").assign(segment=segment))
+    table = pd.concat(parts).reset_index()
+    return table[["segment", "value", *table.columns.drop(["segment", "value"])]]
+
+
+def print_report(perf, single_ms, deltas, replay_check, top=10):
+    print("-" * 78)
+    print(f"{'model':<12}{'rows/s':>12}{'batch p50 ms':>14}{'batch p95 ms':>14}{'1-row p50 ms':>14}")
+    for name, r in perf.items():
+        print(f"{name:<12}{r['rows_per_s']:>12,.0f}{r['batch_p50_ms']:>14.1f}{r['batch_p95_ms']:>14.1f}"
+              f"{single_ms[name]:>14.2f}")
+    print("-" * 78)
+    print(f"Live replay vs logged prices: max |Δ| ${replay_check:,.2f}")
+    print("-" * 78)
+    print(f"{'segment':<18}{'value':<16}{'rows':>8}{'live $':>10}{'Δ $':>9}{'|Δ| $':>9}{'Δ %':>8}{'>5%':>7}")
+    for segment, group in deltas.groupby("segment", sort=False):
+        group = group.sort_values("rows", ascending=False).head(top)
+        for r in group.itertuples():
+            print(f"{segment:<18}{str(r.value)[:15]:<16}{r.rows:>8,}{r.live_mean:>10,.0f}{r.mean_delta:>9,.0f}"
+                  f"{r.mean_abs_delta:>9,.0f}{r.pct_delta:>8.2%}{r.moved_share:>7.1%}")
+    print("-" * 78)
+
+
+def main(argv=None):
+    from src.assets import find_assets
+    from src.features import pipeline_reference_year
+
+    parser = argparse.ArgumentParser(description="Replay shadow-logged traffic against a candidate model.")
+    parser.add_argument("command", choices=["replay"])
+    parser.add_argument("--logs", default=str(DEFAULT_SHADOW_DIR), help="Shadow log directory or segment")
+    parser.add_argument("--candidate", required=True,
+                        help="Directory holding the candidate's vehicle_price_pipeline.pkl and input_columns.pkl")
+    parser.add_argument("--models-dir", default=None,
+                        help="Directory containing the live models/ (defaults to the repo root)")
+    parser.add_argument("--fingerprint", default=None, help="Only replay rows scored by this model")
+    parser.add_argument("--batch-rows", type=int, default=DEFAULT_BATCH_ROWS)
+    parser.add_argument("--workers", type=int, default=1, help="Score batches in this many processes")
+    parser.add_argument("--out", default=None, help="Write the per-segment deltas to this CSV")
+    args = parser.parse_args(argv)
+
+    rows = read_shadow_log(args.logs, args.fingerprint)
+    logged = rows[LOGGED_PRICE].to_numpy()
+    models = rows[MODEL_FINGERPRINT]
+    rows = rows.drop(columns=META_COLUMNS)
+    print(f"Replaying {len(rows):,} logged rows from {models.nunique()} model(s), "
+          f"{args.workers} worker(s), {args.batch_rows:,}-row batches")
+
+    model_dirs = {"live": find_assets(args.models_dir)[0].parent, "candidate": Path(args.candidate)}
+    perf = score_all(model_dirs, rows, args.batch_rows, args.workers)
+    single_ms = single_row_latency(model_dirs, rows)
+
+    live_pipeline = _WORKER_MODELS["live"][0]
+    deltas = segment_deltas(rows, perf["live"]["prices"], perf["candidate"]["prices"],
+                            pipeline_reference_year(live_pipeline))
+    print_report(perf, single_ms, deltas, float(np.max(np.abs(perf["live"]["prices"] - logged))))
+    if args.out:
+        deltas.to_csv(args.out, index=False)
+        print(f"✅ Segment deltas saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
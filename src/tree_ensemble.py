@@ -0,0 +1,156 @@
+"""
+Flat, memory-mappable layout for the boosted trees.
+
+``TreeEnsemble.from_booster`` lowers every regression tree of an XGBoost
+booster into padded ``(n_trees, max_nodes)`` arrays, one ``.npy`` file per
+node field. Loading them with ``mmap_mode='r'`` lets any number of processes
+share a single page-cache copy of the model instead of each unpickling its
+own booster.
+
+Prediction walks all trees for a block of rows at once: leaves point back to
+themselves, so ``max_depth`` vectorized gather steps land every row on its
+leaf without per-node Python.
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+
+TREES_FILENAME = "trees.{field}.npy"
+TREES_META_FILENAME = "trees.json"
+
+NODE_DTYPE = np.dtype(
+    [
+        ("feature", np.int32),
+        ("threshold", np.float32),
+        ("left", np.int32),
+        ("right", np.int32),
+        ("default_left", np.bool_),
+        ("value", np.float32),
+    ]
+)
+
+# Rows scored per traversal block; bounds the (rows x trees) temporaries.
+DEFAULT_BLOCK_ROWS = 256
+
+
+def _parse_base_score(raw):
+    return float(str(raw).strip("[]"))
+
+
+def _tree_depth(left, right):
+    depth = np.zeros(len(left), dtype=np.int32)
+    for node in range(len(left)):
+        if left[node] != -1:
+            depth[left[node]] = depth[node] + 1
+            depth[right[node]] = depth[node] + 1
+    return int(depth.max())
+
+
+class TreeEnsemble:
+    """Sum-of-trees regressor evaluated with NumPy over a flat node array."""
+
+    def __init__(self, nodes, base_score, max_depth):
+        # ``nodes`` maps field name -> contiguous (n_trees, max_nodes) array
+        self.nodes = nodes
+        self.base_score = float(base_score)
+        self.max_depth = int(max_depth)
+
+    @property
+    def n_trees(self):
+        return self.nodes["feature"].shape[0]
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in self.nodes.values())
+
+    # -------------------------------------------------------------------------
+    # Construction / persistence
+    # -------------------------------------------------------------------------
+    @classmethod
+    def from_booster(cls, booster, iteration_range=None):
+        model = json.loads(booster.save_raw("json"))
+        learner = model["learner"]
+        objective = learner["objective"]["name"]
+        if objective not in ("reg:squarederror", "reg:absoluteerror", "reg:pseudohubererror"):
+            raise NotImplementedError(f"Cannot lower objective {objective}")
+
+        trees = learner["gradient_booster"]["model"]["trees"]
+        if iteration_range:
+            trees = trees[iteration_range[0]:iteration_range[1]]
+
+        max_nodes = max(len(t["left_children"]) for t in trees)
+        nodes = np.zeros((len(trees), max_nodes), dtype=NODE_DTYPE)
+        max_depth = 0
+        for i, tree in enumerate(trees):
+            if any(tree["split_type"]):
+                raise NotImplementedError("Categorical splits are not supported")
+            left = np.asarray(tree["left_children"], dtype=np.int32)
+            right = np.asarray(tree["right_children"], dtype=np.int32)
+            n = len(left)
+            own = np.arange(n, dtype=np.int32)
+            leaf = left == -1
+
+            row = nodes[i]
+            row["feature"][:n] = np.where(leaf, 0, tree["split_indices"])
+            row["threshold"][:n] = tree["split_conditions"]
+            row["left"][:n] = np.where(leaf, own, left)
+            row["right"][:n] = np.where(leaf, own, right)
+            row["default_left"][:n] = np.asarray(tree["default_left"], dtype=bool)
+            # XGBoost stores the leaf value in split_conditions
+            row["value"][:n] = np.where(leaf, tree["split_conditions"], 0.0)
+            max_depth = max(max_depth, _tree_depth(left, right))
+
+        base_score = _parse_base_score(learner["learner_model_param"]["base_score"])
+        fields = {name: np.ascontiguousarray(nodes[name]) for name in NODE_DTYPE.names}
+        return cls(fields, base_score, max_depth)
+
+    def save(self, directory):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name, array in self.nodes.items():
+            np.save(directory / TREES_FILENAME.format(field=name), array)
+        with open(directory / TREES_META_FILENAME, "w") as f:
+            json.dump({"base_score": self.base_score, "max_depth": self.max_depth}, f)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        directory = Path(directory)
+        nodes = {
+            name: np.load(directory / TREES_FILENAME.format(field=name), mmap_mode="r" if mmap else None)
+            for name in NODE_DTYPE.names
+        }
+        with open(directory / TREES_META_FILENAME) as f:
+            meta = json.load(f)
+        return cls(nodes, meta["base_score"], meta["max_depth"])
+
+    # -------------------------------------------------------------------------
+    # Prediction
+    # -------------------------------------------------------------------------
+    def predict(self, matrix, block_rows=DEFAULT_BLOCK_ROWS):
+        matrix = np.asarray(matrix, dtype=np.float32)
+        out = np.empty(len(matrix), dtype=np.float64)
+        n_trees, max_nodes = self.nodes["feature"].shape
+        # Flat 1-D views; ``reshape`` keeps these backed by the mmap
+        feature = self.nodes["feature"].reshape(-1)
+        threshold = self.nodes["threshold"].reshape(-1)
+        left = self.nodes["left"].reshape(-1)
+        right = self.nodes["right"].reshape(-1)
+        default_left = self.nodes["default_left"].reshape(-1)
+        value = self.nodes["value"].reshape(-1)
+        tree_offset = (np.arange(n_trees, dtype=np.int64) * max_nodes)[None, :]
+
+        for start in range(0, len(matrix), block_rows):
+            block = matrix[start:start + block_rows]
+            has_missing = np.isnan(block).any()
+            node = np.broadcast_to(tree_offset, (len(block), n_trees)).copy()
+            for _ in range(self.max_depth):
+                x = np.take_along_axis(block, feature.take(node), axis=1)
+                go_left = x < threshold.take(node)
+                if has_missing:
+                    go_left = np.where(np.isnan(x), default_left.take(node), go_left)
+                node = tree_offset + np.where(go_left, left.take(node), right.take(node))
+            out[start:start + len(block)] = value.take(node).sum(axis=1, dtype=np.float64)
+
+        return out + self.base_score
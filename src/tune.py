@@ -0,0 +1,237 @@
+"""
+Hyperparameter search with early stopping and parallel trials.
+
+The preprocessor is fitted once on the training split; every trial then fits
+only the booster on the transformed matrix, stopping once the validation MAE
+hasn't improved for ``--early-stopping-rounds`` rounds. The booster is
+truncated to its best iteration, so the recorded size and predict latency are
+what it would actually cost to serve.
+
+Trial 0 is always today's configuration (2000 rounds, no early stopping) as
+the baseline. The report marks the Pareto-optimal trials on (MAE, 1k-row
+predict latency). ``--out`` saves the cheapest trial whose validation MAE is
+within ``--mae-tolerance`` of the baseline as a full pipeline artifact.
+
+Usage:
+    python -m src.tune --data vehicle_price_prediction.csv --trials 24 --workers 4 --out models
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import time
+
+import numpy as np
+import xgboost as xgb
+from sklearn.metrics import mean_absolute_error, mean_absolute_percentage_error
+from sklearn.model_selection import train_test_split
+
+from src.production_train import (
+    DEFAULT_XGB_PARAMS,
+    build_pipeline,
+    evaluate,
+    read_listings,
+    save_artifacts,
+    split_xy,
+)
+
+SEARCH_SPACE = {
+    "max_depth": [4, 6, 8, 9, 10],
+    "learning_rate": [0.02, 0.05, 0.1, 0.2],
+    "subsample": [0.7, 0.85, 1.0],
+    "colsample_bytree": [0.7, 0.85, 1.0],
+    "min_child_weight": [1, 5, 20],
+    "reg_lambda": [0.5, 1.0, 5.0],
+}
+
+LATENCY_REPEATS = 50
+
+
+# -----------------------------------------------------------------------------
+# TRIALS
+# -----------------------------------------------------------------------------
+def sample_trials(n_trials, max_rounds, seed=42):
+    """Baseline config first, then random draws from ``SEARCH_SPACE``."""
+    rng = np.random.default_rng(seed)
+    baseline = {k: DEFAULT_XGB_PARAMS[k] for k in ("n_estimators", "learning_rate", "max_depth",
+                                                     "subsample", "colsample_bytree")}
+    trials = [{**baseline, "early_stopping": False}]
+    for _ in range(n_trials - 1):
+        params = {name: values[rng.integers(len(values))] for name, values in SEARCH_SPACE.items()}
+        params = {k: (v.item() if isinstance(v, np.generic) else v) for k, v in params.items()}
+        trials.append({**params, "n_estimators": max_rounds, "early_stopping": True})
+    return trials
+
+
+# Matrices shared with forked workers instead of being pickled per trial
+_data = {}
+
+
+def run_trial(index, params, early_stopping_rounds, threads):
+    from src.benchmark import p50_ms
+
+    params = dict(params)
+    early_stopping = params.pop("early_stopping")
+    model = xgb.XGBRegressor(
+        **params,
+        tree_method="hist",
+        random_state=42,
+        n_jobs=threads,
+        eval_metric="mae",
+        early_stopping_rounds=early_stopping_rounds if early_stopping else None,
+    )
+    t0 = time.perf_counter()
+    model.fit(_data["X_train"], _data["y_train"], eval_set=[(_data["X_valid"], _data["y_valid"])], verbose=False)
+    train_seconds = time.perf_counter() - t0
+
+    booster = model.get_booster()
+    if early_stopping:
+        best_rounds = model.best_iteration + 1
+        booster = booster[:best_rounds]
+    else:
+        best_rounds = booster.num_boosted_rounds()
+    raw = booster.save_raw("ubj")
+
+    X_valid, X_test = _data["X_valid"], _data["X_test"]
+    single, batch = X_test[:1], X_test[:1000]
+    single_ms, batch_ms = p50_ms(
+        [lambda: booster.inplace_predict(single), lambda: booster.inplace_predict(batch)], LATENCY_REPEATS
+    )
+    valid_pred = booster.inplace_predict(X_valid)
+    test_pred = booster.inplace_predict(X_test)
+    return {
+        "trial": index,
+        "params": {**params, "n_estimators": best_rounds},
+        "early_stopping": early_stopping,
+        "rounds": best_rounds,
+        "train_seconds": train_seconds,
+        "valid_mae": float(mean_absolute_error(_data["y_valid"], valid_pred)),
+        "test_mae": float(mean_absolute_error(_data["y_test"], test_pred)),
+        "test_mape": float(mean_absolute_percentage_error(_data["y_test"], test_pred)),
+        "model_bytes": len(raw),
+        "single_p50_ms": single_ms,
+        "batch_1k_p50_ms": batch_ms,
+        "booster": bytes(raw),
+    }
+
+
+def _run_trial_star(args):
+    return run_trial(*args)
+
+
+def pareto_front(results, keys=("valid_mae", "batch_1k_p50_ms")):
+    """Indices of trials no other trial beats on every key."""
+    front = []
+    for i, a in enumerate(results):
+        dominated = any(
+            all(b[k] <= a[k] for k in keys) and any(b[k] < a[k] for k in keys)
+            for j, b in enumerate(results) if j != i
+        )
+        if not dominated:
+            front.append(i)
+    return front
+
+
+def select_trial(results, mae_tolerance):
+    """Cheapest trial to serve whose validation MAE is within tolerance of the baseline."""
+    baseline = next(r for r in results if not r["early_stopping"])
+    limit = baseline["valid_mae"] * (1 + mae_tolerance)
+    eligible = [r for r in results if r["valid_mae"] <= limit] or [baseline]
+    return min(eligible, key=lambda r: r["batch_1k_p50_ms"])
+
+
+# -----------------------------------------------------------------------------
+# SEARCH
+# -----------------------------------------------------------------------------
+def search(data_path, n_trials=16, workers=None, max_rounds=2000, early_stopping_rounds=50,
+           nrows=None, seed=42):
+    workers = workers or os.cpu_count() or 1
+    threads = max(1, (os.cpu_count() or 1) // workers)
+
+    X, y = split_xy(read_listings(data_path, nrows=nrows))
+    X_train, X_rest, y_train, y_rest = train_test_split(X, y, test_size=0.3, random_state=seed)
+    X_valid, X_test, y_valid, y_test = train_test_split(X_rest, y_rest, test_size=0.5, random_state=seed)
+
+    pipeline = build_pipeline(X_train.columns)
+    preprocess = pipeline[:-1]
+    t0 = time.perf_counter()
+    _data.update(
+        X_train=preprocess.fit_transform(X_train, y_train).astype(np.float32),
+        y_train=y_train.to_numpy(),
+        X_valid=preprocess.transform(X_valid).astype(np.float32),
+        y_valid=y_valid.to_numpy(),
+        X_test=preprocess.transform(X_test).astype(np.float32),
+        y_test=y_test.to_numpy(),
+    )
+    print(f"Preprocessed {len(X_train):,} train rows in {time.perf_counter() - t0:.1f}s; "
+          f"running {n_trials} trials on {workers} workers x {threads} threads")
+
+    tasks = [(i, params, early_stopping_rounds, threads)
+             for i, params in enumerate(sample_trials(n_trials, max_rounds, seed))]
+    if workers == 1:
+        results = [run_trial(*task) for task in tasks]
+    else:
+        ctx = mp.get_context("fork" if "fork" in mp.get_all_start_methods() else "spawn")
+        if ctx.get_start_method() != "fork":
+            raise RuntimeError("Parallel trials need the 'fork' start method to share the matrices")
+        with ctx.Pool(workers) as pool:
+            results = sorted(pool.imap_unordered(_run_trial_star, tasks), key=lambda r: r["trial"])
+
+    return pipeline, (X_test, y_test), results
+
+
+def print_report(results, front, chosen):
+    print("-" * 100)
+    print(f"{'trial':>5} {'depth':>5} {'lr':>5} {'rounds':>6} {'train s':>8} {'val MAE':>9} "
+          f"{'test MAPE':>9} {'size MB':>8} {'1-row ms':>8} {'1k ms':>7}  ")
+    for i, r in enumerate(results):
+        p = r["params"]
+        marks = ("*" if i in front else " ") + ("<" if r is chosen else " ")
+        print(f"{r['trial']:>5} {p['max_depth']:>5} {p['learning_rate']:>5} {r['rounds']:>6} "
+              f"{r['train_seconds']:>8.1f} {r['valid_mae']:>9,.1f} {r['test_mape']:>9.2%} "
+              f"{r['model_bytes'] / 2**20:>8.2f} {r['single_p50_ms']:>8.2f} {r['batch_1k_p50_ms']:>7.2f} {marks}")
+    print("-" * 100)
+    print("* Pareto-optimal on (validation MAE, 1k-row latency)   < selected")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tune the XGBoost regressor.")
+    parser.add_argument("--data", required=True, help="Listings CSV with a price column")
+    parser.add_argument("--nrows", type=int, default=None)
+    parser.add_argument("--trials", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=None, help="Parallel trials (defaults to CPU count)")
+    parser.add_argument("--max-rounds", type=int, default=2000)
+    parser.add_argument("--early-stopping-rounds", type=int, default=50)
+    parser.add_argument("--mae-tolerance", type=float, default=0.01,
+                        help="Allowed relative MAE increase over the baseline when selecting")
+    parser.add_argument("--results", default="tuning_results.json", help="Where to write all trial results")
+    parser.add_argument("--out", default=None, help="Save the selected pipeline into this models directory")
+    args = parser.parse_args(argv)
+
+    pipeline, (X_test, y_test), results = search(
+        args.data, args.trials, args.workers, args.max_rounds, args.early_stopping_rounds, args.nrows,
+    )
+    front = pareto_front(results)
+    chosen = select_trial(results, args.mae_tolerance)
+    print_report(results, front, chosen)
+
+    with open(args.results, "w") as f:
+        json.dump(
+            [{**{k: v for k, v in r.items() if k != "booster"}, "pareto": i in front}
+             for i, r in enumerate(results)],
+            f, indent=2,
+        )
+    print(f"Results written to {args.results}")
+
+    if args.out:
+        regressor = pipeline.named_steps["regressor"]
+        regressor.set_params(**chosen["params"])
+        regressor.load_model(bytearray(chosen["booster"]))
+        metrics = evaluate(pipeline, X_test, y_test)
+        model_path, _ = save_artifacts(pipeline, X_test.columns, args.out)
+        print(f"✅ Saved trial {chosen['trial']} to {model_path} (test MAE ${metrics['mae']:,.2f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""
+Precomputed valuation index for frequent configurations.
+
+``build_index`` mines the most frequent configurations from a listings or
+request-log CSV and prices each one in batched predicts. The columns are
+handled explicitly:
+
+* ``KEY_COLUMNS`` (make, model, year, trim) form the configuration key;
+* ``accident_history`` is priced at every level of ``ACCIDENT_LEVELS``;
+* ``engine_hp`` and ``mileage`` are priced over quantized grids and
+  interpolated bilinearly;
+* ``TYPICAL_COLUMNS`` (colors, body, drivetrain, owners, ...) move the price
+  by well under 1% on the current models, so each configuration is priced at
+  its most common value (median for numbers). ``evaluate`` reports the
+  error this adds against ``pipeline.predict``.
+
+The results are stored as:
+
+* ``keys.npy``   - sorted uint64 configuration hashes (``row_keys``),
+* ``prices.npy`` - float32 ``(n_configs, n_levels, n_hp, n_mileage)`` table,
+* ``index.json`` - format version, model fingerprint, columns and grids.
+
+``IndexedPredictor`` resolves a request with a binary search on the key and
+interpolation over horsepower and mileage. Only misses (an unknown
+configuration, a value outside a grid) reach ``pipeline.predict``. An index
+built for a different model artifact is never used.
+
+Usage:
+    python -m src.valuation_index build --data vehicle_price_prediction.csv --min-count 3
+    python -m src.valuation_index evaluate --data recent_requests.csv
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.features import build_model_input
+from src.prediction_cache import row_keys
+from src.production_train import TARGET_COL
+from src.quantile import quantile_levels
+
+FORMAT_VERSION = 2
+INDEX_FILENAME = "index.json"
+KEYS_FILENAME = "keys.npy"
+PRICES_FILENAME = "prices.npy"
+DEFAULT_INDEX_DIR = Path(__file__).resolve().parent.parent / "models" / "valuation_index"
+DEFAULT_MILEAGE_GRID = np.arange(0, 300_001, 10_000)
+DEFAULT_HP_GRID = np.arange(50, 551, 25)
+
+KEY_COLUMNS = ["make", "model", "year", "trim"]
+# The feature step fills a missing accident history with "None"
+ACCIDENT_LEVELS = ["None", "Minor", "Major"]
+TYPICAL_COLUMNS = [
+    "transmission", "fuel_type", "drivetrain", "body_type", "exterior_color", "interior_color",
+    "seller_type", "condition", "owner_count", "brand_popularity",
+]
+
+
+# -----------------------------------------------------------------------------
+# BUILD
+# -----------------------------------------------------------------------------
+def canonical_configurations(frame, columns):
+    """``frame[columns]`` with strings as object, so keys hash the same whatever the input dtypes."""
+    return frame[columns].astype({c: object for c in columns if frame[c].dtype.kind not in "biuf"})
+
+
+def _typical(values):
+    if values.dtype.kind in "biuf":
+        median = values.median()
+        return round(median) if values.dtype.kind in "iu" else median
+    modes = values.mode()
+    return modes.iloc[0] if len(modes) else None
+
+
+def frequent_configurations(listings, min_count=3, max_configs=100_000):
+    """
+    ``KEY_COLUMNS`` configurations seen at least ``min_count`` times, most
+    frequent first, with the typical value of each ``TYPICAL_COLUMNS`` column
+    among their listings.
+    """
+    listings = listings.dropna(subset=KEY_COLUMNS)
+    config = canonical_configurations(listings, KEY_COLUMNS)
+    counts = config.value_counts()
+    counts = counts[counts >= min_count].head(max_configs)
+    configurations = counts.index.to_frame(index=False)
+
+    typical = [c for c in TYPICAL_COLUMNS if c in listings.columns]
+    if typical and len(configurations):
+        listing_keys, config_keys = row_keys(config), row_keys(configurations)
+        frequent = np.isin(listing_keys, config_keys)
+        values = listings.loc[frequent, typical].groupby(listing_keys[frequent]).agg(_typical)
+        configurations = pd.concat([configurations, values.reindex(config_keys).reset_index(drop=True)], axis=1)
+    return configurations, counts.to_numpy()
+
+
+def build_index(pipeline, model_columns, fingerprint, configurations, out_dir=DEFAULT_INDEX_DIR,
+                mileage_grid=DEFAULT_MILEAGE_GRID, hp_grid=DEFAULT_HP_GRID, chunk_rows=200_000):
+    """Price every configuration over the accident levels and the horsepower x mileage grid; write the files."""
+    if quantile_levels(pipeline) is not None:
+        raise NotImplementedError("The valuation index only stores point predictions")
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    mileage_grid = np.asarray(mileage_grid, dtype=np.float64)
+    hp_grid = np.asarray(hp_grid, dtype=np.float64)
+
+    keys = row_keys(canonical_configurations(configurations, KEY_COLUMNS))
+    order = np.argsort(keys)
+    keys, configurations = keys[order], configurations.iloc[order].reset_index(drop=True)
+    if len(np.unique(keys)) != len(keys):
+        raise ValueError("Configuration hash collision; the index would be ambiguous")
+
+    # Every (level, horsepower, mileage) point of one configuration, in table order
+    shape = (len(ACCIDENT_LEVELS), len(hp_grid), len(mileage_grid))
+    level, hp, mileage = (axis.ravel() for axis in np.meshgrid(
+        np.arange(shape[0]), hp_grid, mileage_grid, indexing="ij"))
+    points = level.size
+    chunk_configs = max(1, chunk_rows // points)
+
+    t0 = time.perf_counter()
+    prices = np.empty((len(configurations),) + shape, dtype=np.float32)
+    for start in range(0, len(configurations), chunk_configs):
+        block = configurations.iloc[start:start + chunk_configs]
+        grid = block.loc[block.index.repeat(points)].reset_index(drop=True)
+        grid["accident_history"] = np.tile(np.asarray(ACCIDENT_LEVELS, dtype=object)[level], len(block))
+        grid["engine_hp"] = np.tile(hp, len(block))
+        grid["mileage"] = np.tile(mileage, len(block))
+        predicted = pipeline.predict(build_model_input(grid, pipeline, model_columns))
+        prices[start:start + len(block)] = np.asarray(predicted).reshape((len(block),) + shape)
+    build_seconds = time.perf_counter() - t0
+
+    np.save(out_dir / KEYS_FILENAME, keys)
+    np.save(out_dir / PRICES_FILENAME, prices)
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "model_fingerprint": fingerprint,
+        "key_columns": KEY_COLUMNS,
+        "typical_columns": [c for c in TYPICAL_COLUMNS if c in configurations.columns],
+        "accident_levels": ACCIDENT_LEVELS,
+        "engine_hp_grid": hp_grid.tolist(),
+        "mileage_grid": mileage_grid.tolist(),
+        "n_configs": len(keys),
+        "build_seconds": build_seconds,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(out_dir / INDEX_FILENAME, "w") as f:
+        json.dump(meta, f, indent=2)
+    return out_dir
+
+
+# -----------------------------------------------------------------------------
+# LOOKUP
+# -----------------------------------------------------------------------------
+def _grid_position(grid, values):
+    """Left grid cell and interpolation weight for ``values`` already known to lie within ``grid``."""
+    left = np.clip(np.searchsorted(grid, values, side="right") - 1, 0, len(grid) - 2)
+    return left, (values - grid[left]) / (grid[left + 1] - grid[left])
+
+
+class ValuationIndex:
+    def __init__(self, meta, keys, prices):
+        self.meta = meta
+        self.key_columns = meta["key_columns"]
+        self.accident_levels = meta["accident_levels"]
+        self.hp_grid = np.asarray(meta["engine_hp_grid"], dtype=np.float64)
+        self.mileage_grid = np.asarray(meta["mileage_grid"], dtype=np.float64)
+        self.keys = keys
+        self.prices = prices
+
+    @classmethod
+    def load(cls, directory=DEFAULT_INDEX_DIR, fingerprint=None, mmap=True):
+        """Load an index; raises ``ValueError`` if it was built for another model artifact."""
+        directory = Path(directory)
+        with open(directory / INDEX_FILENAME) as f:
+            meta = json.load(f)
+        if meta.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported index format {meta.get('format_version')}; rebuild it")
+        if fingerprint is not None and meta["model_fingerprint"] != fingerprint:
+            raise ValueError("Valuation index was built for a different model artifact; rebuild it")
+        mode = "r" if mmap else None
+        return cls(meta, np.load(directory / KEYS_FILENAME, mmap_mode=mode),
+                   np.load(directory / PRICES_FILENAME, mmap_mode=mode))
+
+    @property
+    def nbytes(self):
+        return self.keys.nbytes + self.prices.nbytes
+
+    def lookup(self, frame):
+        """Interpolated prices (NaN on a miss) and the boolean hit mask for raw listing rows."""
+        prices = np.full(len(frame), np.nan)
+        required = self.key_columns + ["engine_hp", "mileage"]
+        if any(c not in frame.columns for c in required) or not len(self.keys):
+            return prices, np.zeros(len(frame), dtype=bool)
+
+        keys = row_keys(canonical_configurations(frame, self.key_columns))
+        slot = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        accident = frame["accident_history"] if "accident_history" in frame.columns else pd.Series("None", frame.index)
+        level = pd.Categorical(accident.astype(object).fillna("None"), categories=self.accident_levels).codes
+        hp = pd.to_numeric(frame["engine_hp"], errors="coerce").to_numpy(dtype=np.float64)
+        mileage = pd.to_numeric(frame["mileage"], errors="coerce").to_numpy(dtype=np.float64)
+        hit = ((self.keys[slot] == keys) & (level >= 0)
+               & (hp >= self.hp_grid[0]) & (hp <= self.hp_grid[-1])
+               & (mileage >= self.mileage_grid[0]) & (mileage <= self.mileage_grid[-1]))
+        if not hit.any():
+            return prices, hit
+
+        rows, level = slot[hit], level[hit]
+        h, wh = _grid_position(self.hp_grid, hp[hit])
+        m, wm = _grid_position(self.mileage_grid, mileage[hit])
+
+        def corner(dh, dm):
+            return self.prices[rows, level, h + dh, m + dm].astype(np.float64)
+
+        prices[hit] = ((1 - wh) * ((1 - wm) * corner(0, 0) + wm * corner(0, 1))
+                       + wh * ((1 - wm) * corner(1, 0) + wm * corner(1, 1)))
+        return prices, hit
+
+
+class IndexedPredictor:
+    """
+    Raw listing rows in, prices out: index lookups first, ``fallback`` (by
+    default ``pipeline.predict``) for the misses only. A missing or stale
+    index simply means every row misses.
+    """
+
+    def __init__(self, pipeline, model_columns, fingerprint, index_dir=DEFAULT_INDEX_DIR, fallback=None):
+        self.pipeline = pipeline
+        self.model_columns = model_columns
+        self.fallback = fallback or self._predict
+        self.hits = 0
+        self.misses = 0
+        try:
+            if quantile_levels(pipeline) is not None:
+                raise ValueError("quantile models return price bands, which the index does not store")
+            self.index = ValuationIndex.load(index_dir, fingerprint)
+        except (FileNotFoundError, ValueError) as e:
+            print(f"⚠️ Valuation index disabled: {e}")
+            self.index = None
+
+    def _predict(self, frame):
+        return self.pipeline.predict(build_model_input(frame, self.pipeline, self.model_columns))
+
+    def predict(self, frame):
+        if self.index is None:
+            self.misses += len(frame)
+            return self.fallback(frame)
+        prices, hit = self.index.lookup(frame)
+        if not hit.all():
+            miss = ~hit
+            prices[miss] = self.fallback(frame[miss])
+        self.hits += int(hit.sum())
+        self.misses += int((~hit).sum())
+        return prices
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+def evaluate(index, pipeline, model_columns, listings):
+    """Hit rate on ``listings`` and interpolation error of the hits against ``pipeline.predict``."""
+    t0 = time.perf_counter()
+    interpolated, hit = index.lookup(listings)
+    lookup_seconds = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    exact = np.asarray(pipeline.predict(build_model_input(listings, pipeline, model_columns)), dtype=np.float64)
+    predict_seconds = time.perf_counter() - t0
+
+    error = np.abs(interpolated[hit] - exact[hit])
+    return {
+        "rows": len(listings),
+        "hit_rate": float(hit.mean()) if len(hit) else 0.0,
+        "mae": float(error.mean()) if hit.any() else float("nan"),
+        "max_abs_error": float(error.max()) if hit.any() else float("nan"),
+        "mape": float((error / np.abs(exact[hit])).mean()) if hit.any() else float("nan"),
+        "lookup_us_per_row": lookup_seconds * 1e6 / max(len(listings), 1),
+        "predict_us_per_row": predict_seconds * 1e6 / max(len(listings), 1),
+    }
+
+
+def main(argv=None):
+    from src.assets import find_assets, load_assets
+    from src.prediction_cache import artifact_fingerprint
+
+    parser = argparse.ArgumentParser(description="Build or evaluate the precomputed valuation index.")
+    parser.add_argument("command", choices=["build", "evaluate"])
+    parser.add_argument("--data", required=True,
+                        help="Listings or request-log CSV (configurations to index / rows to evaluate)")
+    parser.add_argument("--models-dir", default=None,
+                        help="Directory containing models/ (defaults to the repo root)")
+    parser.add_argument("--out", default=str(DEFAULT_INDEX_DIR))
+    parser.add_argument("--min-count", type=int, default=3)
+    parser.add_argument("--max-configs", type=int, default=100_000)
+    parser.add_argument("--mileage-step", type=int, default=10_000)
+    parser.add_argument("--hp-step", type=int, default=25)
+    parser.add_argument("--nrows", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    pipeline, model_columns = load_assets(args.models_dir)
+    fingerprint = artifact_fingerprint(find_assets(args.models_dir)[0])
+    listings = pd.read_csv(args.data, nrows=args.nrows)
+
+    if args.command == "build":
+        configurations, counts = frequent_configurations(listings, args.min_count, args.max_configs)
+        grid = np.arange(0, 300_001, args.mileage_step)
+        hp_grid = np.arange(DEFAULT_HP_GRID[0], DEFAULT_HP_GRID[-1] + 1, args.hp_step)
+        out_dir = build_index(pipeline, model_columns, fingerprint, configurations, args.out, grid, hp_grid)
+        index = ValuationIndex.load(out_dir)
+        print("-" * 30)
+        print(f"Configurations:  {len(configurations):,} (covering {counts.sum() / len(listings):.1%} of rows)")
+        print(f"Grid points:     {len(ACCIDENT_LEVELS)} accident x {len(hp_grid)} hp x {len(grid)} mileage")
+        print(f"Build time:      {index.meta['build_seconds']:.1f}s")
+        print(f"Index size:      {index.nbytes / 2**20:.2f} MB")
+        print("-" * 30)
+        print(f"✅ Valuation index saved to {out_dir}")
+        return
+
+    index = ValuationIndex.load(args.out, fingerprint)
+    results = evaluate(index, pipeline, model_columns, listings.drop(columns=[TARGET_COL], errors="ignore"))
+    print("-" * 30)
+    print(f"Rows:             {results['rows']:,}")
+    print(f"Hit rate:         {results['hit_rate']:.1%}")
+    print(f"Interp. MAE:      ${results['mae']:,.2f}")
+    print(f"Interp. max err:  ${results['max_abs_error']:,.2f}")
+    print(f"Interp. MAPE:     {results['mape']:.3%}")
+    print(f"Lookup:           {results['lookup_us_per_row']:.2f} µs/row")
+    print(f"Predict:          {results['predict_us_per_row']:.2f} µs/row")
+    print("-" * 30)
+
+
+if __name__ == "__main__":
+    main()
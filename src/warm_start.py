@@ -0,0 +1,157 @@
+"""
+Background model loading and warm-up for a fast first page render.
+
+Only the standard library is imported at module level. :class:`ModelLoader`
+imports pandas/joblib/xgboost, unpickles the pipeline and runs one warm-up
+predict on a background thread, so the Streamlit page renders while the
+model loads. The first real valuation then skips both the unpickle and the
+first-call allocation costs.
+
+Measure eager vs. background startup in fresh interpreters:
+    python -m src.warm_start --repeats 3
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def warm_up(pipeline, model_columns):
+    """One predict on the app's default listing, so the first real request skips first-call costs."""
+    import pandas as pd
+
+    from src.features import build_model_input
+    from src.load_test import SAMPLE_LISTING
+
+    pipeline.predict(build_model_input(pd.DataFrame([SAMPLE_LISTING]), pipeline, model_columns))
+
+
+class ModelLoader:
+    """
+    Load ``(pipeline, model_columns, fingerprint)`` on a daemon thread.
+
+    ``timings`` records seconds spent importing, loading and warming up;
+    ``result()`` blocks until the load finishes and re-raises its error.
+    """
+
+    def __init__(self, base_dir=None, warm_up=True):
+        self.base_dir = base_dir
+        self.warm_up = warm_up
+        self.timings = {}
+        self.error = None
+        self._assets = None
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._load, name="model-loader", daemon=True)
+
+    def start(self):
+        self._started_at = time.perf_counter()
+        self._thread.start()
+        return self
+
+    @property
+    def ready(self):
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise TimeoutError("Model is still loading")
+        if self.error is not None:
+            raise self.error
+        return self._assets
+
+    def _load(self):
+        try:
+            t0 = time.perf_counter()
+            from src.assets import find_assets, load_assets
+            from src.prediction_cache import artifact_fingerprint
+            t1 = time.perf_counter()
+
+            pipeline, columns = load_assets(self.base_dir)
+            model_file, _ = find_assets(self.base_dir)
+            fingerprint = artifact_fingerprint(model_file)
+            t2 = time.perf_counter()
+            self.timings.update(import_s=t1 - t0, load_s=t2 - t1)
+
+            if self.warm_up:
+                warm_up(pipeline, columns)
+                self.timings["warmup_s"] = time.perf_counter() - t2
+
+            self._assets = (pipeline, columns, fingerprint)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.timings["ready_s"] = time.perf_counter() - self._started_at
+            self._done.set()
+
+
+# -----------------------------------------------------------------------------
+# STARTUP BENCHMARK
+# -----------------------------------------------------------------------------
+_STARTUP_SCRIPT = """
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {root!r})
+if {eager}:
+    import joblib, pandas as pd
+    from src.features import build_model_input
+    from src.prediction_cache import artifact_fingerprint
+from src.warm_start import ModelLoader
+rendered = time.perf_counter() - t0
+
+loader = ModelLoader({models_dir!r}, warm_up={warm_up}).start()
+pipeline, columns, _ = loader.result()
+
+import pandas as pd
+from src.features import build_model_input
+from src.load_test import SAMPLE_LISTING
+row = dict(SAMPLE_LISTING, mileage=52000)
+t1 = time.perf_counter()
+pipeline.predict(build_model_input(pd.DataFrame([row]), pipeline, columns))
+first = time.perf_counter() - t1
+t1 = time.perf_counter()
+pipeline.predict(build_model_input(pd.DataFrame([row]), pipeline, columns))
+second = time.perf_counter() - t1
+print(json.dumps({{"import_s": rendered, "ready_s": time.perf_counter() - t0 - first - second,
+                  "first_predict_ms": first * 1000, "second_predict_ms": second * 1000}}))
+"""
+
+
+def measure_startup(models_dir=None, eager=False, warm_up=True, repeats=3):
+    """Median startup timings over ``repeats`` fresh interpreters."""
+    script = _STARTUP_SCRIPT.format(root=str(BASE_DIR), models_dir=models_dir, eager=eager, warm_up=warm_up)
+    runs = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", script], check=True, capture_output=True, text=True)
+        runs.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    return {key: sorted(r[key] for r in runs)[len(runs) // 2] for key in runs[0]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure app import and first-predict times.")
+    parser.add_argument("--models-dir", default=None,
+                        help="Directory containing models/ (defaults to the repo root)")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    modes = [
+        ("eager imports, no warm-up", dict(eager=True, warm_up=False)),
+        ("lazy imports, no warm-up", dict(eager=False, warm_up=False)),
+        ("lazy imports + warm-up", dict(eager=False, warm_up=True)),
+    ]
+    print("-" * 78)
+    print(f"{'mode':<28}{'page import s':>14}{'model ready s':>14}{'1st predict ms':>15}{'2nd ms':>8}")
+    for label, options in modes:
+        r = measure_startup(args.models_dir, repeats=args.repeats, **options)
+        print(f"{label:<28}{r['import_s']:>14.3f}{r['ready_s']:>14.2f}"
+              f"{r['first_predict_ms']:>15.1f}{r['second_predict_ms']:>8.1f}")
+    print("-" * 78)
+
+
+if __name__ == "__main__":
+    main()